@@ -23,11 +23,67 @@ class Settings:
     # 文件存储配置
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "static/uploads")
     THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "static/thumbnails")
+    BLOB_DIR = os.getenv("BLOB_DIR", "static/blobs")  # 按内容哈希去重存储的图像目录
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 上传流式写入的块大小 1MB
+    UPLOAD_SESSION_CHUNK_SIZE = 8 * 1024 * 1024  # 分块上传建议的块大小 8MB
+    UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))  # 会话无活动多久后过期（秒）
+    UPLOAD_SESSION_GC_INTERVAL = int(os.getenv("UPLOAD_SESSION_GC_INTERVAL", "600"))  # 过期会话清理间隔（秒）
+    MAX_BATCH_UPLOAD_FILES = int(os.getenv("MAX_BATCH_UPLOAD_FILES", "200"))  # 批量上传单次最多文件数
     
     # 缩略图配置
     THUMBNAIL_SIZE = (300, 300)  # 缩略图尺寸
     THUMBNAIL_QUALITY = 85  # 缩略图质量 (1-100)
+    THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", "static/thumbnails/cache")  # 按需生成的缩略图缓存目录
+    THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 缓存占用上限 2GB，超出后按最近最少使用淘汰
+    THUMBNAIL_CACHE_SIZES = (64, 128, 256, 512, 1024)  # 按需缩略图可选的边长，请求尺寸向上取整到其中之一
+    THUMBNAIL_ENGINE = os.getenv("THUMBNAIL_ENGINE", "auto")  # 缩略图后端: auto（按格式选择最快的）、pillow、pillow_draft、opencv
+    THUMBNAIL_ENGINE_PROFILE = os.getenv("THUMBNAIL_ENGINE_PROFILE", "thumbnail_engine.json")  # 基准测试选出的各格式后端，由 benchmark_thumbnails.py 生成
+    THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # 按需生成缩略图的进程数，0表示使用线程池
+    THUMBNAIL_RECONCILE_INTERVAL = int(os.getenv("THUMBNAIL_RECONCILE_INTERVAL", str(6 * 3600)))  # 核对数据库缩略图记录与文件的间隔（秒），0表示不核对
+    THUMBNAIL_RECONCILE_BATCH = 1000  # 每批核对的记录数
+    THUMBNAIL_BACKFILL_WORKERS = int(os.getenv("THUMBNAIL_BACKFILL_WORKERS", str(os.cpu_count() or 2)))  # 批量重建缩略图的进程数
+    THUMBNAIL_BACKFILL_BATCH = 500  # 每批处理并记录检查点的图像数
+    THUMBNAIL_BACKFILL_CHUNK = 16  # 每次交给工作进程的图像数
+    
+    # 缩略图拼图配置（列表页按图像ID区间合并缩略图，一页只需一次图像请求）
+    SPRITE_DIR = os.getenv("SPRITE_DIR", "static/sprites")
+    SPRITE_BLOCK_SIZE = int(os.getenv("SPRITE_BLOCK_SIZE", "100"))  # 每张拼图覆盖的图像ID区间长度
+    SPRITE_MAX_PAGE_BLOCKS = int(os.getenv("SPRITE_MAX_PAGE_BLOCKS", "2"))  # 一页图像跨越的拼图数超过该值时不使用拼图
+    SPRITE_CELL_SIZE = 128  # 单元格边长
+    SPRITE_COLUMNS = 10  # 每行单元格数
+    SPRITE_QUALITY = 80
+    
+    # 显示用中间尺寸配置（标注页面按显示尺寸选择，避免加载未压缩的 BMP/TIFF 原图）
+    DERIVATIVE_DIR = os.getenv("DERIVATIVE_DIR", "static/derivatives")
+    DERIVATIVE_SIZES = tuple(int(size) for size in os.getenv("DERIVATIVE_SIZES", "1280,2048").split(",") if size.strip())  # 长边尺寸
+    DERIVATIVE_FORMATS = tuple(os.getenv("DERIVATIVE_FORMATS", "webp").split(","))  # 按优先级生成的格式（avif、webp），JPEG兜底始终生成
+    DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+    
+    # 瓦片金字塔配置（超大图像在标注画布中按视口加载瓦片）
+    TILE_DIR = os.getenv("TILE_DIR", "static/tiles")
+    TILE_SIZE = 254  # DeepZoom 标准瓦片尺寸，加上两侧重叠为 256
+    TILE_OVERLAP = 1
+    TILE_QUALITY = 85
+    TILE_PYRAMID_MIN_SIZE = int(os.getenv("TILE_PYRAMID_MIN_SIZE", "4096"))  # 长边超过该尺寸才使用瓦片
+    TILE_WORKERS = int(os.getenv("TILE_WORKERS", "1"))  # 生成瓦片的进程数，超大图像解码占用内存较多
+    TILE_MAX_IMAGE_PIXELS = int(os.getenv("TILE_MAX_IMAGE_PIXELS", str(1024 * 1024 * 1024)))  # 允许解码的最大像素数
+    
+    # 图像后台处理配置
+    IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))  # 进程池大小，0表示使用线程池
+    IMAGE_PROCESS_MAX_PENDING = int(os.getenv("IMAGE_PROCESS_MAX_PENDING", "32"))  # 同时在途的最大处理数
+    
+    # 文件夹导入配置
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "8"))  # 并行复制和探测的线程数
+    INGEST_COMMIT_CHUNK = int(os.getenv("INGEST_COMMIT_CHUNK", "500"))  # 每批提交的文件数
+    MAX_ARCHIVE_SIZE = int(os.getenv("MAX_ARCHIVE_SIZE", str(20 * 1024 * 1024 * 1024)))  # 上传压缩包大小上限 20GB
+    
+    # 标注导入配置
+    ANNOTATION_IMPORT_DIR = os.getenv("ANNOTATION_IMPORT_DIR", "static/imports")  # 上传的标注文件暂存目录
+    ANNOTATION_IMPORT_BATCH = int(os.getenv("ANNOTATION_IMPORT_BATCH", "5000"))  # 每批插入的标注数
+    
+    # JSON序列化配置
+    JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "auto")  # 接口响应和数据库JSON列的序列化: auto（安装了orjson时使用）、orjson、std（标准库json）
     
     # 存储优化配置
     FILES_PER_DIRECTORY = 1000  # 每个目录最多存储的文件数
@@ -6,6 +6,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from app.utils import fast_json
 
 load_dotenv()
 
@@ -13,11 +14,14 @@ load_dotenv()
 # 使用SQLite避免编码问题
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./datalabels.db")
 
+# JSON列（标注数据、标签等）的序列化，安装了orjson时使用orjson
+JSON_OPTIONS = {"json_serializer": fast_json.dumps, "json_deserializer": fast_json.loads}
+
 # 根据数据库类型创建engine
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **JSON_OPTIONS)
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **JSON_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -7,6 +7,13 @@ from .image import Image
 from .annotation import Annotation, AnnotationType, AnnotationStatus
 from .task_assignment import TaskAssignment
 from .export import ExportRecord
+from .ingest import IngestJob, IngestJobFile
+from .blob import ImageBlob
+from .upload_session import UploadSession
+from .annotation_import import AnnotationImportRecord
+from .thumbnail_job import ThumbnailJob
+from .image_annotator_state import ImageAnnotatorState
+from .task_folder_stat import TaskFolderStat
 
 __all__ = [
     "User", "UserRole",
@@ -14,5 +21,12 @@ __all__ = [
     "Image",
     "Annotation", "AnnotationType", "AnnotationStatus",
     "TaskAssignment",
-    "ExportRecord"
+    "ExportRecord",
+    "IngestJob", "IngestJobFile",
+    "ImageBlob",
+    "UploadSession",
+    "AnnotationImportRecord",
+    "ThumbnailJob",
+    "ImageAnnotatorState",
+    "TaskFolderStat"
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 """
 标注模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -23,6 +23,10 @@ class AnnotationStatus(enum.Enum):
 
 class Annotation(Base):
     __tablename__ = "annotations"
+    __table_args__ = (
+        # 按图像和标注员重新计算图像-标注员状态
+        Index("ix_annotations_image_annotator", "image_id", "annotator_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     annotation_type = Column(Enum(AnnotationType), nullable=False)
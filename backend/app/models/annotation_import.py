@@ -0,0 +1,48 @@
+"""
+标注导入记录模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, BigInteger
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class AnnotationImportRecord(Base):
+    """导入已有标注（COCO / YOLO / Pascal VOC）的后台任务"""
+    __tablename__ = "annotation_import_records"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    import_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID
+    
+    # 任务和用户信息
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 导入的标注记在该用户名下
+    
+    # 导入配置
+    format = Column(String(50), nullable=False)  # coco, yolo, pascal_voc
+    source_path = Column(String(1000), nullable=False)  # 标注文件、压缩包或目录
+    source_size = Column(BigInteger)
+    delete_source = Column(Boolean, default=False)  # 导入结束后删除来源文件（上传的文件）
+    annotation_status = Column(String(20), default="submitted")  # 导入标注的状态
+    
+    # 导入状态
+    status = Column(String(20), default="processing")  # processing, completed, failed
+    message = Column(Text)  # 状态消息
+    progress = Column(Integer, default=0)  # 0-100
+    
+    # 统计信息
+    imported_count = Column(Integer, default=0)  # 写入的标注数
+    unmatched_count = Column(Integer, default=0)  # 找不到对应图像的标注数
+    skipped_count = Column(Integer, default=0)  # 格式不支持或数据无效而跳过的标注数
+    image_count = Column(Integer, default=0)  # 获得标注的图像数
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关联关系
+    task = relationship("Task", foreign_keys=[task_id])
+    user = relationship("User", foreign_keys=[user_id])
+    
+    def __repr__(self):
+        return f"<AnnotationImportRecord(import_id='{self.import_id}', task_id={self.task_id}, format='{self.format}', status='{self.status}')>"
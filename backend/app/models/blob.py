@@ -0,0 +1,33 @@
+"""
+内容寻址图像存储模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, BigInteger, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ImageBlob(Base):
+    """按内容哈希去重存储的图像文件，多个Image记录可共享同一个文件"""
+    __tablename__ = "image_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256
+    file_path = Column(String(500), nullable=False)
+    file_size = Column(BigInteger)
+    
+    # 引用计数，归零时删除文件和缩略图
+    ref_count = Column(Integer, default=0, nullable=False)
+    
+    # 图像元数据，相同内容再次导入时直接复用，无需重新解码
+    width = Column(Integer)
+    height = Column(Integer)
+    exif_orientation = Column(Integer)
+    perceptual_hash = Column(String(16))
+    has_thumbnail = Column(Boolean, default=False)
+    thumbnail_path = Column(String(500))
+    derivatives = Column(JSON)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ImageBlob(content_hash='{self.content_hash}', ref_count={self.ref_count})>"
@@ -1,21 +1,38 @@
 """
 图像模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        Index("ix_images_task_content_hash", "task_id", "content_hash"),
+        Index("ix_images_task_id_id", "task_id", "id"),  # 任务图像列表的游标分页
+        # 任务图像列表的筛选和排序
+        Index("ix_images_task_overall_status", "task_id", "overall_status", "id"),
+        Index("ix_images_task_has_rejected", "task_id", "has_rejected", "id"),
+        Index("ix_images_task_created_at", "task_id", "created_at", "id"),
+        Index("ix_images_task_filename", "task_id", "original_filename", "id"),
+        # 文件夹前缀匹配（PostgreSQL 下 LIKE 'prefix%' 需要 pattern_ops 才能使用索引）
+        Index(
+            "ix_images_task_folder", "task_id", "folder_relative_path",
+            postgresql_ops={"folder_relative_path": "varchar_pattern_ops"}
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
     original_filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer)
+    content_hash = Column(String(64), index=True)  # SHA-256，内容寻址存储的键
     width = Column(Integer)
     height = Column(Integer)
+    exif_orientation = Column(Integer)  # EXIF方向标记，1表示无需旋转
+    perceptual_hash = Column(String(16), index=True)  # dHash，用于查找近似图像
     
     # 关联任务
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
@@ -24,6 +41,8 @@ class Image(Base):
     is_annotated = Column(Boolean, default=False)
     is_reviewed = Column(Boolean, default=False)
     annotation_status = Column(String(50), default="未标注")  # 标注状态文本: 未标注、标注中、待审核、已通过、未通过
+    overall_status = Column(String(20), default="未标注")  # 全部标注的整体状态（列表显示和筛选用，随标注增删和审核更新）
+    has_rejected = Column(Boolean, default=False)  # 是否有未通过的标注
     annotation_data = Column(JSON)  # 标注数据（遗留字段，可能废弃）
     review_notes = Column(Text)     # 审核备注
     
@@ -32,8 +51,16 @@ class Image(Base):
     required_annotation_count = Column(Integer, default=1)  # 需要的标注数量
     completed_by_users = Column(JSON, default=list)  # 已完成标注的用户ID列表
     
+    # 后台处理状态（尺寸、缩略图由后台进程池填充）
+    processing_status = Column(String(20), default="completed")  # pending, processing, completed, failed
+    processing_error = Column(Text)
+    has_thumbnail = Column(Boolean, default=False)
+    thumbnail_path = Column(String(500))  # 默认尺寸缩略图路径，列表直接据此生成URL，无需访问文件系统
+    derivatives = Column(JSON)  # 显示用中间尺寸: {"formats": [...], "variants": [{"size", "width", "height"}, ...]}
+    
     # 文件夹上传支持
     folder_relative_path = Column(String(500))  # 文件夹内的相对路径
+    folder_stats_mask = Column(Integer)  # 已计入文件夹汇总的状态位（见 folder_stats_service），NULL表示尚未计入
     
     # 时间信息
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -44,6 +71,7 @@ class Image(Base):
     # 关联关系
     task = relationship("Task", back_populates="images")
     annotations = relationship("Annotation", back_populates="image", cascade="all, delete-orphan")
+    annotator_states = relationship("ImageAnnotatorState", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<Image(id={self.id}, filename='{self.filename}')>"
@@ -0,0 +1,34 @@
+"""
+图像-标注员标注状态模型
+每个 (图像, 标注员) 一行，记录该标注员在该图像上的最新标注和各状态的标注数量，
+在标注增删、审核的同一事务中更新，读取时不需要扫描全部标注修订
+"""
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+from app.database import Base
+from app.models.annotation import AnnotationStatus
+
+class ImageAnnotatorState(Base):
+    __tablename__ = "image_annotator_states"
+    __table_args__ = (
+        # 按标注员筛选图像、统计标注员指标
+        Index("ix_image_annotator_states_annotator_image", "annotator_id", "image_id"),
+    )
+    
+    image_id = Column(Integer, ForeignKey("images.id"), primary_key=True)
+    annotator_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    # 最新一次标注（创建时间最晚，相同时取ID较大的）；不设外键，标注删除后在同一事务中重新计算
+    latest_annotation_id = Column(Integer, nullable=False)
+    latest_status = Column(Enum(AnnotationStatus), nullable=False)
+    
+    # 该标注员在该图像上各状态的标注数量（草稿数 = 总数 - 其余之和）
+    annotation_count = Column(Integer, default=0)
+    submitted_count = Column(Integer, default=0)
+    approved_count = Column(Integer, default=0)
+    rejected_count = Column(Integer, default=0)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ImageAnnotatorState(image_id={self.image_id}, annotator_id={self.annotator_id}, status='{self.latest_status}')>"
@@ -0,0 +1,71 @@
+"""
+导入任务模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class IngestJob(Base):
+    """服务器文件夹或压缩包导入任务"""
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID
+    
+    # 任务和用户信息
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # 导入来源
+    source_path = Column(String(1000), nullable=False)
+    source_type = Column(String(20), default="folder")  # folder, archive
+    delete_source = Column(Boolean, default=False)  # 导入完成后删除来源文件（上传的压缩包）
+    
+    # 导入状态
+    status = Column(String(20), default="pending")  # pending, scanning, processing, completed, failed
+    message = Column(Text)  # 状态消息
+    progress = Column(Integer, default=0)  # 0-100
+    scan_completed = Column(Boolean, default=False)  # 文件扫描是否完成，未完成时恢复需重新扫描
+    
+    # 统计信息
+    total_files = Column(Integer, default=0)
+    processed_files = Column(Integer, default=0)
+    success_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    duplicate_count = Column(Integer, default=0)  # 任务内已存在相同内容而跳过的文件数
+    duplicate_member_count = Column(Integer, default=0)  # 压缩包内路径相同的成员只导入最后一个，跳过的成员数
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关联关系
+    task = relationship("Task", foreign_keys=[task_id])
+    user = relationship("User", foreign_keys=[user_id])
+    files = relationship("IngestJobFile", back_populates="job", cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"<IngestJob(job_id='{self.job_id}', task_id={self.task_id}, status='{self.status}')>"
+
+class IngestJobFile(Base):
+    """导入任务中的单个文件，用于断点续传和逐文件错误记录"""
+    __tablename__ = "ingest_job_files"
+    __table_args__ = (
+        UniqueConstraint("job_id", "relative_path", name="uq_ingest_job_file_path"),
+        Index("ix_ingest_job_files_job_status", "job_id", "status"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("ingest_jobs.id"), nullable=False)
+    relative_path = Column(String(1000), nullable=False)  # 相对于导入文件夹的路径或压缩包内路径
+    
+    status = Column(String(20), default="pending")  # pending, completed, duplicate, failed
+    error = Column(Text)
+    image_id = Column(Integer, ForeignKey("images.id", ondelete="SET NULL"))  # 图像删除后置空
+    
+    job = relationship("IngestJob", back_populates="files")
+    
+    def __repr__(self):
+        return f"<IngestJobFile(job_id={self.job_id}, path='{self.relative_path}', status='{self.status}')>"
@@ -0,0 +1,33 @@
+"""
+任务文件夹汇总模型
+文件夹导入的每一级文件夹一行（根目录路径为空字符串），记录其下（含子文件夹）图像的数量和标注进度，
+随图像增删、标注和审核增量更新，浏览文件夹时不需要读取图像记录
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+class TaskFolderStat(Base):
+    __tablename__ = "task_folder_stats"
+    __table_args__ = (
+        UniqueConstraint("task_id", "path", name="uq_task_folder_stats_task_path"),
+        # 按父文件夹列出直接子文件夹
+        Index("ix_task_folder_stats_parent", "task_id", "parent_path", "path"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    path = Column(String(500), nullable=False)  # 以斜杠结尾的文件夹路径，根目录为空字符串
+    parent_path = Column(String(500))  # 父文件夹路径，根目录为NULL
+    name = Column(String(255), nullable=False)
+    
+    # 该文件夹及其子文件夹中的图像统计
+    image_count = Column(Integer, default=0, nullable=False)
+    annotated_count = Column(Integer, default=0, nullable=False)
+    reviewed_count = Column(Integer, default=0, nullable=False)
+    rejected_count = Column(Integer, default=0, nullable=False)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<TaskFolderStat(task_id={self.task_id}, path='{self.path}', images={self.image_count})>"
@@ -0,0 +1,49 @@
+"""
+缩略图重建任务模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class ThumbnailJob(Base):
+    """为任务或整个存储补生成/重新生成默认缩略图，按图像ID记录检查点以便中断后继续"""
+    __tablename__ = "thumbnail_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID
+    
+    # 范围和参数
+    task_id = Column(Integer, ForeignKey("tasks.id"))  # 为空表示整个存储
+    user_id = Column(Integer, ForeignKey("users.id"))  # 命令行创建时为空
+    force = Column(Boolean, default=False)  # 忽略已是最新的缩略图，全部重新生成
+    workers = Column(Integer, default=0)  # 进程数，0表示使用配置
+    
+    # 状态
+    status = Column(String(20), default="pending")  # pending, processing, completed, failed
+    message = Column(Text)
+    progress = Column(Integer, default=0)  # 0-100
+    
+    # 检查点：先处理内容寻址的 ImageBlob，再处理旧存储布局的 Image，各自按ID递增
+    phase = Column(String(20), default="blobs")  # blobs, legacy
+    last_id = Column(Integer, default=0)
+    
+    # 统计信息
+    total_items = Column(Integer, default=0)
+    processed_items = Column(Integer, default=0)
+    generated_count = Column(Integer, default=0)
+    skipped_count = Column(Integer, default=0)  # 已是最新
+    missing_count = Column(Integer, default=0)  # 原图不存在
+    failed_count = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0)  # 累计处理时间，恢复后继续累加
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True))
+    
+    task = relationship("Task", foreign_keys=[task_id])
+    user = relationship("User", foreign_keys=[user_id])
+    
+    def __repr__(self):
+        return f"<ThumbnailJob(job_id='{self.job_id}', task_id={self.task_id}, status='{self.status}')>"
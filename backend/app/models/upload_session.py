@@ -0,0 +1,42 @@
+"""
+分块上传会话模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, BigInteger
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class UploadSession(Base):
+    """可断点续传的大文件上传会话"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID
+    
+    # 任务和用户信息
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # 文件信息
+    filename = Column(String(255), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    received_size = Column(BigInteger, default=0)  # 已接收字节数，即下一块的偏移量
+    temp_path = Column(String(500), nullable=False)
+    
+    # 会话状态
+    status = Column(String(20), default="uploading", index=True)  # uploading, completed, expired, aborted
+    message = Column(Text)
+    image_id = Column(Integer, ForeignKey("images.id", ondelete="SET NULL"))  # 图像删除后置空
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    last_activity_at = Column(DateTime(timezone=True), index=True)  # 最近一次收到数据的时间，用于判断过期
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关联关系
+    task = relationship("Task", foreign_keys=[task_id])
+    user = relationship("User", foreign_keys=[user_id])
+    
+    def __repr__(self):
+        return f"<UploadSession(session_id='{self.session_id}', received={self.received_size}/{self.total_size}, status='{self.status}')>"
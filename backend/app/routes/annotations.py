@@ -1,16 +1,27 @@
 """
 标注管理API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import os
+import uuid
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.annotation import Annotation, AnnotationStatus, AnnotationType
 from app.models.image import Image
+from app.models.image_annotator_state import ImageAnnotatorState
 from app.schemas.annotation import AnnotationCreate, AnnotationUpdate, AnnotationResponse, ImageAnnotation
+from app.models.task import Task
+from app.schemas.annotation_import import AnnotationImportResponse, AnnotationImportProgress
 from app.utils.auth import get_current_user
 from app.utils.ranking_validator import validate_ranking, format_ranking
+from app.utils.storage import stream_upload_to_path, FileTooLargeError
+from app.utils.archive import is_archive_path, get_archive_extension
+from app.utils.fast_json import FastJSONResponse
+from app.services.annotation_import_service import annotation_import_service, IMPORT_FORMATS
+from app.services.annotation_status_service import refresh_image_statuses
+from app.config import settings
 
 router = APIRouter()
 
@@ -168,11 +179,135 @@ async def create_annotation(
                 ).count()
                 assignment.completed_images_count = user_completed
     
+    refresh_image_statuses(db, [image.id])
+    
     db.commit()
     db.refresh(db_annotation)
     
     return db_annotation
 
+def _get_task_for_import(db: Session, task_id: int, current_user: User) -> Task:
+    """获取导入目标任务并检查权限：管理员，或创建了该任务、被分配到该任务的算法工程师"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.ENGINEER]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role != UserRole.ADMIN and task.creator_id != current_user.id:
+        from app.models.task_assignment import TaskAssignment
+        is_assigned = db.query(TaskAssignment).filter(
+            TaskAssignment.task_id == task.id,
+            TaskAssignment.user_id == current_user.id
+        ).first() is not None
+        if not is_assigned:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="权限不足"
+            )
+    
+    return task
+
+@router.post("/import", response_model=AnnotationImportResponse)
+async def import_annotations(
+    task_id: int = Form(...),
+    format: str = Form(..., description="coco, yolo, pascal_voc"),
+    file: Optional[UploadFile] = File(None),
+    source_path: Optional[str] = Form(None),
+    annotation_status: AnnotationStatus = Form(AnnotationStatus.SUBMITTED),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    导入已有的 COCO / YOLO / Pascal VOC 标注
+    
+    上传标注文件（COCO 可以是 json，YOLO 和 VOC 为压缩包）或指定服务器上的文件/目录，
+    后台流式解析，按文件名或文件夹相对路径匹配任务中的图像，导入的标注记在当前用户名下。
+    通过 /import/{import_id} 查询进度。
+    """
+    _get_task_for_import(db, task_id, current_user)
+    
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的导入格式: {format}"
+        )
+    
+    if (file is None) == (source_path is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请上传标注文件或指定服务器上的路径（二选一）"
+        )
+    
+    source_name = file.filename if file is not None else source_path
+    is_json = source_name.lower().endswith(".json")
+    if file is not None or not os.path.isdir(source_path):
+        if not (is_archive_path(source_name) or (format == "coco" and is_json)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的文件类型: {source_name}"
+            )
+    
+    if file is not None:
+        # 上传的文件暂存到导入目录，导入结束后删除
+        os.makedirs(settings.ANNOTATION_IMPORT_DIR, exist_ok=True)
+        extension = ".json" if is_json else get_archive_extension(file.filename)
+        saved_path = os.path.join(settings.ANNOTATION_IMPORT_DIR, f"{uuid.uuid4().hex}{extension}")
+        try:
+            await stream_upload_to_path(file, saved_path, max_size=settings.MAX_ARCHIVE_SIZE)
+        except FileTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    else:
+        if not os.path.exists(source_path):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="文件或目录不存在"
+            )
+        saved_path = source_path
+    
+    import_id = await annotation_import_service.start_import(
+        task_id=task_id,
+        user_id=current_user.id,
+        format=format,
+        source_path=saved_path,
+        delete_source=file is not None,
+        annotation_status=annotation_status
+    )
+    
+    return AnnotationImportResponse(
+        import_id=import_id,
+        task_id=task_id,
+        format=format,
+        status="processing",
+        message="标注导入任务已创建，正在后台处理..."
+    )
+
+@router.get("/import/{import_id}", response_model=AnnotationImportProgress)
+async def get_import_progress(
+    import_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取标注导入进度（权限与发起导入相同）"""
+    progress = annotation_import_service.get_import_progress(import_id)
+    if not progress:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入任务不存在"
+        )
+    _get_task_for_import(db, progress.task_id, current_user)
+    return progress
+
 @router.get("", response_model=List[AnnotationResponse])
 async def get_annotations(
     image_id: Optional[int] = None,
@@ -215,26 +350,18 @@ async def get_image_annotations(
             detail="图像不存在"
         )
     
-    # 获取所有标注
-    all_annotations = db.query(Annotation).filter(Annotation.image_id == image_id).all()
-    
-    # 按标注员分组，只保留每个标注员的最新标注
-    annotator_latest = {}
-    for ann in all_annotations:
-        annotator_id = ann.annotator_id
-        if annotator_id not in annotator_latest:
-            annotator_latest[annotator_id] = ann
-        else:
-            # 比较创建时间，保留最新的
-            if ann.created_at > annotator_latest[annotator_id].created_at:
-                annotator_latest[annotator_id] = ann
+    # 每个标注员的最新标注由状态表记录，连同标注员信息一次查询
+    latest_annotations = db.query(Annotation, User).join(
+        ImageAnnotatorState, ImageAnnotatorState.latest_annotation_id == Annotation.id
+    ).outerjoin(
+        User, User.id == Annotation.annotator_id
+    ).filter(
+        ImageAnnotatorState.image_id == image_id
+    ).order_by(ImageAnnotatorState.annotator_id).all()
     
     # 转换为列表，并包含标注员信息
     final_annotations = []
-    for ann in annotator_latest.values():
-        # 获取标注员信息
-        annotator = db.query(User).filter(User.id == ann.annotator_id).first()
-        
+    for ann, annotator in latest_annotations:
         ann_dict = {
             "id": ann.id,
             "annotation_type": ann.annotation_type,
@@ -257,7 +384,8 @@ async def get_image_annotations(
         }
         final_annotations.append(ann_dict)
     
-    return {
+    # 标注数据可能很大，直接序列化，不经过 jsonable_encoder 逐值转换
+    return FastJSONResponse({
         "image_id": image.id,
         "filename": image.original_filename,
         "is_annotated": image.is_annotated,
@@ -265,7 +393,7 @@ async def get_image_annotations(
         "annotation_count": image.annotation_count or 0,
         "required_annotation_count": image.required_annotation_count or 1,
         "annotations": final_annotations
-    }
+    })
 
 @router.get("/{annotation_id}", response_model=AnnotationResponse)
 async def get_annotation(
@@ -319,6 +447,8 @@ async def update_annotation(
     for field, value in update_data.items():
         setattr(annotation, field, value)
     
+    refresh_image_statuses(db, [annotation.image_id])
+    
     db.commit()
     db.refresh(annotation)
     
@@ -391,6 +521,8 @@ async def review_annotation(
         elif status == AnnotationStatus.REJECTED:
             image.annotation_status = "未通过"
     
+    refresh_image_statuses(db, [annotation.image_id])
+    
     db.commit()
     
     return {"message": "标注审核完成"}
@@ -461,6 +593,8 @@ async def review_image_annotations(
             if image.task.status == TaskStatus.COMPLETED:
                 image.task.status = TaskStatus.REVIEWED
     
+    refresh_image_statuses(db, [image_id])
+    
     db.commit()
     
     return {
@@ -498,6 +632,8 @@ async def delete_rejected_annotations(
     for annotation in rejected_annotations:
         db.delete(annotation)
     
+    refresh_image_statuses(db, [image_id])
+    
     db.commit()
     
     return {
@@ -527,6 +663,7 @@ async def delete_annotation(
         )
     
     db.delete(annotation)
+    refresh_image_statuses(db, [annotation.image_id])
     db.commit()
     
     return {"message": "标注已删除"}
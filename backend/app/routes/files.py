@@ -1,37 +1,61 @@
 """
 文件管理API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
 from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, or_
 from typing import List, Optional
 import os
 import uuid
+import asyncio
 from datetime import datetime
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.task import Task
 from app.models.image import Image
 from app.models.annotation import Annotation, AnnotationStatus
+from app.models.image_annotator_state import ImageAnnotatorState
+from app.models.upload_session import UploadSession
+from app.models.ingest import IngestJobFile
 from app.utils.auth import get_current_user
-from app.utils.image_optimizer import ImageOptimizer
+from app.utils.storage import stream_upload_to_temp, stream_upload_to_path, discard_temp_file, hash_file, FileTooLargeError
+from app.utils.archive import is_archive_path, get_archive_extension
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from app.utils.fast_json import FastJSONResponse
+from app.utils.derivatives import (
+    DERIVATIVE_FORMAT_INFO, get_derivative_path, choose_derivative, choose_derivative_format
+)
+from app.services.blob_service import store_blob, apply_blob_metadata, release_blobs, remove_blob_files
+from app.services.image_processing_service import image_processing_service
+from app.services.ingest_service import ingest_service
+from app.services.tile_service import tile_service
+from app.services.thumbnail_service import thumbnail_service, get_cache_key
+from app.services.delivery_service import delivery_service
+from app.services.sprite_service import sprite_service
+from app.services.thumbnail_backfill_service import thumbnail_backfill_service
+from app.services.annotation_status_service import get_image_statuses
+from app.services.folder_stats_service import sync_folder_stats, remove_folder_stats, normalize_folder_path, get_child_folders
+from app.services.image_query_service import (
+    STATUS_FILTERS, STATUS_FIELDS, apply_image_filters, apply_image_sort,
+    get_cursor_values, apply_image_cursor, parse_list_fields, get_list_columns
+)
+from app.schemas.ingest import IngestJobResponse, IngestJobProgress
+from app.schemas.thumbnail_job import ThumbnailJobCreate, ThumbnailJobProgress
+from app.schemas.upload_session import UploadSessionCreate, UploadSessionStatus
+from app.services.upload_session_service import upload_session_service, ChunkOffsetError, UploadSessionClosedError
 from app.config import settings
 
-# 尝试导入PIL，如果失败则使用替代方案
-try:
-    from PIL import Image as PILImage
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
-
 router = APIRouter()
 
-def generate_unique_filename(original_filename: str, upload_dir: str, folder_path: str = None) -> tuple:
+def generate_unique_filename(original_filename: str, folder_path: str = None) -> tuple:
     """
-    生成唯一且可读的文件名
+    生成可读的文件名（用于展示和导出）
+    
+    文件实际按内容哈希存储，文件名不参与定位，因此无需访问文件系统检查重名，
+    时间戳精确到毫秒已足以区分。
     
     Args:
         original_filename: 原始文件名
-        upload_dir: 上传目录
         folder_path: 文件夹相对路径（可选）
     
     Returns:
@@ -55,32 +79,16 @@ def generate_unique_filename(original_filename: str, upload_dir: str, folder_pat
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:21]  # 精确到毫秒
     unique_filename = f"{base_name}_{timestamp}{file_extension}"
     
-    # 确保文件不存在（极少情况下可能重复）
-    counter = 1
-    final_filename = unique_filename
-    while os.path.exists(os.path.join(upload_dir, final_filename)):
-        final_filename = f"{base_name}_{timestamp}_{counter}{file_extension}"
-        counter += 1
-    
     # 显示名称（如果有文件夹路径，包含完整路径）
     if folder_path:
         display_name = f"{folder_path}/{original_filename}"
     else:
         display_name = original_filename
     
-    return final_filename, display_name
+    return unique_filename, display_name
 
-@router.post("/upload")
-async def upload_images(
-    task_id: int = Form(...),
-    files: UploadFile = File(...),  # 改为单个文件
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """上传图像文件"""
-    print(f"收到上传请求: task_id={task_id}, 文件名={files.filename}")
-    
-    # 验证任务存在
+def _get_task_for_upload(db: Session, task_id: int, current_user: User) -> Task:
+    """获取上传目标任务并检查上传权限"""
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         print(f"任务不存在: task_id={task_id}")
@@ -98,105 +106,485 @@ async def upload_images(
                 detail="权限不足"
             )
     
-    uploaded_files = []
-    file_list = [files]  # 转换为列表以保持后续代码兼容
+    return task
+
+async def _receive_upload_file(file: UploadFile) -> tuple:
+    """
+    校验上传文件并流式写入临时文件
+    
+    Returns:
+        (temp_path, file_size, content_hash)
     
-    for file in file_list:
-        # 验证文件类型
-        if not any(file.filename.lower().endswith(ext) for ext in settings.SUPPORTED_IMAGE_FORMATS):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"不支持的文件类型: {file.filename}"
-            )
+    Raises:
+        ValueError: 文件校验失败，消息可直接返回给前端
+    """
+    # 验证文件类型
+    if not any(file.filename.lower().endswith(ext) for ext in settings.SUPPORTED_IMAGE_FORMATS):
+        raise ValueError(f"不支持的文件类型: {file.filename}")
+    
+    # 验证文件大小
+    if file.size and file.size > settings.MAX_FILE_SIZE:
+        raise ValueError(f"文件过大: {file.filename}")
+    
+    # 分块流式写入，边写边计算哈希并检查大小，避免整个文件驻留内存
+    return await stream_upload_to_temp(file)
+
+def _register_upload_file(
+    db: Session,
+    original_filename: str,
+    task_id: int,
+    temp_path: str,
+    file_size: int,
+    content_hash: str
+) -> tuple:
+    """
+    将临时文件存入内容寻址存储并创建图像记录（不提交数据库）
+    
+    相同内容已处理过时直接复用尺寸和缩略图，否则由后台进程池在提交后填充。
+    
+    Returns:
+        (db_image, file_info): 未提交的Image对象和返回给前端的文件信息
+    """
+    # 生成唯一且可读的文件名（用于展示和导出）
+    unique_filename, display_name = generate_unique_filename(
+        original_filename=original_filename,
+        folder_path=None
+    )
+    
+    file_extension = os.path.splitext(original_filename)[1]
+    blob, is_new_content = store_blob(db, temp_path, content_hash, file_size, file_extension)
+    
+    db_image = Image(
+        filename=unique_filename,
+        original_filename=original_filename,
+        file_path=blob.file_path,
+        file_size=file_size,
+        content_hash=content_hash,
+        task_id=task_id,
+        processing_status="pending"
+    )
+    apply_blob_metadata(db_image, blob)
+    
+    file_info = {
+        "filename": original_filename,
+        "saved_filename": unique_filename,
+        "size": file_size,
+        "content_hash": content_hash,
+        "reused_content": not is_new_content,
+        "processing_status": db_image.processing_status
+    }
+    
+    return db_image, file_info
+
+def _duplicate_file_info(filename: str, content_hash: str, image_id: int) -> dict:
+    """任务内重复图像的返回信息"""
+    return {
+        "filename": filename,
+        "content_hash": content_hash,
+        "duplicate": True,
+        "image_id": image_id
+    }
+
+@router.post("/upload")
+async def upload_images(
+    task_id: int = Form(...),
+    files: UploadFile = File(...),  # 单个文件，批量上传请使用 /upload-batch
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """上传图像文件"""
+    print(f"收到上传请求: task_id={task_id}, 文件名={files.filename}")
+    
+    task = _get_task_for_upload(db, task_id, current_user)
+    
+    try:
+        temp_path, file_size, content_hash = await _receive_upload_file(files)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # 任务内已有相同内容的图像时不重复导入
+    existing = db.query(Image.id).filter(
+        Image.task_id == task_id,
+        Image.content_hash == content_hash
+    ).first()
+    if existing:
+        discard_temp_file(temp_path)
+        print(f"任务内已存在相同图像: image_id={existing.id}")
+        return {
+            "message": "任务中已存在相同图像，已跳过",
+            "file": _duplicate_file_info(files.filename, content_hash, existing.id)
+        }
+    
+    try:
+        db_image, file_info = _register_upload_file(db, files.filename, task_id, temp_path, file_size, content_hash)
         
-        # 验证文件大小
-        if file.size and file.size > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"文件过大: {file.filename}"
-            )
+        # 保存到数据库
+        db.add(db_image)
+        db.flush()
+        sync_folder_stats(db, [db_image.id])
         
-        # 生成唯一且可读的文件名
-        unique_filename, display_name = generate_unique_filename(
-            original_filename=file.filename,
-            upload_dir=settings.UPLOAD_DIR,
-            folder_path=None
-        )
+        # 更新任务图像数量（增量更新，避免每次全表计数）
+        task.total_images = (task.total_images or 0) + 1
         
-        # 使用分级目录存储
-        relative_dir, file_path = ImageOptimizer.get_storage_path(
-            task_id=task_id,
-            filename=unique_filename,
-            use_hash=True
+        db.commit()
+    finally:
+        # 存入存储后临时文件已不存在，中途出错时清理
+        discard_temp_file(temp_path)
+    
+    # 原图已落盘并入库，尺寸和缩略图交给后台处理
+    if db_image.processing_status == "pending":
+        image_processing_service.submit(db_image.id, db_image.file_path, task_id)
+    file_info["image_id"] = db_image.id
+    
+    print(f"上传成功: {file_info}")
+    
+    return {
+        "message": "上传成功",
+        "file": file_info
+    }
+
+@router.post("/upload-batch")
+async def upload_images_batch(
+    task_id: int = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量上传图像文件
+    
+    一次请求上传多个文件，只做一次任务查询和权限检查，
+    所有图像记录在同一事务中批量插入，任务图像数量按新增数量增量更新。
+    任务内已存在（或本批次内重复）的内容会被跳过。
+    单个文件失败不影响其他文件，结果按上传顺序逐个返回。
+    """
+    print(f"收到批量上传请求: task_id={task_id}, 文件数={len(files)}")
+    
+    if len(files) > settings.MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多上传 {settings.MAX_BATCH_UPLOAD_FILES} 个文件"
         )
+    
+    _get_task_for_upload(db, task_id, current_user)
+    
+    # 先接收全部文件，再用一次查询找出任务内已有的内容
+    received = []
+    results = []
+    for file in files:
+        try:
+            received.append((file, *await _receive_upload_file(file)))
+            results.append(None)
+        except ValueError as e:
+            results.append({
+                "filename": file.filename,
+                "success": False,
+                "error": str(e)
+            })
+        except Exception as e:
+            print(f"处理文件失败 {file.filename}: {e}")
+            results.append({
+                "filename": file.filename,
+                "success": False,
+                "error": f"保存文件失败: {file.filename}"
+            })
+    
+    new_images = []
+    try:
+        existing_images = {}
+        if received:
+            existing_images = dict(db.query(Image.content_hash, Image.id).filter(
+                Image.task_id == task_id,
+                Image.content_hash.in_([content_hash for _, _, _, content_hash in received])
+            ).all())
         
-        # 保存文件
-        content = await file.read()
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        pending_slots = [i for i, item in enumerate(results) if item is None]
+        for slot, (file, temp_path, file_size, content_hash) in zip(pending_slots, received):
+            if content_hash in existing_images:
+                discard_temp_file(temp_path)
+                results[slot] = {
+                    **_duplicate_file_info(file.filename, content_hash, None),
+                    "success": True,
+                    "_image": existing_images[content_hash]
+                }
+                continue
+            
+            db_image, file_info = _register_upload_file(db, file.filename, task_id, temp_path, file_size, content_hash)
+            existing_images[content_hash] = db_image
+            new_images.append(db_image)
+            results[slot] = {**file_info, "success": True, "_image": db_image}
         
-        # 获取图像信息
-        image_info = ImageOptimizer.get_image_info(file_path)
-        if not image_info:
-            os.remove(file_path)
+        if new_images:
+            # 批量插入，并按新增数量增量更新任务图像数，避免每次全表计数
+            db.add_all(new_images)
+            db.flush()
+            sync_folder_stats(db, [image.id for image in new_images])
+            db.query(Task).filter(Task.id == task_id).update(
+                {Task.total_images: func.coalesce(Task.total_images, 0) + len(new_images)},
+                synchronize_session=False
+            )
+        db.commit()
+    finally:
+        # 已存入存储或已丢弃的临时文件不再存在；中途出错时清理其余文件的临时文件
+        for _, temp_path, _, _ in received:
+            discard_temp_file(temp_path)
+    
+    image_processing_service.submit_many(
+        [image for image in new_images if image.processing_status == "pending"]
+    )
+    
+    # 回填图像ID，便于前端直接跳转；重复文件指向已有图像或本批次内首次出现的图像
+    for item in results:
+        image_ref = item.pop("_image", None)
+        if image_ref is not None:
+            item["image_id"] = image_ref.id if isinstance(image_ref, Image) else image_ref
+    
+    success_count = len(new_images)
+    failed_count = sum(1 for item in results if not item["success"])
+    duplicate_count = len(files) - success_count - failed_count
+    print(f"批量上传完成: 成功 {success_count}, 重复 {duplicate_count}, 失败 {failed_count}")
+    
+    return {
+        "message": f"成功上传 {success_count} 个文件，重复 {duplicate_count} 个，失败 {failed_count} 个",
+        "success_count": success_count,
+        "duplicate_count": duplicate_count,
+        "failed_count": failed_count,
+        "files": results
+    }
+
+def _get_upload_session(db: Session, session_id: str, current_user: User) -> UploadSession:
+    """获取上传会话，只有创建者和管理员可以访问"""
+    session = db.query(UploadSession).filter(UploadSession.session_id == session_id).first()
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在"
+        )
+    
+    if session.user_id != current_user.id and current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    return session
+
+def _upload_session_status(session: UploadSession) -> UploadSessionStatus:
+    """构建上传会话状态响应"""
+    return UploadSessionStatus(
+        session_id=session.session_id,
+        task_id=session.task_id,
+        filename=session.filename,
+        total_size=session.total_size,
+        received_size=session.received_size or 0,
+        chunk_size=settings.UPLOAD_SESSION_CHUNK_SIZE,
+        status=session.status,
+        message=session.message,
+        image_id=session.image_id,
+        created_at=session.created_at,
+        last_activity_at=session.last_activity_at
+    )
+
+@router.post("/upload-sessions", response_model=UploadSessionStatus)
+async def create_upload_session(
+    session_create: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    创建分块上传会话
+    
+    适用于大文件和不稳定网络：按 chunk_size 分块，用 PUT 按偏移量上传，
+    中断后通过 GET 查询 received_size 从断点继续，全部上传后调用 complete。
+    """
+    _get_task_for_upload(db, session_create.task_id, current_user)
+    
+    # 验证文件类型
+    if not any(session_create.filename.lower().endswith(ext) for ext in settings.SUPPORTED_IMAGE_FORMATS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件类型: {session_create.filename}"
+        )
+    
+    # 验证文件大小
+    if session_create.total_size <= 0 or session_create.total_size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"文件过大或为空: {session_create.filename}"
+        )
+    
+    session = upload_session_service.create_session(
+        db,
+        task_id=session_create.task_id,
+        user_id=current_user.id,
+        filename=session_create.filename,
+        total_size=session_create.total_size
+    )
+    
+    return _upload_session_status(session)
+
+@router.get("/upload-sessions/{session_id}", response_model=UploadSessionStatus)
+async def get_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """查询上传会话状态，received_size 即续传的起始偏移量"""
+    session = _get_upload_session(db, session_id, current_user)
+    upload_session_service.sync_received_size(db, session)
+    return _upload_session_status(session)
+
+@router.put("/upload-sessions/{session_id}", response_model=UploadSessionStatus)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="本块在文件中的起始偏移量"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """上传一个分块（请求体为原始字节），直接追加写入磁盘上的临时文件"""
+    session = _get_upload_session(db, session_id, current_user)
+    
+    if session.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"上传会话已结束: {session.status}"
+        )
+    
+    try:
+        await upload_session_service.append_chunk(db, session, offset, request.stream())
+    except ChunkOffsetError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except (UploadSessionClosedError, FileTooLargeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return _upload_session_status(session)
+
+@router.post("/upload-sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """完成分块上传：校验大小和内容哈希后将临时文件直接移入存储并创建图像记录"""
+    session = _get_upload_session(db, session_id, current_user)
+    
+    # 与正在写入的分块和重复的完成请求串行执行
+    async with upload_session_service.session_lock(session.session_id):
+        db.refresh(session)
+        if session.status != "uploading":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"上传会话已结束: {session.status}"
+            )
+        
+        received_size = upload_session_service.sync_received_size(db, session)
+        if received_size != session.total_size:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"无法读取图像文件: {file.filename}"
+                detail=f"文件未上传完整: {received_size}/{session.total_size}"
             )
         
-        width, height, file_size = image_info
+        task = _get_task_for_upload(db, session.task_id, current_user)
         
-        # 生成缩略图
-        thumbnail_path = ImageOptimizer.get_thumbnail_path(file_path, task_id)
-        thumbnail_generated = ImageOptimizer.generate_thumbnail(file_path, thumbnail_path)
+        # 分块可能跨多次请求和重传，完成时顺序读取一次计算内容哈希
+        file_size, content_hash = await asyncio.to_thread(hash_file, session.temp_path)
         
-        # 保存到数据库
-        db_image = Image(
-            filename=unique_filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
-            width=width,
-            height=height,
-            task_id=task_id
-        )
+        # 任务内已有相同内容的图像时不重复导入
+        existing = db.query(Image.id).filter(
+            Image.task_id == session.task_id,
+            Image.content_hash == content_hash
+        ).first()
+        if existing:
+            session.image_id = existing.id
+            upload_session_service.close_session(db, session, "completed", "任务中已存在相同图像，已跳过")
+            return {
+                "message": "任务中已存在相同图像，已跳过",
+                "file": _duplicate_file_info(session.filename, content_hash, existing.id)
+            }
         
+        db_image, file_info = _register_upload_file(
+            db, session.filename, session.task_id, session.temp_path, file_size, content_hash
+        )
         db.add(db_image)
-        uploaded_files.append({
-            "filename": file.filename,
-            "saved_filename": unique_filename,
-            "size": file_size,
-            "dimensions": f"{width}x{height}",
-            "has_thumbnail": thumbnail_generated
-        })
-    
-    # 更新任务图像数量
-    task.total_images = db.query(Image).filter(Image.task_id == task_id).count()
-    
-    db.commit()
+        task.total_images = (task.total_images or 0) + 1
+        db.flush()
+        sync_folder_stats(db, [db_image.id])
+        
+        session.image_id = db_image.id
+        upload_session_service.close_session(db, session, "completed", "上传完成")
+        
+        if db_image.processing_status == "pending":
+            image_processing_service.submit(db_image.id, db_image.file_path, session.task_id)
+        file_info["image_id"] = db_image.id
+        
+        return {
+            "message": "上传成功",
+            "file": file_info
+        }
+
+@router.delete("/upload-sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """取消上传会话并删除已上传的数据"""
+    session = _get_upload_session(db, session_id, current_user)
     
-    print(f"上传成功: {uploaded_files}")
+    if session.status == "uploading":
+        upload_session_service.close_session(db, session, "aborted", "上传已取消")
     
-    return {
-        "message": "上传成功",
-        "file": uploaded_files[0] if uploaded_files else None
-    }
+    return {"message": "上传会话已取消"}
 
 @router.get("/task/{task_id}")
 async def get_task_images(
     task_id: int,
-    skip: int = Query(0, ge=0, description="跳过的记录数"),
+    skip: int = Query(0, ge=0, description="跳过的记录数（偏移分页）"),
     limit: int = Query(20, ge=1, le=100, description="返回的记录数"),
+    mode: str = Query("offset", pattern="^(offset|cursor)$", description="分页方式: offset 偏移分页, cursor 游标分页"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，指定时使用游标分页"),
+    exact_total: Optional[bool] = Query(None, description="是否精确统计总数，默认偏移分页统计、游标分页使用任务记录的图像数"),
+    status_filter: Optional[str] = Query(None, alias="status", description="按状态筛选: 未标注、标注中、待审核、已通过、未通过"),
+    has_rejected: Optional[bool] = Query(None, description="按是否有未通过的标注筛选"),
+    folder: Optional[str] = Query(None, max_length=500, description="按文件夹前缀筛选，包含子文件夹"),
+    annotator_id: Optional[int] = Query(None, description="只返回该标注员标注过的图像（仅管理员）"),
+    created_from: Optional[datetime] = Query(None, description="上传时间不早于"),
+    created_to: Optional[datetime] = Query(None, description="上传时间早于"),
+    sort: str = Query("id", pattern="^(id|created_at|filename)$", description="排序键: id、created_at、filename"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向"),
     use_thumbnail: bool = Query(True, description="是否使用缩略图URL"),
+    use_sprite: bool = Query(True, description="是否返回缩略图拼图位置（仅按ID排序且无筛选时）"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认全部"),
+    layout: str = Query("rows", pattern="^(rows|columns)$", description="rows 每张图像一个对象, columns 每个字段一个数组"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取任务的图像列表（支持分页）
     
-    - skip: 跳过的记录数，用于分页
+    - skip: 跳过的记录数，用于偏移分页
     - limit: 每页返回的记录数，最大100
+    - mode / cursor: 游标分页按 (task_id, id) 索引从上一页末尾继续，翻页代价与深度无关；
+      第一页传 mode=cursor，之后传上一页的 next_cursor，没有更多时 next_cursor 为 null
+    - exact_total: 精确总数需要 count 查询；不需要时 total 取任务记录的图像数（total_exact 为 false）
     - use_thumbnail: 是否在列表中使用缩略图URL（节省带宽）
+    - use_sprite: 是否返回每张图像在缩略图拼图中的位置（一页缩略图只需一次请求）；
+      拼图按ID区间生成，只在按ID排序、没有筛选条件且一页图像集中在少数区间时返回，否则 sprite 为 null
+    - status / has_rejected: 按列表显示的状态筛选，标注员按自己最新一次标注判断
+    - folder / annotator_id / created_from / created_to: 按文件夹前缀、标注员、上传时间筛选
+    - sort / order: 排序键和方向，游标只能用于生成它的同一排序方式
+    - fields: 只返回指定字段，数据库只查询这些字段需要的列
+    - layout: columns 时 images 为 {字段: [各图像的值]}，适合表格视图，省去每行重复的键名
     """
     # 验证任务存在
     task = db.query(Task).filter(Task.id == task_id).first()
@@ -224,107 +612,210 @@ async def get_task_images(
                     detail="权限不足"
                 )
     
-    # 查询总数（用于分页）
-    total_count = db.query(Image).filter(Image.task_id == task_id).count()
+    try:
+        field_names = parse_list_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if status_filter is not None and status_filter not in STATUS_FILTERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的状态: {status_filter}"
+        )
+    
+    if annotator_id is not None and current_user.role == UserRole.ANNOTATOR and annotator_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    use_cursor = mode == "cursor" or cursor is not None
+    if exact_total is None:
+        exact_total = not use_cursor
+    
+    folder = normalize_folder_path(folder)
+    is_filtered = bool(folder) or any(
+        value is not None for value in (status_filter, has_rejected, annotator_id, created_from, created_to)
+    )
+    query = apply_image_filters(
+        db.query(*get_list_columns(field_names, sort)).filter(Image.task_id == task_id),
+        status_label=status_filter,
+        has_rejected=has_rejected,
+        folder=folder,
+        annotator_id=annotator_id,
+        created_from=created_from,
+        created_to=created_to,
+        viewer_id=current_user.id if current_user.role == UserRole.ANNOTATOR else None
+    )
+    
+    # 查询总数（用于分页）；不需要精确值时使用任务记录的图像数，避免每次翻页都统计。
+    # 有筛选条件时任务记录的图像数没有意义，total 为 null
+    if exact_total:
+        total_count = query.count()
+    else:
+        total_count = None if is_filtered else (task.total_images or 0)
     
     # 分页查询
-    images = db.query(Image).filter(Image.task_id == task_id).offset(skip).limit(limit).all()
-    
-    result = []
-    for img in images:
-        # 如果是标注员，显示自己的标注状态；如果是管理员，显示整体状态
-        if current_user.role == UserRole.ANNOTATOR:
-            # 获取当前标注员对该图像的标注
-            user_annotations = db.query(Annotation).filter(
-                Annotation.image_id == img.id,
-                Annotation.annotator_id == current_user.id
-            ).all()
-            
-            annotation_count = len(user_annotations)
-            
-            # 确定当前标注员的标注状态
-            if annotation_count == 0:
-                annotation_status = "未标注"
-                has_rejected = False
-            else:
-                # 获取最新的标注状态
-                latest_annotation = max(user_annotations, key=lambda a: a.created_at)
-                if latest_annotation.status == AnnotationStatus.SUBMITTED:
-                    annotation_status = "待审核"
-                    has_rejected = False
-                elif latest_annotation.status == AnnotationStatus.APPROVED:
-                    annotation_status = "已通过"
-                    has_rejected = False
-                elif latest_annotation.status == AnnotationStatus.REJECTED:
-                    annotation_status = "未通过"
-                    has_rejected = True
-                else:
-                    annotation_status = "标注中"
-                    has_rejected = False
-        else:
-            # 管理员看到的是所有标注的整体状态
-            annotations = db.query(Annotation).filter(Annotation.image_id == img.id).all()
-            
-            annotation_count = len(annotations)
-            has_rejected = any(ann.status == AnnotationStatus.REJECTED for ann in annotations)
-            has_approved = any(ann.status == AnnotationStatus.APPROVED for ann in annotations)
-            has_submitted = any(ann.status == AnnotationStatus.SUBMITTED for ann in annotations)
-            has_draft = any(ann.status == AnnotationStatus.DRAFT for ann in annotations)
-            
-            # 确定图像的整体状态
-            if annotation_count == 0:
-                annotation_status = "未标注"
-            elif has_submitted:
-                annotation_status = "待审核"
-            elif has_approved and not has_submitted:
-                if has_rejected:
-                    annotation_status = "未通过"
-                else:
-                    annotation_status = "已通过"
-            elif has_draft:
-                annotation_status = "标注中"
-            else:
-                annotation_status = "标注中"
-        
-        # 准备文件路径
-        file_path = f"/{img.file_path.replace(chr(92), '/')}" if not img.file_path.startswith('/') else img.file_path.replace(chr(92), '/')
-        
-        # 如果使用缩略图，尝试生成缩略图URL
-        if use_thumbnail:
-            thumbnail_path = ImageOptimizer.get_thumbnail_path(img.file_path, task_id)
-            if os.path.exists(thumbnail_path):
-                # 缩略图存在，使用缩略图路径
-                thumbnail_url = f"/{thumbnail_path.replace(chr(92), '/')}" if not thumbnail_path.startswith('/') else thumbnail_path.replace(chr(92), '/')
-            else:
-                # 缩略图不存在，使用原图
-                thumbnail_url = file_path
-        else:
-            thumbnail_url = file_path
-        
-        result.append({
-            "id": img.id,
-            "filename": img.original_filename,
-            "file_path": file_path,  # 原图路径
-            "thumbnail_url": thumbnail_url,  # 缩略图路径（列表展示用）
-            "is_annotated": img.is_annotated,
-            "is_reviewed": img.is_reviewed,
-            "annotation_count": annotation_count,
-            "required_annotation_count": img.required_annotation_count or 1,
-            "annotation_status": annotation_status,
-            "has_rejected": has_rejected,
-            "folder_relative_path": img.folder_relative_path,
-            "created_at": img.created_at,
-            "width": img.width,
-            "height": img.height
-        })
+    if use_cursor:
+        if cursor:
+            try:
+                query = apply_image_cursor(query, decode_cursor(cursor), sort, order)
+            except InvalidCursorError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        # 多取一条判断是否还有下一页
+        images = apply_image_sort(query, sort, order).limit(limit + 1).all()
+        has_more = len(images) > limit
+        images = images[:limit]
+    else:
+        images = apply_image_sort(query, sort, order).offset(skip).limit(limit + 1).all()
+        has_more = len(images) > limit
+        images = images[:limit]
     
-    return {
+    image_ids = [img.id for img in images]
+    # 其他排序方式或筛选后一页图像的ID分散，拼图中的大部分单元格用不到，改用单独的缩略图
+    sprites = (
+        sprite_service.get_page_sprites(db, task_id, image_ids)
+        if use_sprite and sort == "id" and not is_filtered and "sprite" in field_names else {}
+    )
+    
+    # 一次分组查询汇总本页图像的标注状态：标注员看到自己的标注状态，管理员看到整体状态
+    statuses = get_image_statuses(
+        db, image_ids,
+        annotator_id=current_user.id if current_user.role == UserRole.ANNOTATOR else None
+    ) if STATUS_FIELDS.intersection(field_names) else {}
+    
+    def get_file_path(img):
+        return f"/{img.file_path.replace(chr(92), '/')}" if not img.file_path.startswith('/') else img.file_path.replace(chr(92), '/')
+    
+    def get_thumbnail_url(img):
+        # 如果使用缩略图，根据数据库中记录的缩略图路径生成URL（不访问文件系统）
+        if not use_thumbnail:
+            return get_file_path(img)
+        if img.thumbnail_path:
+            return f"/{img.thumbnail_path.replace(chr(92), '/')}" if not img.thumbnail_path.startswith('/') else img.thumbnail_path.replace(chr(92), '/')
+        # 缩略图不存在（如文件夹导入尚未处理完成），由缩略图接口按需生成
+        return f"/api/files/{img.id}/thumbnail"
+    
+    field_getters = {
+        "id": lambda img: img.id,
+        "filename": lambda img: img.original_filename,
+        "file_path": get_file_path,  # 原图路径
+        "thumbnail_url": get_thumbnail_url,  # 缩略图路径（列表展示用）
+        "sprite": lambda img: sprites.get(img.id),  # 缩略图在拼图中的位置，不在拼图中时为null
+        "is_annotated": lambda img: img.is_annotated,
+        "is_reviewed": lambda img: img.is_reviewed,
+        "annotation_count": lambda img: statuses[img.id]["annotation_count"],
+        "required_annotation_count": lambda img: img.required_annotation_count or 1,
+        "annotation_status": lambda img: statuses[img.id]["annotation_status"],
+        "has_rejected": lambda img: statuses[img.id]["has_rejected"],
+        "folder_relative_path": lambda img: img.folder_relative_path,
+        "created_at": lambda img: img.created_at,
+        "width": lambda img: img.width,
+        "height": lambda img: img.height,
+    }
+    getters = [(name, field_getters[name]) for name in field_names]
+    
+    if layout == "columns":
+        result = {name: [getter(img) for img in images] for name, getter in getters}
+    else:
+        result = [{name: getter(img) for name, getter in getters} for img in images]
+    
+    return FastJSONResponse({
         "total": total_count,
-        "skip": skip,
+        "total_exact": exact_total,
+        "skip": None if use_cursor else skip,
         "limit": limit,
-        "has_more": (skip + limit) < total_count,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(get_cursor_values(images[-1], sort, order)) if use_cursor and has_more else None,
+        "layout": layout,
+        "fields": field_names,
         "images": result
-    }
+    })
+
+@router.get("/task/{task_id}/folders")
+async def get_task_folders(
+    task_id: int,
+    prefix: str = Query("", max_length=500, description="父文件夹路径，默认根目录"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    列出任务中某个文件夹的直接子文件夹及各自的图像数、已标注数、已审核数和有未通过标注的图像数
+    
+    统计包含子文件夹中的图像，从随标注和审核增量更新的文件夹汇总表读取，不访问图像记录；
+    子文件夹的图像可以用任务图像列表的 folder 参数查看
+    """
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    # 权限检查
+    if current_user.role == UserRole.ANNOTATOR and task.assignee_id != current_user.id:
+        from app.models.task_assignment import TaskAssignment
+        is_assigned = db.query(TaskAssignment).filter(
+            TaskAssignment.task_id == task_id,
+            TaskAssignment.user_id == current_user.id,
+            TaskAssignment.role == "annotator"
+        ).first() is not None
+        
+        if not is_assigned:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="权限不足"
+            )
+    
+    result = get_child_folders(db, task_id, normalize_folder_path(prefix))
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文件夹不存在"
+        )
+    
+    return FastJSONResponse({"task_id": task_id, **result})
+
+@router.get("/task/{task_id}/sprites/{block}_{version}.jpg")
+async def get_task_sprite(
+    task_id: int,
+    block: int,
+    version: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    获取缩略图拼图，首次请求时生成
+    
+    版本号由区间内的图像计算，图像增删后列表返回新的URL，旧版本返回404；
+    因此同一URL的内容不会变化，可以永久缓存。
+    与缩略图一样不需要认证（<img> 和 CSS 背景图无法携带令牌）。
+    """
+    try:
+        sprite_path = await sprite_service.get_sprite(db, task_id, block, version)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"生成拼图失败: {str(e)}"
+        )
+    
+    if sprite_path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="拼图不存在或已过期"
+        )
+    
+    # 拼图路径中没有内容哈希，用版本号作为强ETag
+    return delivery_service.file_response(
+        request.headers, sprite_path, "sprite", media_type="image/jpeg", immutable=True,
+        extra_headers={"ETag": f'"sprite-{task_id}-{block}-{version}"'}
+    )
 
 @router.get("/task/{task_id}/next-unannotated")
 async def get_next_unannotated_image(
@@ -335,7 +826,6 @@ async def get_next_unannotated_image(
 ):
     """获取下一张未标注的图像"""
     from app.models.task_assignment import TaskAssignment
-    from app.models.annotation import Annotation
     
     # 验证任务存在
     task = db.query(Task).filter(Task.id == task_id).first()
@@ -358,58 +848,180 @@ async def get_next_unannotated_image(
                 detail="权限不足"
             )
     
-    # 查询未被当前用户标注的图像
-    # 获取所有图像
-    all_images = db.query(Image).filter(Image.task_id == task_id).order_by(Image.id).all()
+    # 当前用户在图像上的标注状态（状态表按 (image_id, annotator_id) 主键关联）
+    own_state = and_(
+        ImageAnnotatorState.image_id == Image.id,
+        ImageAnnotatorState.annotator_id == current_user.id
+    )
+    base_query = db.query(Image).outerjoin(ImageAnnotatorState, own_state).filter(Image.task_id == task_id)
     
-    # 找到下一张需要标注的图像（未标注或标注被拒绝）
-    for img in all_images:
-        # 跳过当前图像之前的所有图像
-        if current_image_id and img.id <= current_image_id:
-            continue
-        
-        # 检查该图像的标注状态
-        user_annotations = db.query(Annotation).filter(
-            Annotation.image_id == img.id,
-            Annotation.annotator_id == current_user.id
-        ).all()
-        
-        # 如果没有标注，或者所有标注都被拒绝，则需要标注
-        needs_annotation = (
-            len(user_annotations) == 0 or  # 未标注
-            all(ann.status == AnnotationStatus.REJECTED for ann in user_annotations)  # 所有标注都被拒绝
-        )
-        
-        if needs_annotation:
-            return {
-                "id": img.id,
-                "filename": img.original_filename,
-                "file_path": f"/{img.file_path.replace(chr(92), '/')}" if not img.file_path.startswith('/') else img.file_path.replace(chr(92), '/'),
-                "width": img.width,
-                "height": img.height,
-                "task_id": task_id
-            }
+    # 找到下一张需要标注的图像：未标注，或该用户的标注都被拒绝
+    needs_annotation = or_(
+        ImageAnnotatorState.image_id.is_(None),
+        ImageAnnotatorState.rejected_count == ImageAnnotatorState.annotation_count
+    )
+    query = base_query.filter(needs_annotation)
+    if current_image_id:
+        query = query.filter(Image.id > current_image_id)
+    img = query.order_by(Image.id).first()
     
     # 如果没有找到，返回第一张未标注的（从头开始）
-    for img in all_images:
-        user_annotation = db.query(Annotation).filter(
-            Annotation.image_id == img.id,
-            Annotation.annotator_id == current_user.id
-        ).first()
-        
-        if not user_annotation:
-            return {
-                "id": img.id,
-                "filename": img.original_filename,
-                "file_path": f"/{img.file_path.replace(chr(92), '/')}" if not img.file_path.startswith('/') else img.file_path.replace(chr(92), '/'),
-                "width": img.width,
-                "height": img.height,
-                "task_id": task_id
-            }
+    if img is None:
+        img = base_query.filter(ImageAnnotatorState.image_id.is_(None)).order_by(Image.id).first()
+    
+    if img is not None:
+        return {
+            "id": img.id,
+            "filename": img.original_filename,
+            "file_path": f"/{img.file_path.replace(chr(92), '/')}" if not img.file_path.startswith('/') else img.file_path.replace(chr(92), '/'),
+            "width": img.width,
+            "height": img.height,
+            "task_id": task_id
+        }
     
     # 所有图像都已标注
     return None
 
+@router.get("/processing-status")
+async def get_processing_status(
+    image_ids: List[int] = Query(..., description="要查询的图像ID，可重复传入"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    查询图像后台处理状态（尺寸、缩略图是否已生成）
+    
+    标注员只能查询自己创建或被分配的任务中的图像，其他图像不返回
+    """
+    query = db.query(
+        Image.id, Image.processing_status, Image.processing_error,
+        Image.has_thumbnail, Image.width, Image.height
+    ).join(Task, Image.task_id == Task.id).filter(Image.id.in_(image_ids))
+    
+    # 权限检查（与任务图像列表相同）
+    if current_user.role == UserRole.ANNOTATOR:
+        from app.models.task_assignment import TaskAssignment
+        is_assigned = db.query(TaskAssignment.id).filter(
+            TaskAssignment.task_id == Task.id,
+            TaskAssignment.user_id == current_user.id,
+            TaskAssignment.role == "annotator"
+        ).exists()
+        query = query.filter(or_(
+            Task.creator_id == current_user.id,
+            Task.assignee_id == current_user.id,
+            is_assigned
+        ))
+    
+    images = query.all()
+    
+    return {
+        "images": [
+            {
+                "id": image_id,
+                "processing_status": processing_status or "completed",
+                "processing_error": processing_error,
+                "has_thumbnail": bool(has_thumbnail),
+                "width": width,
+                "height": height
+            }
+            for image_id, processing_status, processing_error, has_thumbnail, width, height in images
+        ]
+    }
+
+@router.get("/delivery-stats")
+async def get_delivery_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    图像分发统计（自服务启动以来）
+    
+    - not_modified: 客户端或代理缓存命中（304）
+    - full / partial: 完整发送 / 范围请求
+    - hit / miss: 缩略图、瓦片、中间尺寸在服务端是否已生成
+    """
+    if current_user.role not in [UserRole.ADMIN, UserRole.ENGINEER]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    return {
+        "counters": delivery_service.get_stats(),
+        "thumbnail_cache": thumbnail_service.get_stats()
+    }
+
+@router.post("/thumbnail-jobs", response_model=ThumbnailJobProgress)
+async def create_thumbnail_job(
+    job_data: ThumbnailJobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    为任务或整个存储（不指定task_id）补生成/重新生成默认缩略图（仅管理员）
+    
+    已是最新的缩略图（不早于原图且生成参数与当前配置一致）会被跳过，force 时全部重新生成。
+    任务在后台进程池中执行，通过 /thumbnail-jobs/{job_id} 查询进度和吞吐；
+    命令行可使用 backfill_thumbnails.py。
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    if job_data.task_id is not None and not db.query(Task.id).filter(Task.id == job_data.task_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    job_id = await thumbnail_backfill_service.start_job(
+        task_id=job_data.task_id,
+        user_id=current_user.id,
+        force=job_data.force,
+        workers=job_data.workers
+    )
+    return thumbnail_backfill_service.get_job_progress(job_id)
+
+@router.get("/thumbnail-jobs/{job_id}", response_model=ThumbnailJobProgress)
+async def get_thumbnail_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """获取缩略图重建任务的进度和吞吐（仅管理员）"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    progress = thumbnail_backfill_service.get_job_progress(job_id)
+    if not progress:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="缩略图重建任务不存在"
+        )
+    return progress
+
+@router.post("/thumbnail-jobs/{job_id}/resume", response_model=ThumbnailJobProgress)
+async def resume_thumbnail_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """从检查点恢复失败或中断的缩略图重建任务（仅管理员）"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    if thumbnail_backfill_service.is_running(job_id) or not await thumbnail_backfill_service.resume_job(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="缩略图重建任务不存在、正在运行或已完成"
+        )
+    return thumbnail_backfill_service.get_job_progress(job_id)
+
 @router.get("/{image_id}")
 async def get_image(
     image_id: int,
@@ -448,6 +1060,22 @@ async def get_image(
     relative_path = image.file_path.replace('\\', '/')  # Windows 兼容
     image_url = f"/{relative_path}" if not relative_path.startswith('/') else relative_path
     
+    # 超大图像返回瓦片金字塔信息，并在后台预生成瓦片
+    pyramid = tile_service.get_pyramid_info(image)
+    if pyramid and not pyramid["ready"]:
+        tile_service.schedule(image)
+    
+    # 显示用中间尺寸，前端按显示尺寸选择足够清晰的最小尺寸
+    display = None
+    if image.derivatives and image.derivatives.get("variants"):
+        display_size = tile_service.get_display_size(image)
+        display = {
+            "url": f"/api/files/{image.id}/display",
+            "width": display_size[0] if display_size else None,
+            "height": display_size[1] if display_size else None,
+            "variants": image.derivatives["variants"]
+        }
+    
     return {
         "id": image.id,
         "filename": image.original_filename,
@@ -457,9 +1085,133 @@ async def get_image(
         "is_annotated": image.is_annotated,
         "is_reviewed": image.is_reviewed,
         "annotation_data": image.annotation_data,
+        "processing_status": image.processing_status or "completed",
+        "pyramid": pyramid,  # 超大图像的瓦片金字塔信息，小图为null
+        "display": display,  # 显示用中间尺寸，尚未生成时为null
         "created_at": image.created_at
     }
 
+@router.get("/{image_id}/display")
+async def get_image_display(
+    image_id: int,
+    request: Request,
+    size: int = Query(None, ge=1, description="需要的长边像素数，返回不小于该尺寸的最小中间尺寸"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取显示用中间尺寸
+    
+    按 Accept 头返回 AVIF/WebP，不支持时返回 JPEG；没有中间尺寸的图像返回原图。
+    与 /static 下的原图一样不需要认证（画布用 <img> 加载图像无法携带令牌）。
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图像不存在"
+        )
+    
+    derivatives = image.derivatives or {}
+    variant = choose_derivative(derivatives.get("variants") or [], size)
+    if variant and image.content_hash:
+        format_name = choose_derivative_format(request.headers.get("accept"), derivatives.get("formats") or [])
+        derivative_path = get_derivative_path(image.content_hash, variant["size"], format_name)
+        if os.path.exists(derivative_path):
+            delivery_service.record("derivative", "hit")
+            return delivery_service.file_response(
+                request.headers, derivative_path, "derivative",
+                media_type=DERIVATIVE_FORMAT_INFO[format_name][1],
+                extra_headers={"Vary": "Accept"}
+            )
+    
+    if not os.path.exists(image.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图像文件不存在"
+        )
+    
+    # 中间尺寸生成后同一URL应改为返回中间尺寸，原图不能永久缓存
+    delivery_service.record("derivative", "miss")
+    return delivery_service.file_response(request.headers, image.file_path, "derivative", immutable=False)
+
+@router.get("/{image_id}/thumbnail")
+async def get_image_thumbnail(
+    image_id: int,
+    request: Request,
+    size: int = Query(None, ge=16, le=4096, description="缩略图最长边，向上取整到可选尺寸"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取指定尺寸的缩略图，首次请求时生成并缓存
+    
+    与 /static 下的原图一样不需要认证（列表用 <img> 加载缩略图无法携带令牌）。
+    未指定尺寸且上传时已生成默认缩略图时直接返回该缩略图。
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图像不存在"
+        )
+    
+    if size is None and image.thumbnail_path:
+        return delivery_service.file_response(request.headers, image.thumbnail_path, "thumbnail", media_type="image/jpeg")
+    
+    try:
+        thumbnail_path = await thumbnail_service.get_thumbnail(image, size or max(settings.THUMBNAIL_SIZE))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"生成缩略图失败: {str(e)}"
+        )
+    
+    # 缩略图修改配置后在同一路径重新生成，ETag 随文件版本变化，客户端每次使用前确认
+    return delivery_service.file_response(request.headers, thumbnail_path, "thumbnail", media_type="image/jpeg")
+
+@router.get("/{image_id}/tiles/{level}/{x}_{y}")
+async def get_image_tile(
+    image_id: int,
+    level: int,
+    x: int,
+    y: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    获取超大图像的 DeepZoom 瓦片
+    
+    与 /static 下的原图一样不需要认证（画布用 <img> 加载瓦片无法携带令牌）。
+    金字塔尚未生成时在后台进程中生成，同一图像的并发请求只生成一次。
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image or not tile_service.needs_pyramid(image):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="瓦片不存在"
+        )
+    
+    if not tile_service.is_valid_tile(image, level, x, y):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="瓦片不存在"
+        )
+    
+    tile_path = tile_service.get_tile_path(image, level, x, y)
+    if os.path.exists(tile_path):
+        delivery_service.record("tile_cache", "hit")
+    else:
+        delivery_service.record("tile_cache", "miss")
+        try:
+            await tile_service.ensure_pyramid(image)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"生成瓦片失败: {str(e)}"
+            )
+    
+    # 按内容哈希存放的瓦片内容不会变化，可以永久缓存
+    return delivery_service.file_response(request.headers, tile_path, "tile", media_type="image/jpeg")
+
 @router.delete("/{image_id}")
 async def delete_image(
     image_id: int,
@@ -482,122 +1234,180 @@ async def delete_image(
                 detail="权限不足"
             )
     
-    # 删除文件
-    if os.path.exists(image.file_path):
-        os.remove(image.file_path)
+    removed_paths = []
+    if image.content_hash:
+        # 内容寻址存储的文件可能被其他图像共享，引用归零时才删除
+        removed_paths = release_blobs(db, {image.content_hash: 1})
+    else:
+        if os.path.exists(image.file_path):
+            # 删除文件
+            os.remove(image.file_path)
+        thumbnail_service.discard([get_cache_key(image)])
+    
+    # 更新任务图像数量
+    if image.task:
+        image.task.total_images = max((image.task.total_images or 0) - 1, 0)
     
-    # 删除数据库记录
+    # 删除数据库记录；SQLite 默认不执行外键的 ON DELETE，导入记录和上传会话中的引用单独置空
+    db.query(IngestJobFile).filter(IngestJobFile.image_id == image.id).update(
+        {IngestJobFile.image_id: None}, synchronize_session=False
+    )
+    db.query(UploadSession).filter(UploadSession.image_id == image.id).update(
+        {UploadSession.image_id: None}, synchronize_session=False
+    )
+    remove_folder_stats(db, [image.id])
     db.delete(image)
     db.commit()
     
+    remove_blob_files(removed_paths)
+    
     return {"message": "图像已删除"}
 
-@router.post("/upload-folder")
+@router.post("/upload-folder", response_model=IngestJobResponse)
 async def upload_folder(
     task_id: int = Form(...),
     folder_path: str = Form(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """上传文件夹中的所有图像"""
+    """
+    导入服务器文件夹中的所有图像
+    
+    创建后台导入任务后立即返回，通过 /ingest-jobs/{job_id} 查询进度和失败文件。
+    文件并行复制和探测，分块提交；服务重启后未完成的任务会从中断处继续。
+    """
     print(f"收到文件夹上传请求: task_id={task_id}, 文件夹路径={folder_path}")
     
-    # 验证任务存在
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
+    _get_task_for_upload(db, task_id, current_user)
+    
+    # 检查文件夹是否存在
+    if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="任务不存在"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件夹不存在或不是有效目录"
         )
     
-    # 权限检查：只有管理员、算法工程师或任务创建者可以上传
-    if current_user.role not in [UserRole.ADMIN, UserRole.ENGINEER]:
-        if task.creator_id != current_user.id:
+    job_id = await ingest_service.start_ingest(
+        task_id=task_id,
+        source_path=folder_path,
+        user_id=current_user.id
+    )
+    
+    return IngestJobResponse(
+        job_id=job_id,
+        task_id=task_id,
+        status="pending",
+        message="文件夹导入任务已创建，正在后台处理..."
+    )
+
+@router.post("/upload-archive", response_model=IngestJobResponse)
+async def upload_archive(
+    task_id: int = Form(...),
+    file: Optional[UploadFile] = File(None),
+    archive_path: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    导入 zip/tar 压缩包中的所有图像（上传压缩包或指定服务器上的压缩包路径）
+    
+    压缩包不会被解压到磁盘：图像成员按包内顺序流式写入存储，非图像成员直接跳过，
+    包内路径记录在图像的 folder_relative_path 中。进度查询和恢复与文件夹导入相同。
+    """
+    _get_task_for_upload(db, task_id, current_user)
+    
+    if (file is None) == (archive_path is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请上传压缩包或指定服务器上的压缩包路径（二选一）"
+        )
+    
+    source_name = file.filename if file is not None else archive_path
+    if not is_archive_path(source_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的压缩包类型: {source_name}"
+        )
+    
+    if file is not None:
+        # 上传的压缩包保存在存储目录内，导入完成后删除；导入中断时保留以便恢复
+        archive_dir = os.path.join(settings.BLOB_DIR, "tmp", "archives")
+        os.makedirs(archive_dir, exist_ok=True)
+        source_path = os.path.join(archive_dir, f"{uuid.uuid4().hex}{get_archive_extension(file.filename)}")
+        try:
+            await stream_upload_to_path(file, source_path, max_size=settings.MAX_ARCHIVE_SIZE)
+        except FileTooLargeError as e:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="权限不足"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
             )
+    else:
+        if not os.path.isfile(archive_path):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="压缩包不存在"
+            )
+        source_path = archive_path
     
-    # 检查文件夹是否存在
-    if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
+    job_id = await ingest_service.start_ingest(
+        task_id=task_id,
+        source_path=source_path,
+        user_id=current_user.id,
+        source_type="archive",
+        delete_source=file is not None
+    )
+    
+    return IngestJobResponse(
+        job_id=job_id,
+        task_id=task_id,
+        status="pending",
+        message="压缩包导入任务已创建，正在后台处理..."
+    )
+
+@router.get("/ingest-jobs/{job_id}", response_model=IngestJobProgress)
+async def get_ingest_job(
+    job_id: str,
+    errors_limit: int = Query(100, ge=0, le=1000, description="返回的失败文件数量上限"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取文件夹或压缩包导入任务的进度和失败文件"""
+    progress = ingest_service.get_job_progress(job_id, errors_limit=errors_limit)
+    if not progress:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件夹不存在或不是有效目录"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入任务不存在"
         )
     
-    # 确保上传目录存在
-    upload_dir = os.path.join(settings.UPLOAD_DIR, str(task_id))
-    os.makedirs(upload_dir, exist_ok=True)
+    _get_task_for_upload(db, progress.task_id, current_user)
     
-    uploaded_files = []
-    supported_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp']
+    return progress
+
+@router.post("/ingest-jobs/{job_id}/resume", response_model=IngestJobResponse)
+async def resume_ingest_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """从中断处恢复失败的文件夹导入任务"""
+    progress = ingest_service.get_job_progress(job_id, errors_limit=0)
+    if not progress:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入任务不存在"
+        )
     
-    # 遍历文件夹中的所有文件
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            # 检查文件扩展名
-            file_path = os.path.join(root, file)
-            file_ext = os.path.splitext(file)[1].lower()
-            
-            if file_ext not in supported_extensions:
-                continue
-            
-            try:
-                # 计算相对路径（相对于上传的文件夹）
-                relative_path = os.path.relpath(file_path, folder_path)
-                # 获取相对路径中的目录部分（不包含文件名）
-                relative_dir = os.path.dirname(relative_path)
-                
-                # 生成唯一且可读的文件名（包含文件夹路径信息）
-                unique_filename, display_name = generate_unique_filename(
-                    original_filename=file,
-                    upload_dir=upload_dir,
-                    folder_path=relative_dir if relative_dir and relative_dir != '.' else None
-                )
-                target_path = os.path.join(upload_dir, unique_filename)
-                
-                # 复制文件
-                import shutil
-                shutil.copy2(file_path, target_path)
-                
-                # 获取图像信息
-                if PIL_AVAILABLE:
-                    try:
-                        with PILImage.open(target_path) as img:
-                            width, height = img.size
-                    except Exception:
-                        os.remove(target_path)
-                        continue
-                else:
-                    width, height = 800, 600
-                
-                # 保存到数据库
-                db_image = Image(
-                    task_id=task_id,
-                    filename=unique_filename,  # 使用新的唯一文件名
-                    original_filename=file,
-                    file_path=target_path,
-                    width=width,
-                    height=height,
-                    folder_relative_path=relative_path  # 记录文件夹内的相对路径
-                )
-                
-                db.add(db_image)
-                uploaded_files.append({
-                    "filename": file,
-                    "relative_path": relative_path,
-                    "width": width,
-                    "height": height
-                })
-                
-            except Exception as e:
-                print(f"处理文件失败 {file_path}: {e}")
-                continue
+    _get_task_for_upload(db, progress.task_id, current_user)
     
-    db.commit()
+    if not await ingest_service.resume_ingest(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="导入任务已完成，无需恢复"
+        )
     
-    return {
-        "message": f"成功上传 {len(uploaded_files)} 个图像文件",
-        "uploaded_files": uploaded_files,
-        "count": len(uploaded_files)
-    }
+    return IngestJobResponse(
+        job_id=job_id,
+        task_id=progress.task_id,
+        status="pending",
+        message="导入任务已恢复，正在后台处理..."
+    )
@@ -3,19 +3,21 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case, and_
 from typing import List, Optional
 from datetime import datetime
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.annotation import Annotation, AnnotationStatus
 from app.models.image import Image
+from app.models.image_annotator_state import ImageAnnotatorState
 from app.models.task import Task
 from app.schemas.quality_control import (
     QualityReviewCreate, QualityReviewResponse,
     QualityMetrics, AnnotationReview, ReviewStats
 )
 from app.utils.auth import get_current_user
+from app.services.annotation_status_service import refresh_image_statuses
 
 router = APIRouter()
 
@@ -134,6 +136,8 @@ async def review_annotation(
             ).count()
             annotation.image.task.reviewed_images = reviewed_count
     
+    refresh_image_statuses(db, [annotation.image_id])
+    
     db.commit()
     
     return {"message": "审核完成", "status": review.status.value}
@@ -169,31 +173,24 @@ async def get_quality_metrics(
         Image.is_reviewed == True
     ).count()
     
-    # 已通过审核的图像数量（所有标注都已通过）
-    approved_images = 0
-    rejected_images = 0
-    pending_images = 0
-    
-    # 遍历所有图像，统计状态
-    images = db.query(Image).filter(Image.task_id == task_id).all()
-    for image in images:
-        # 获取该图像的所有标注
-        annotations = db.query(Annotation).filter(Annotation.image_id == image.id).all()
-        
-        if not annotations:
-            continue
-            
-        # 统计标注状态
-        has_approved = any(ann.status == AnnotationStatus.APPROVED for ann in annotations)
-        has_rejected = any(ann.status == AnnotationStatus.REJECTED for ann in annotations)
-        has_submitted = any(ann.status == AnnotationStatus.SUBMITTED for ann in annotations)
-        
-        if has_submitted:
-            pending_images += 1
-        elif has_approved and not has_rejected and not has_submitted:
-            approved_images += 1
-        elif has_rejected:
-            rejected_images += 1
+    # 按图像汇总状态表中各标注员的状态，统计已通过、已拒绝、待审核的图像数量
+    has_submitted = func.max(ImageAnnotatorState.submitted_count) > 0
+    has_approved = func.max(ImageAnnotatorState.approved_count) > 0
+    has_rejected = func.max(ImageAnnotatorState.rejected_count) > 0
+    image_states = db.query(
+        case((has_submitted, 1), else_=0).label("pending"),
+        case((and_(~has_submitted, has_approved, ~has_rejected), 1), else_=0).label("approved"),
+        case((and_(~has_submitted, has_rejected), 1), else_=0).label("rejected")
+    ).join(
+        Image, Image.id == ImageAnnotatorState.image_id
+    ).filter(
+        Image.task_id == task_id
+    ).group_by(ImageAnnotatorState.image_id).subquery()
+    pending_images, approved_images, rejected_images = db.query(
+        func.coalesce(func.sum(image_states.c.pending), 0),
+        func.coalesce(func.sum(image_states.c.approved), 0),
+        func.coalesce(func.sum(image_states.c.rejected), 0)
+    ).one()
     
     # 计算通过率（按图像数量）
     if reviewed_images > 0:
@@ -201,58 +198,35 @@ async def get_quality_metrics(
     else:
         approval_rate = 0
     
-    # 按标注员统计 - 按图像数量计算
-    annotator_metrics = []
-    
-    # 获取所有参与标注的用户
-    annotator_ids = db.query(Annotation.annotator_id).join(Image).filter(
+    # 按标注员统计 - 按图像数量计算，每个标注员一行
+    annotator_approved = and_(
+        ImageAnnotatorState.approved_count > 0,
+        ImageAnnotatorState.rejected_count == 0,
+        ImageAnnotatorState.submitted_count == 0
+    )
+    annotator_rows = db.query(
+        User.id,
+        User.full_name,
+        func.count(ImageAnnotatorState.image_id),
+        func.sum(case((annotator_approved, 1), else_=0)),
+        func.sum(case((ImageAnnotatorState.rejected_count > 0, 1), else_=0))
+    ).join(
+        ImageAnnotatorState, ImageAnnotatorState.annotator_id == User.id
+    ).join(
+        Image, Image.id == ImageAnnotatorState.image_id
+    ).filter(
         Image.task_id == task_id
-    ).distinct().all()
+    ).group_by(User.id, User.full_name).order_by(User.id).all()
     
-    for annotator_id_tuple in annotator_ids:
-        annotator_id = annotator_id_tuple[0]
-        user = db.query(User).filter(User.id == annotator_id).first()
-        if not user:
-            continue
-            
-        # 获取该标注员标注的所有图像
-        user_images = db.query(Image).join(Annotation).filter(
-            Image.task_id == task_id,
-            Annotation.annotator_id == annotator_id
-        ).distinct().all()
-        
-        total_images = len(user_images)
-        approved_images = 0
-        rejected_images = 0
-        
-        # 统计该标注员的图像状态
-        for image in user_images:
-            annotations = db.query(Annotation).filter(
-                Annotation.image_id == image.id,
-                Annotation.annotator_id == annotator_id
-            ).all()
-            
-            if not annotations:
-                continue
-                
-            has_approved = any(ann.status == AnnotationStatus.APPROVED for ann in annotations)
-            has_rejected = any(ann.status == AnnotationStatus.REJECTED for ann in annotations)
-            has_submitted = any(ann.status == AnnotationStatus.SUBMITTED for ann in annotations)
-            
-            if has_approved and not has_rejected and not has_submitted:
-                approved_images += 1
-            elif has_rejected:
-                rejected_images += 1
-        
-        approval_rate = (approved_images / total_images * 100) if total_images > 0 else 0
-        
+    annotator_metrics = []
+    for annotator_id, annotator_name, user_images, user_approved, user_rejected in annotator_rows:
         annotator_metrics.append({
             "annotator_id": annotator_id,
-            "annotator_name": user.full_name,
-            "total_annotations": total_images,  # 总图像数
-            "approved_count": approved_images,  # 已通过图像数
-            "rejected_count": rejected_images,  # 已拒绝图像数
-            "approval_rate": approval_rate
+            "annotator_name": annotator_name,
+            "total_annotations": user_images,  # 总图像数
+            "approved_count": user_approved,  # 已通过图像数
+            "rejected_count": user_rejected,  # 已拒绝图像数
+            "approval_rate": (user_approved / user_images * 100) if user_images > 0 else 0
         })
     
     return QualityMetrics(
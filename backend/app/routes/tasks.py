@@ -500,10 +500,34 @@ async def delete_task(
     image_count = db.query(Image).filter(Image.task_id == task_id).count()
     annotation_count = db.query(Annotation).join(Image).filter(Image.task_id == task_id).count()
     
+    # 释放任务图像对共享存储文件的引用
+    from app.services.blob_service import release_task_blobs, remove_blob_files
+    removed_paths = release_task_blobs(db, task_id)
+    
+    # 文件夹汇总没有随任务级联，单独删除
+    from app.models.task_folder_stat import TaskFolderStat
+    db.query(TaskFolderStat).filter(TaskFolderStat.task_id == task_id).delete(synchronize_session=False)
+    
+    # 导入记录和上传会话不随任务删除，其中对任务图像的引用置空（SQLite 默认不执行外键的 ON DELETE）
+    from app.models.ingest import IngestJobFile
+    from app.models.upload_session import UploadSession
+    task_image_ids = db.query(Image.id).filter(Image.task_id == task_id)
+    db.query(IngestJobFile).filter(IngestJobFile.image_id.in_(task_image_ids)).update(
+        {IngestJobFile.image_id: None}, synchronize_session=False
+    )
+    db.query(UploadSession).filter(UploadSession.image_id.in_(task_image_ids)).update(
+        {UploadSession.image_id: None}, synchronize_session=False
+    )
+    
     # 删除任务（由于设置了cascade，会自动删除关联的images, annotations, assignments等）
     db.delete(task)
     db.commit()
     
+    remove_blob_files(removed_paths)
+    
+    from app.services.sprite_service import sprite_service
+    sprite_service.remove_task_sprites(task_id)
+    
     return {
         "message": "任务删除成功",
         "task_id": task_id,
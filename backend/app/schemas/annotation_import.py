@@ -0,0 +1,29 @@
+"""
+标注导入相关的数据模式
+"""
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class AnnotationImportResponse(BaseModel):
+    """标注导入任务创建响应"""
+    import_id: str
+    task_id: int
+    format: str  # coco, yolo, pascal_voc
+    status: str  # processing, completed, failed
+    message: str
+
+class AnnotationImportProgress(BaseModel):
+    """标注导入进度"""
+    import_id: str
+    task_id: int
+    format: str
+    status: str
+    progress: int  # 0-100
+    message: str
+    imported_count: int = 0
+    unmatched_count: int = 0
+    skipped_count: int = 0
+    image_count: int = 0
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
@@ -0,0 +1,37 @@
+"""
+导入任务相关的数据模式
+"""
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class IngestJobResponse(BaseModel):
+    """导入任务创建响应"""
+    job_id: str
+    task_id: int
+    status: str  # pending, scanning, processing, completed, failed
+    message: str
+
+class IngestFileError(BaseModel):
+    """单个文件的导入错误"""
+    relative_path: str
+    error: Optional[str] = None
+
+class IngestJobProgress(BaseModel):
+    """导入任务进度"""
+    job_id: str
+    task_id: int
+    source_path: str
+    source_type: str = "folder"  # folder, archive
+    status: str
+    progress: int  # 0-100
+    message: str
+    total_files: int
+    processed_files: int
+    success_count: int
+    failed_count: int
+    duplicate_count: int = 0
+    duplicate_member_count: int = 0
+    errors: List[IngestFileError] = []
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
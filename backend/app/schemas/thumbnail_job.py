@@ -0,0 +1,31 @@
+"""
+缩略图重建任务相关的数据模式
+"""
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class ThumbnailJobCreate(BaseModel):
+    """创建缩略图重建任务请求"""
+    task_id: Optional[int] = None  # 为空表示整个存储
+    force: bool = False  # 忽略已是最新的缩略图，全部重新生成
+    workers: int = Field(0, ge=0, le=64)  # 进程数，0表示使用配置
+
+class ThumbnailJobProgress(BaseModel):
+    """缩略图重建任务进度"""
+    job_id: str
+    task_id: Optional[int] = None
+    force: bool = False
+    status: str  # pending, processing, completed, failed
+    progress: int  # 0-100
+    message: str
+    total_items: int
+    processed_items: int
+    generated_count: int
+    skipped_count: int
+    missing_count: int
+    failed_count: int
+    elapsed_seconds: float
+    items_per_second: float  # 吞吐（已处理/累计处理时间）
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
@@ -0,0 +1,29 @@
+"""
+分块上传相关的数据模式
+"""
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class UploadSessionCreate(BaseModel):
+    """创建上传会话请求"""
+    task_id: int
+    filename: str
+    total_size: int
+
+class UploadSessionStatus(BaseModel):
+    """上传会话状态"""
+    session_id: str
+    task_id: int
+    filename: str
+    total_size: int
+    received_size: int  # 客户端应从该偏移量继续上传
+    chunk_size: int  # 建议的分块大小
+    status: str  # uploading, completed, expired, aborted
+    message: Optional[str] = None
+    image_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    last_activity_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
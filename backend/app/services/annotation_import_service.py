@@ -0,0 +1,588 @@
+"""
+标注导入服务
+流式解析 COCO / YOLO / Pascal VOC 标注文件，按文件名或文件夹相对路径匹配图像，分批写入标注
+"""
+import os
+import io
+import json
+import uuid
+import asyncio
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple, IO
+from sqlalchemy import insert, update, select, func, or_, case
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.annotation import Annotation, AnnotationType, AnnotationStatus
+from app.models.image import Image
+from app.models.task import Task, TaskStatus
+from app.models.task_assignment import TaskAssignment
+from app.models.annotation_import import AnnotationImportRecord
+from app.services.annotation_status_service import refresh_image_statuses
+from app.schemas.annotation_import import AnnotationImportProgress
+from app.utils.archive import scan_archive, iter_archive_members
+from app.utils.json_stream import JsonStreamReader
+from app.utils.storage import discard_temp_file
+from app.config import settings
+
+IMPORT_FORMATS = ["coco", "yolo", "pascal_voc"]
+
+# 解析结果：(图像ID，标签，边界框数据)；图像ID为None表示找不到对应图像，数据为None表示无法导入
+ParsedAnnotation = Tuple[Optional[int], Optional[str], Optional[Dict[str, float]]]
+
+_AMBIGUOUS = -1
+
+
+def _normalize_path(path: str) -> str:
+    """统一路径分隔符并去掉开头的 ./ 和 /"""
+    path = path.replace('\\', '/')
+    while path.startswith('./'):
+        path = path[2:]
+    return path.lstrip('/')
+
+
+def _bbox(x: float, y: float, width: float, height: float) -> Optional[Dict[str, float]]:
+    """构建与标注画布一致的边界框数据，宽高无效时返回None"""
+    if width <= 0 or height <= 0:
+        return None
+    return {"x": x, "y": y, "width": width, "height": height}
+
+
+class ImageMatcher:
+    """
+    按文件名匹配任务中的图像
+    
+    依次尝试文件夹相对路径、存储文件名、原始文件名和去掉目录的文件名；
+    同一个名称对应多张图像时视为无法匹配。
+    """
+    
+    def __init__(self, rows):
+        self.by_path: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.by_stem: Dict[str, int] = {}
+        self.sizes: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+        
+        for image_id, filename, original_filename, folder_relative_path, width, height in rows:
+            self.sizes[image_id] = (width, height)
+            if folder_relative_path:
+                path = _normalize_path(folder_relative_path)
+                self._add(self.by_path, path, image_id)
+                self._add(self.by_stem, os.path.splitext(path)[0], image_id)
+            for name in {filename, original_filename, os.path.basename(folder_relative_path or "")}:
+                if name:
+                    self._add(self.by_name, name, image_id)
+                    self._add(self.by_stem, os.path.splitext(name)[0], image_id)
+    
+    @staticmethod
+    def _add(index: Dict[str, int], key: str, image_id: int):
+        existing = index.get(key)
+        if existing is None:
+            index[key] = image_id
+        elif existing != image_id:
+            index[key] = _AMBIGUOUS
+    
+    @staticmethod
+    def _lookup(candidates) -> Optional[int]:
+        for index, key in candidates:
+            image_id = index.get(key)
+            if image_id is not None and image_id != _AMBIGUOUS:
+                return image_id
+        return None
+    
+    def match(self, name: str) -> Optional[int]:
+        """按带扩展名的文件名或路径匹配"""
+        path = _normalize_path(name)
+        return self._lookup([
+            (self.by_path, path),
+            (self.by_name, path),
+            (self.by_name, os.path.basename(path)),
+        ])
+    
+    def match_stem(self, name: str) -> Optional[int]:
+        """
+        按不带扩展名的路径匹配（标注文件与图像同名不同扩展名）
+        
+        标注文件通常位于 labels/ 或 annotations/ 目录下，也尝试去掉第一级目录
+        """
+        image_id = self.match(name)
+        if image_id is not None:
+            return image_id
+        
+        path = _normalize_path(name)
+        candidates = [(self.by_stem, path)]
+        if '/' in path:
+            candidates.append((self.by_stem, path.split('/', 1)[1]))
+        candidates.append((self.by_stem, os.path.basename(path)))
+        return self._lookup(candidates)
+
+
+class AnnotationImportService:
+    def __init__(self):
+        self.import_dir = settings.ANNOTATION_IMPORT_DIR
+        self.batch_size = settings.ANNOTATION_IMPORT_BATCH
+        self._running = {}
+    
+    async def start_import(
+        self,
+        task_id: int,
+        user_id: int,
+        format: str,
+        source_path: str,
+        delete_source: bool = False,
+        annotation_status: AnnotationStatus = AnnotationStatus.SUBMITTED
+    ) -> str:
+        """创建标注导入任务并在后台执行"""
+        import_id = str(uuid.uuid4())
+        
+        db = SessionLocal()
+        try:
+            record = AnnotationImportRecord(
+                import_id=import_id,
+                task_id=task_id,
+                user_id=user_id,
+                format=format,
+                source_path=source_path,
+                source_size=os.path.getsize(source_path) if os.path.isfile(source_path) else None,
+                delete_source=delete_source,
+                annotation_status=annotation_status.value,
+                status="processing",
+                progress=0,
+                message="等待处理..."
+            )
+            db.add(record)
+            db.commit()
+        finally:
+            db.close()
+        
+        self._running[import_id] = asyncio.create_task(self._process_import(import_id))
+        return import_id
+    
+    async def _process_import(self, import_id: str):
+        """处理导入任务，解析和写入在线程中执行，不阻塞事件循环"""
+        db = SessionLocal()
+        try:
+            record = db.query(AnnotationImportRecord).filter(
+                AnnotationImportRecord.import_id == import_id
+            ).first()
+            delete_source, source_path = record.delete_source, record.source_path
+        finally:
+            db.close()
+        
+        try:
+            loop = asyncio.get_running_loop()
+            message = await loop.run_in_executor(None, self._run_import, import_id)
+            self._update_record(import_id, status="completed", progress=100, message=message)
+        except Exception as e:
+            print(f"标注导入失败 {import_id}: {e}")
+            try:
+                self._update_record(import_id, status="failed", message=f"导入失败: {str(e)}")
+            except Exception as update_error:
+                print(f"更新导入状态失败 {import_id}: {update_error}")
+        finally:
+            if delete_source:
+                discard_temp_file(source_path)
+            self._running.pop(import_id, None)
+    
+    def _run_import(self, import_id: str) -> str:
+        """解析标注文件并分批写入，结束后统一更新图像和任务的标注统计"""
+        db = SessionLocal()
+        try:
+            record = db.query(AnnotationImportRecord).filter(
+                AnnotationImportRecord.import_id == import_id
+            ).first()
+            task_id, user_id, format = record.task_id, record.user_id, record.format
+            source_path, source_size = record.source_path, record.source_size
+            status = AnnotationStatus(record.annotation_status or AnnotationStatus.SUBMITTED.value)
+            
+            self._update_record(import_id, message="正在加载任务图像...")
+            matcher = ImageMatcher(db.query(
+                Image.id, Image.filename, Image.original_filename,
+                Image.folder_relative_path, Image.width, Image.height
+            ).filter(Image.task_id == task_id).yield_per(10000))
+            
+            # 解析器更新 done/total，用于估算进度
+            progress = {"done": 0, "total": source_size or 0}
+            if format == "coco":
+                records = self._parse_coco(source_path, matcher, progress)
+            elif format == "yolo":
+                records = self._parse_yolo(source_path, matcher, progress)
+            elif format == "pascal_voc":
+                records = self._parse_pascal_voc(source_path, matcher, progress)
+            else:
+                raise Exception(f"不支持的导入格式: {format}")
+            
+            batch = []
+            touched_images = set()
+            counts = {"imported_count": 0, "unmatched_count": 0, "skipped_count": 0}
+            failed = False
+            try:
+                for image_id, label, data in records:
+                    if image_id is None:
+                        counts["unmatched_count"] += 1
+                        continue
+                    if not label or data is None:
+                        counts["skipped_count"] += 1
+                        continue
+                    
+                    batch.append({
+                        "annotation_type": AnnotationType.BBOX,
+                        "label": str(label)[:100],
+                        "data": data,
+                        "status": status,
+                        "image_id": image_id,
+                        "annotator_id": user_id
+                    })
+                    touched_images.add(image_id)
+                    
+                    if len(batch) >= self.batch_size:
+                        self._flush_batch(db, import_id, batch, counts, progress)
+                        batch = []
+                
+                if batch:
+                    self._flush_batch(db, import_id, batch, counts, progress)
+            except Exception as e:
+                failed = True
+                print(f"标注导入中断 {import_id}: {e}")
+                raise
+            finally:
+                # 中途失败时已写入的标注也要计入统计；此时统计更新失败只记录，不掩盖原始错误
+                if touched_images:
+                    try:
+                        db.rollback()
+                        self._update_record(import_id, progress=90, message="正在更新图像标注统计...")
+                        self._refresh_counts(db, task_id, user_id, touched_images)
+                    except Exception as e:
+                        if not failed:
+                            raise
+                        print(f"更新图像标注统计失败 {import_id}: {e}")
+            
+            self._update_record(import_id, image_count=len(touched_images), **counts)
+            return (
+                f"导入完成：写入 {counts['imported_count']} 个标注（{len(touched_images)} 张图像），"
+                f"未匹配 {counts['unmatched_count']} 个，跳过 {counts['skipped_count']} 个"
+            )
+        finally:
+            db.close()
+    
+    def _flush_batch(
+        self,
+        db: Session,
+        import_id: str,
+        batch: List[Dict[str, Any]],
+        counts: Dict[str, int],
+        progress: Dict[str, int]
+    ):
+        """批量插入一批标注并提交"""
+        db.execute(insert(Annotation), batch)
+        db.commit()
+        counts["imported_count"] += len(batch)
+        
+        percent = int(progress["done"] * 90 / progress["total"]) if progress["total"] else 0
+        self._update_record(
+            import_id,
+            progress=min(89, percent),
+            message=f"已导入 {counts['imported_count']} 个标注",
+            **counts
+        )
+    
+    def _refresh_counts(self, db: Session, task_id: int, user_id: int, image_ids: set):
+        """
+        按集合更新图像的标注人数、完成状态和任务统计
+        
+        与逐条创建标注时的规则一致：标注人数达到要求后标记为已标注、待审核；
+        已审核的图像不改变状态文本。
+        """
+        annotator_count = select(func.count(func.distinct(Annotation.annotator_id))).where(
+            Annotation.image_id == Image.id
+        ).scalar_subquery()
+        required_count = func.coalesce(Image.required_annotation_count, 1)
+        unreviewed = or_(Image.annotation_status.is_(None), Image.annotation_status.in_(["未标注", "标注中"]))
+        
+        sorted_ids = sorted(image_ids)
+        for start in range(0, len(sorted_ids), 1000):
+            chunk = sorted_ids[start:start + 1000]
+            
+            db.execute(
+                update(Image).where(Image.id.in_(chunk)).values(annotation_count=annotator_count),
+                execution_options={"synchronize_session": False}
+            )
+            db.execute(
+                update(Image).where(
+                    Image.id.in_(chunk),
+                    Image.annotation_count >= required_count
+                ).values(
+                    is_annotated=True,
+                    annotation_status=case((unreviewed, "待审核"), else_=Image.annotation_status)
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            db.execute(
+                update(Image).where(
+                    Image.id.in_(chunk),
+                    Image.annotation_count < required_count,
+                    unreviewed
+                ).values(annotation_status="标注中"),
+                execution_options={"synchronize_session": False}
+            )
+            
+            # 已完成用户列表是JSON字段，只对缺少导入用户的图像按主键批量更新
+            completed_updates = [
+                {"id": image_id, "completed_by_users": list(users or []) + [user_id]}
+                for image_id, users in db.query(Image.id, Image.completed_by_users).filter(
+                    Image.id.in_(chunk)
+                ).all()
+                if user_id not in (users or [])
+            ]
+            if completed_updates:
+                db.execute(update(Image), completed_updates)
+            refresh_image_statuses(db, chunk)
+            db.commit()
+        
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if task:
+            annotated_count = db.query(func.count(Image.id)).filter(
+                Image.task_id == task_id,
+                Image.is_annotated == True
+            ).scalar()
+            task.annotated_images = annotated_count
+            
+            total_images = task.total_images or 0
+            if total_images > 0 and annotated_count >= total_images:
+                if task.status in [TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]:
+                    task.status = TaskStatus.COMPLETED
+            elif annotated_count > 0 and task.status == TaskStatus.ASSIGNED:
+                task.status = TaskStatus.IN_PROGRESS
+            
+            assignment = db.query(TaskAssignment).filter(
+                TaskAssignment.task_id == task_id,
+                TaskAssignment.user_id == user_id
+            ).first()
+            if assignment:
+                assignment.completed_images_count = db.query(
+                    func.count(func.distinct(Annotation.image_id))
+                ).join(Image).filter(
+                    Image.task_id == task_id,
+                    Annotation.annotator_id == user_id
+                ).scalar()
+            
+            db.commit()
+    
+    def _list_source_files(self, source_path: str, extensions: List[str]) -> List[str]:
+        """列出目录或压缩包中指定扩展名的文件"""
+        if os.path.isdir(source_path):
+            names = []
+            for root, dirs, files in os.walk(source_path):
+                dirs.sort()
+                for file in sorted(files):
+                    if os.path.splitext(file)[1].lower() in extensions:
+                        names.append(os.path.relpath(os.path.join(root, file), source_path).replace('\\', '/'))
+            return names
+        return scan_archive(source_path, extensions)[0]
+    
+    def _iter_source_files(self, source_path: str, names: List[str]) -> Iterator[Tuple[str, IO[bytes]]]:
+        """依次打开目录或压缩包中的文件，压缩包只解压需要的成员"""
+        if os.path.isdir(source_path):
+            for name in names:
+                with open(os.path.join(source_path, name), "rb") as stream:
+                    yield name, stream
+            return
+        yield from iter_archive_members(source_path, set(names))
+    
+    def _parse_coco(self, source_path: str, matcher: ImageMatcher, progress: Dict[str, int]) -> Iterator[ParsedAnnotation]:
+        """
+        流式解析COCO JSON（单个json文件，或目录/压缩包中的第一个json文件）
+        
+        images、annotations、categories 数组逐个元素解析。标注出现在它引用的图像或类别之前时
+        （例如 categories 位于文件末尾），先写入临时文件，读完后再处理。
+        """
+        if os.path.isfile(source_path) and source_path.lower().endswith(".json"):
+            with open(source_path, "r", encoding="utf-8") as fp:
+                yield from self._parse_coco_stream(fp, matcher, progress)
+            return
+        
+        json_files = self._list_source_files(source_path, [".json"])
+        if not json_files:
+            raise Exception("未找到COCO标注JSON文件")
+        for name, stream in self._iter_source_files(source_path, json_files[:1]):
+            yield from self._parse_coco_stream(io.TextIOWrapper(stream, encoding="utf-8"), matcher, progress)
+    
+    def _parse_coco_stream(self, fp: IO[str], matcher: ImageMatcher, progress: Dict[str, int]) -> Iterator[ParsedAnnotation]:
+        reader = JsonStreamReader(fp)
+        images: Dict[Any, Optional[int]] = {}
+        categories: Dict[Any, str] = {}
+        finished_keys = set()
+        current_key = None
+        
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as deferred:
+            deferred_count = 0
+            for key, item in reader.iter_items({"images", "annotations", "categories"}):
+                if key != current_key:
+                    if current_key is not None:
+                        finished_keys.add(current_key)
+                    current_key = key
+                progress["done"] = reader.chars_read
+                
+                if key == "images":
+                    images[item.get("id")] = matcher.match(item.get("file_name") or "")
+                elif key == "categories":
+                    categories[item.get("id")] = item.get("name")
+                elif key == "annotations":
+                    annotation = {
+                        "image_id": item.get("image_id"),
+                        "category_id": item.get("category_id"),
+                        "bbox": item.get("bbox")
+                    }
+                    if (
+                        (annotation["image_id"] not in images and "images" not in finished_keys)
+                        or (annotation["category_id"] not in categories and "categories" not in finished_keys)
+                    ):
+                        deferred.write(json.dumps(annotation) + "\n")
+                        deferred_count += 1
+                        continue
+                    yield self._coco_annotation(annotation, images, categories)
+            
+            if deferred_count:
+                deferred.seek(0)
+                for line in deferred:
+                    yield self._coco_annotation(json.loads(line), images, categories)
+    
+    def _coco_annotation(self, annotation: Dict[str, Any], images: Dict[Any, Optional[int]], categories: Dict[Any, str]) -> ParsedAnnotation:
+        image_id = images.get(annotation["image_id"])
+        label = categories.get(annotation["category_id"])
+        bbox = annotation.get("bbox")
+        if not bbox or len(bbox) < 4:
+            return image_id, label, None
+        return image_id, label, _bbox(*[float(v) for v in bbox[:4]])
+    
+    def _parse_yolo(self, source_path: str, matcher: ImageMatcher, progress: Dict[str, int]) -> Iterator[ParsedAnnotation]:
+        """
+        解析YOLO标注（目录或压缩包，classes.txt / obj.names + 每张图像一个txt）
+        
+        归一化坐标按数据库中的图像尺寸还原为像素坐标
+        """
+        names = self._list_source_files(source_path, [".txt", ".names"])
+        class_file = next((n for n in names if os.path.basename(n) in ("classes.txt", "obj.names")), None)
+        
+        classes: List[str] = []
+        if class_file:
+            for _, stream in self._iter_source_files(source_path, [class_file]):
+                classes = [line.strip() for line in io.TextIOWrapper(stream, encoding="utf-8") if line.strip()]
+        
+        label_files = [n for n in names if n.endswith(".txt") and n != class_file]
+        progress["total"] = len(label_files)
+        
+        for name, stream in self._iter_source_files(source_path, label_files):
+            progress["done"] += 1
+            image_id = matcher.match_stem(name[:-len(".txt")])
+            width, height = matcher.sizes.get(image_id, (None, None))
+            
+            for line in io.TextIOWrapper(stream, encoding="utf-8"):
+                parts = line.split()
+                if not parts:
+                    continue
+                
+                try:
+                    class_id = int(parts[0])
+                    x_center, y_center, box_width, box_height = [float(v) for v in parts[1:5]]
+                except (ValueError, IndexError):
+                    yield image_id, None, None
+                    continue
+                
+                label = classes[class_id] if 0 <= class_id < len(classes) else str(class_id)
+                if image_id is None or not width or not height:
+                    yield image_id, label, None
+                    continue
+                
+                yield image_id, label, _bbox(
+                    (x_center - box_width / 2) * width,
+                    (y_center - box_height / 2) * height,
+                    box_width * width,
+                    box_height * height
+                )
+    
+    def _parse_pascal_voc(self, source_path: str, matcher: ImageMatcher, progress: Dict[str, int]) -> Iterator[ParsedAnnotation]:
+        """解析Pascal VOC标注（目录或压缩包，每张图像一个XML）"""
+        xml_files = self._list_source_files(source_path, [".xml"])
+        progress["total"] = len(xml_files)
+        
+        for name, stream in self._iter_source_files(source_path, xml_files):
+            progress["done"] += 1
+            try:
+                root = ET.parse(stream).getroot()
+            except ET.ParseError:
+                yield None, None, None
+                continue
+            
+            filename = root.findtext("filename")
+            image_id = matcher.match(filename) if filename else None
+            if image_id is None:
+                image_id = matcher.match_stem(name[:-len(".xml")])
+            
+            for obj in root.iter("object"):
+                label = obj.findtext("name")
+                box = obj.find("bndbox")
+                try:
+                    xmin, ymin, xmax, ymax = [float(box.findtext(tag)) for tag in ("xmin", "ymin", "xmax", "ymax")]
+                except (AttributeError, TypeError, ValueError):
+                    yield image_id, label, None
+                    continue
+                yield image_id, label, _bbox(xmin, ymin, xmax - xmin, ymax - ymin)
+    
+    def _update_record(self, import_id: str, status: str = None, progress: int = None, message: str = None, **counts):
+        """更新导入任务状态和统计"""
+        db = SessionLocal()
+        try:
+            record = db.query(AnnotationImportRecord).filter(
+                AnnotationImportRecord.import_id == import_id
+            ).first()
+            if not record:
+                print(f"Warning: Annotation import record not found: {import_id}")
+                return
+            
+            if status:
+                record.status = status
+                if status in ["completed", "failed"]:
+                    record.completed_at = datetime.now()
+            if progress is not None:
+                record.progress = progress
+            if message:
+                record.message = message
+            for key, value in counts.items():
+                setattr(record, key, value)
+            
+            db.commit()
+            print(f"Annotation import {import_id}: {record.status} - {record.progress}% - {record.message}")
+        finally:
+            db.close()
+    
+    def get_import_progress(self, import_id: str) -> Optional[AnnotationImportProgress]:
+        """获取导入进度"""
+        db = SessionLocal()
+        try:
+            record = db.query(AnnotationImportRecord).filter(
+                AnnotationImportRecord.import_id == import_id
+            ).first()
+            if not record:
+                return None
+            
+            return AnnotationImportProgress(
+                import_id=record.import_id,
+                task_id=record.task_id,
+                format=record.format,
+                status=record.status,
+                progress=record.progress or 0,
+                message=record.message or "",
+                imported_count=record.imported_count or 0,
+                unmatched_count=record.unmatched_count or 0,
+                skipped_count=record.skipped_count or 0,
+                image_count=record.image_count or 0,
+                created_at=record.created_at,
+                completed_at=record.completed_at
+            )
+        finally:
+            db.close()
+
+
+# 全局标注导入服务实例
+annotation_import_service = AnnotationImportService()
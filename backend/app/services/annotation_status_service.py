@@ -0,0 +1,208 @@
+"""
+图像标注状态汇总
+每个 (图像, 标注员) 的最新标注和各状态数量保存在 image_annotator_states 表中，
+在标注增删、审核的同一事务中由 refresh_image_statuses 重新计算；读取时只查该表，不扫描全部标注修订。
+标注员看到自己最新一次标注的状态，管理员看到全部标注的整体状态；
+整体状态同时写入图像的 overall_status / has_rejected 字段，供列表按索引筛选，并同步到文件夹汇总
+"""
+from typing import Dict, Any, List, Optional, Iterable, Callable
+from sqlalchemy import select, update, func, case
+from sqlalchemy.orm import Session
+from app.models.annotation import Annotation, AnnotationStatus
+from app.models.image import Image
+from app.models.image_annotator_state import ImageAnnotatorState
+from app.services.folder_stats_service import sync_folder_stats, reset_folder_stats
+
+UNANNOTATED_LABEL = "未标注"
+
+# 标注状态 -> 列表中显示的状态文本
+STATUS_LABELS = {
+    AnnotationStatus.DRAFT: "标注中",
+    AnnotationStatus.SUBMITTED: "待审核",
+    AnnotationStatus.APPROVED: "已通过",
+    AnnotationStatus.REJECTED: "未通过",
+}
+
+
+def get_overall_label(count: int, has_submitted: bool, has_approved: bool, has_rejected: bool) -> str:
+    """
+    全部标注的整体状态：有待审核的显示待审核；有通过的按是否同时有未通过显示已通过/未通过；
+    其余（只有草稿或只有未通过）显示标注中
+    """
+    if count == 0:
+        return UNANNOTATED_LABEL
+    if has_submitted:
+        return "待审核"
+    if has_approved:
+        return "未通过" if has_rejected else "已通过"
+    return "标注中"
+
+
+def _empty_summary() -> Dict[str, Any]:
+    return {"annotation_count": 0, "annotation_status": UNANNOTATED_LABEL, "has_rejected": False}
+
+
+def _status_count(status: AnnotationStatus):
+    return func.sum(case((Annotation.status == status, 1), else_=0)).over(
+        partition_by=(Annotation.image_id, Annotation.annotator_id)
+    )
+
+
+def get_image_statuses(
+    db: Session,
+    image_ids: List[int],
+    annotator_id: Optional[int] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    一次查询汇总一页图像的标注状态，没有标注的图像为未标注
+    
+    Args:
+        annotator_id: 指定时只统计该标注员的标注，状态取其最新一次标注（创建时间相同时取ID较大的）
+    
+    Returns:
+        dict: image_id -> {annotation_count, annotation_status, has_rejected}
+    """
+    summaries = {image_id: _empty_summary() for image_id in image_ids}
+    if not image_ids:
+        return summaries
+    
+    if annotator_id is not None:
+        rows = db.query(
+            ImageAnnotatorState.image_id,
+            ImageAnnotatorState.annotation_count,
+            ImageAnnotatorState.latest_status
+        ).filter(
+            ImageAnnotatorState.image_id.in_(image_ids),
+            ImageAnnotatorState.annotator_id == annotator_id
+        ).all()
+        for image_id, count, latest_status in rows:
+            summaries[image_id] = {
+                "annotation_count": count,
+                "annotation_status": STATUS_LABELS.get(latest_status, "标注中"),
+                "has_rejected": latest_status == AnnotationStatus.REJECTED
+            }
+        return summaries
+    
+    rows = db.query(
+        ImageAnnotatorState.image_id,
+        func.sum(ImageAnnotatorState.annotation_count),
+        func.max(ImageAnnotatorState.submitted_count),
+        func.max(ImageAnnotatorState.approved_count),
+        func.max(ImageAnnotatorState.rejected_count)
+    ).filter(
+        ImageAnnotatorState.image_id.in_(image_ids)
+    ).group_by(ImageAnnotatorState.image_id).all()
+    for image_id, count, submitted, approved, rejected in rows:
+        summaries[image_id] = {
+            "annotation_count": count,
+            "annotation_status": get_overall_label(count, submitted > 0, approved > 0, rejected > 0),
+            "has_rejected": rejected > 0
+        }
+    return summaries
+
+
+def _refresh_annotator_states(db: Session, image_ids: List[int]):
+    """按标注表重新计算这些图像的 (图像, 标注员) 状态行：新增、更新，删除已没有标注的行"""
+    ranked = select(
+        Annotation.image_id,
+        Annotation.annotator_id,
+        Annotation.id,
+        Annotation.status,
+        func.count().over(partition_by=(Annotation.image_id, Annotation.annotator_id)).label("annotation_count"),
+        _status_count(AnnotationStatus.SUBMITTED).label("submitted_count"),
+        _status_count(AnnotationStatus.APPROVED).label("approved_count"),
+        _status_count(AnnotationStatus.REJECTED).label("rejected_count"),
+        func.row_number().over(
+            partition_by=(Annotation.image_id, Annotation.annotator_id),
+            order_by=(Annotation.created_at.desc(), Annotation.id.desc())
+        ).label("rank")
+    ).where(Annotation.image_id.in_(image_ids)).subquery()
+    computed = {
+        (row.image_id, row.annotator_id): {
+            "latest_annotation_id": row.id,
+            "latest_status": row.status,
+            "annotation_count": row.annotation_count,
+            "submitted_count": row.submitted_count,
+            "approved_count": row.approved_count,
+            "rejected_count": row.rejected_count
+        }
+        for row in db.execute(select(ranked).where(ranked.c.rank == 1))
+    }
+    
+    existing = db.query(ImageAnnotatorState).filter(ImageAnnotatorState.image_id.in_(image_ids)).all()
+    for state in existing:
+        values = computed.pop((state.image_id, state.annotator_id), None)
+        if values is None:
+            db.delete(state)
+            continue
+        for field, value in values.items():
+            if getattr(state, field) != value:
+                setattr(state, field, value)
+    for (image_id, annotator_id), values in computed.items():
+        db.add(ImageAnnotatorState(image_id=image_id, annotator_id=annotator_id, **values))
+    db.flush()
+
+
+def refresh_image_statuses(db: Session, image_ids: Iterable[int], chunk_size: int = 1000):
+    """
+    重新计算图像的 (图像, 标注员) 状态行和整体状态 overall_status / has_rejected，并同步文件夹汇总
+    
+    在标注增删、审核的同一事务中提交前调用；先 flush 让本次修改参与统计
+    """
+    sorted_ids = sorted(set(image_ids))
+    if not sorted_ids:
+        return
+    
+    db.flush()
+    for start in range(0, len(sorted_ids), chunk_size):
+        chunk = sorted_ids[start:start + chunk_size]
+        _refresh_annotator_states(db, chunk)
+        summaries = get_image_statuses(db, chunk)
+        db.execute(update(Image), [
+            {
+                "id": image_id,
+                "overall_status": summary["annotation_status"],
+                "has_rejected": summary["has_rejected"]
+            }
+            for image_id, summary in summaries.items()
+        ])
+        sync_folder_stats(db, chunk)
+
+
+def rebuild_annotation_states(
+    db: Session,
+    task_id: Optional[int] = None,
+    batch_size: int = 1000,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    按标注表重建图像-标注员状态、图像整体状态和文件夹汇总（升级后首次使用或数据不一致时），每批单独提交
+    
+    Args:
+        task_id: 只重建该任务的图像，默认全部
+        on_progress: 每批完成后回调 (已处理图像数, 图像总数)
+    
+    Returns:
+        int: 处理的图像数
+    """
+    query = db.query(Image.id)
+    if task_id is not None:
+        query = query.filter(Image.task_id == task_id)
+    total = query.count()
+    
+    reset_folder_stats(db, task_id)
+    db.commit()
+    
+    processed = 0
+    last_id = 0
+    while True:
+        image_ids = [image_id for (image_id,) in query.filter(Image.id > last_id).order_by(Image.id).limit(batch_size)]
+        if not image_ids:
+            break
+        refresh_image_statuses(db, image_ids, chunk_size=batch_size)
+        db.commit()
+        processed += len(image_ids)
+        last_id = image_ids[-1]
+        if on_progress:
+            on_progress(processed, total)
+    return processed
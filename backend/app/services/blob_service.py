@@ -0,0 +1,183 @@
+"""
+内容寻址存储服务
+维护图像文件的引用计数，相同内容在所有任务间共享一个文件和缩略图
+"""
+import os
+import shutil
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from app.models.blob import ImageBlob
+from app.models.image import Image
+from app.utils.storage import get_blob_path, commit_blob_file, discard_temp_file
+from app.utils.image_optimizer import ImageOptimizer
+from app.utils.tile_pyramid import get_blob_pyramid_dir
+from app.utils.derivatives import get_derivative_dir
+from app.services.thumbnail_service import thumbnail_service
+
+
+def _increment_ref_count(db: Session, content_hash: str, delta: int) -> int:
+    """
+    在数据库中原子地修改引用计数（UPDATE ... SET ref_count = ref_count + delta），
+    不读取会话中可能已过期的值，并发的请求、导入和迁移不会丢失更新
+    
+    Returns:
+        int: 更新的行数，记录不存在时为0
+    """
+    return db.execute(
+        update(ImageBlob)
+        .where(ImageBlob.content_hash == content_hash)
+        .values(ref_count=ImageBlob.ref_count + delta)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def acquire_blob(
+    db: Session,
+    content_hash: str,
+    blob_path: str,
+    file_size: int
+) -> Tuple[ImageBlob, bool]:
+    """
+    获取或创建存储记录并增加引用计数（不提交事务），文件需已位于 blob_path
+    
+    Returns:
+        (blob, is_new): 存储记录和是否为新内容
+    """
+    db.flush()
+    if _increment_ref_count(db, content_hash, 1) == 0:
+        try:
+            # 并发上传相同的新内容时，另一事务可能已插入该哈希：回滚到保存点后改为增加其引用计数
+            with db.begin_nested():
+                blob = ImageBlob(
+                    content_hash=content_hash,
+                    file_path=blob_path,
+                    file_size=file_size,
+                    ref_count=1
+                )
+                db.add(blob)
+            return blob, True
+        except IntegrityError:
+            _increment_ref_count(db, content_hash, 1)
+    
+    blob = db.query(ImageBlob).filter(
+        ImageBlob.content_hash == content_hash
+    ).populate_existing().one()
+    return blob, False
+
+
+def store_blob(
+    db: Session,
+    temp_path: str,
+    content_hash: str,
+    file_size: int,
+    file_extension: str
+) -> Tuple[ImageBlob, bool]:
+    """
+    将临时文件存入内容寻址存储并增加引用计数（不提交事务）
+    
+    已存在相同内容时丢弃临时文件，直接复用已有文件。
+    
+    Returns:
+        (blob, is_new): 存储记录和是否为新内容
+    """
+    existing_path = db.query(ImageBlob.file_path).filter(
+        ImageBlob.content_hash == content_hash
+    ).scalar()
+    
+    wrote_file = False
+    if existing_path:
+        discard_temp_file(temp_path)
+        blob_path = existing_path
+    else:
+        blob_path = get_blob_path(content_hash, file_extension)
+        wrote_file = commit_blob_file(temp_path, blob_path)
+    
+    blob, is_new = acquire_blob(db, content_hash, blob_path, file_size)
+    if wrote_file and blob.file_path != blob_path:
+        # 并发插入的记录使用了另一个扩展名的路径，刚写入的文件不会被引用
+        discard_temp_file(blob_path)
+    return blob, is_new
+
+
+def apply_blob_metadata(image: Image, blob: ImageBlob) -> bool:
+    """
+    用已处理过的存储记录填充图像尺寸和缩略图状态
+    
+    Returns:
+        bool: 是否已填充；内容尚未处理过时返回False，需要后台处理
+    """
+    if blob.width is None or blob.height is None:
+        return False
+    
+    image.width = blob.width
+    image.height = blob.height
+    image.exif_orientation = blob.exif_orientation
+    image.perceptual_hash = blob.perceptual_hash
+    image.has_thumbnail = bool(blob.has_thumbnail)
+    image.thumbnail_path = blob.thumbnail_path
+    image.derivatives = blob.derivatives
+    image.processing_status = "completed"
+    return True
+
+
+def release_blobs(db: Session, hash_counts: Dict[str, int]) -> List[str]:
+    """
+    减少引用计数，删除引用归零的存储记录（不提交事务）
+    
+    Args:
+        hash_counts: 内容哈希 -> 释放的引用数
+    
+    Returns:
+        List[str]: 需要在提交后删除的文件路径
+    """
+    if not hash_counts:
+        return []
+    
+    db.flush()
+    for content_hash, count in hash_counts.items():
+        _increment_ref_count(db, content_hash, -count)
+    
+    # 锁定引用已归零的记录后删除，期间其他事务增加的引用不会被删掉
+    removed = db.query(ImageBlob.id, ImageBlob.file_path).filter(
+        ImageBlob.content_hash.in_(list(hash_counts)),
+        ImageBlob.ref_count <= 0
+    ).with_for_update().all()
+    if removed:
+        db.query(ImageBlob).filter(
+            ImageBlob.id.in_([blob_id for blob_id, _ in removed])
+        ).delete(synchronize_session=False)
+    # 会话中已加载的存储记录按数据库中的计数重新读取
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, ImageBlob):
+            db.expire(obj)
+    
+    return [file_path for _, file_path in removed]
+
+
+def release_task_blobs(db: Session, task_id: int) -> List[str]:
+    """释放任务下所有图像对存储文件的引用（不提交事务）"""
+    rows = db.query(Image.content_hash, func.count(Image.id)).filter(
+        Image.task_id == task_id,
+        Image.content_hash.isnot(None)
+    ).group_by(Image.content_hash).all()
+    
+    return release_blobs(db, {content_hash: count for content_hash, count in rows})
+
+
+def remove_blob_files(paths: List[str]):
+    """删除存储文件及其共享缩略图、按需缩略图缓存、中间尺寸和瓦片（在事务提交后调用）"""
+    thumbnail_service.discard([os.path.splitext(os.path.basename(path))[0] for path in paths])
+    for path in paths:
+        for target in (path, ImageOptimizer.get_thumbnail_path(path, None)):
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"删除存储文件失败 {target}: {e}")
+        
+        content_hash = os.path.splitext(os.path.basename(path))[0]
+        shutil.rmtree(get_blob_pyramid_dir(content_hash), ignore_errors=True)
+        shutil.rmtree(get_derivative_dir(content_hash), ignore_errors=True)
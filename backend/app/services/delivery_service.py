@@ -0,0 +1,161 @@
+"""
+图像分发服务
+为原图、缩略图、中间尺寸和瓦片统一生成强ETag和缓存头，处理条件请求，并统计命中情况。
+内容寻址的文件路径中带有内容哈希，内容变化时URL随之变化，可以永久缓存；
+缩略图修改尺寸/质量配置后会在原路径重新生成，不能永久缓存。
+"""
+import os
+import re
+import hashlib
+from collections import defaultdict
+from email.utils import parsedate
+from typing import Dict, Optional
+from starlette.datastructures import Headers
+from starlette.responses import Response, FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Scope
+from app.config import settings
+
+CONTENT_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 不带内容哈希的文件（旧存储布局、导出文件）每次使用前向服务器确认，未变化时返回304
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def get_content_etag(path: str) -> Optional[str]:
+    """
+    内容寻址文件的强ETag，路径中没有内容哈希时返回None
+    
+    同一内容的不同衍生文件（尺寸、格式）路径不同，ETag也不同；只取哈希附近的路径计算，
+    与部署目录和访问方式（/static 或接口）无关。
+    """
+    parts = os.path.normpath(path).replace('\\', '/').split('/')
+    for index, part in enumerate(parts):
+        match = CONTENT_HASH_PATTERN.search(part)
+        if match:
+            tail = '/'.join(parts[max(0, index - 3):])
+            variant = hashlib.md5(tail.encode()).hexdigest()[:12]
+            return f'"{match.group(0)}-{variant}"'
+    return None
+
+
+def is_regenerable(path: str) -> bool:
+    """缩略图目录下的文件（默认缩略图和按需缩略图缓存）会按当前配置在同一路径重新生成"""
+    thumbnail_dir = os.path.abspath(settings.THUMBNAIL_DIR)
+    return os.path.abspath(path).startswith(thumbnail_dir + os.sep)
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """按 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers.get("etag")
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since and last_modified:
+        if_modified_since = parsedate(if_modified_since)
+        last_modified = parsedate(last_modified)
+        return bool(if_modified_since and last_modified and if_modified_since >= last_modified)
+    return False
+
+
+class DeliveryService:
+    def __init__(self):
+        # 类别 -> 计数项 -> 次数
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    
+    def record(self, category: str, event: str):
+        """
+        记录一次事件
+        
+        分发：full（完整发送）、partial（范围请求）、not_modified（客户端缓存命中，304）；
+        服务端缓存：hit（已生成）、miss（请求时生成或回退）
+        """
+        self._counters[category][event] += 1
+    
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {category: dict(counters) for category, counters in self._counters.items()}
+    
+    def file_response(
+        self,
+        request_headers: Headers,
+        path: str,
+        category: str,
+        media_type: str = None,
+        immutable: bool = None,
+        stat_result: os.stat_result = None,
+        extra_headers: Dict[str, str] = None,
+        status_code: int = 200
+    ) -> Response:
+        """
+        构建带缓存头的文件响应
+        
+        内容寻址的文件使用强ETag和 immutable；会重新生成的缩略图的ETag带上文件版本（修改时间和大小），
+        每次使用前确认；条件请求命中时返回304；Range/If-Range 由 FileResponse 处理。
+        
+        Args:
+            immutable: 是否永久缓存，默认按路径中是否带内容哈希且不会重新生成判断
+        """
+        stat_result = stat_result or os.stat(path)
+        etag = get_content_etag(path)
+        regenerable = is_regenerable(path)
+        if etag and regenerable:
+            etag = f'{etag[:-1]}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        if immutable is None:
+            immutable = etag is not None and not regenerable
+        
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL}
+        if etag:
+            headers["ETag"] = etag
+        headers.update(extra_headers or {})
+        
+        response = FileResponse(
+            path, status_code=status_code, headers=headers,
+            media_type=media_type, stat_result=stat_result
+        )
+        if is_not_modified(response.headers, request_headers):
+            self.record(category, "not_modified")
+            return NotModifiedResponse(response.headers)
+        
+        # If-Range 与当前版本不一致时 FileResponse 会返回完整文件
+        if_range = request_headers.get("if-range")
+        use_range = "range" in request_headers and (
+            if_range is None or if_range in (response.headers.get("etag"), response.headers.get("last-modified"))
+        )
+        self.record(category, "partial" if use_range else "full")
+        return response
+
+
+class CachedStaticFiles(StaticFiles):
+    """在 StaticFiles 基础上为内容寻址文件加上强ETag和永久缓存头，并统计命中情况"""
+    
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        path = os.fspath(full_path)
+        return delivery_service.file_response(
+            Headers(scope=scope), path, _get_static_category(path),
+            stat_result=stat_result, status_code=status_code
+        )
+
+
+def _get_static_category(path: str) -> str:
+    """按所在目录区分统计类别"""
+    normalized = path.replace('\\', '/')
+    for category in ("thumbnails", "derivatives", "tiles", "blobs", "uploads"):
+        if f"/{category}/" in normalized:
+            return f"static_{category}"
+    return "static_other"
+
+
+# 全局图像分发服务实例
+delivery_service = DeliveryService()
@@ -395,27 +395,33 @@ class ExportService:
         # 准备CSV数据
         csv_data = []
         
+        # 每个标注员在筛选结果中的最新标注，一次遍历按 (图像, 标注员) 分组
+        latest_by_annotator = {}
+        for ann in annotations:
+            key = (ann.image_id, ann.annotator_id)
+            current = latest_by_annotator.get(key)
+            if current is None or ann.created_at > current.created_at:
+                latest_by_annotator[key] = ann
+        latest_by_image = {}
+        for (image_id, _), latest_ann in latest_by_annotator.items():
+            latest_by_image.setdefault(image_id, []).append(latest_ann)
+        
+        # 标注员和审核员信息一次查询
+        user_ids = {
+            user_id
+            for anns in latest_by_image.values()
+            for ann in anns
+            for user_id in (ann.annotator_id, ann.reviewer_id)
+            if user_id
+        }
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))} if user_ids else {}
+        
         # 对于每个图像的每个标注员的最终标注
         for image in images:
-            # 获取该图像的所有标注，按标注员分组
-            image_annotations = [a for a in annotations if a.image_id == image.id]
-            
-            # 按标注员分组
-            annotator_annotations = {}
-            for ann in image_annotations:
-                annotator_id = ann.annotator_id
-                if annotator_id not in annotator_annotations:
-                    annotator_annotations[annotator_id] = []
-                annotator_annotations[annotator_id].append(ann)
-            
-            # 每个标注员的最新标注
-            for annotator_id, anns in annotator_annotations.items():
-                # 获取最新的标注
-                latest_ann = max(anns, key=lambda a: a.created_at)
-                
+            for latest_ann in latest_by_image.get(image.id, []):
                 # 获取标注员和审核员信息
-                annotator = db.query(User).filter(User.id == latest_ann.annotator_id).first()
-                reviewer = db.query(User).filter(User.id == latest_ann.reviewer_id).first() if latest_ann.reviewer_id else None
+                annotator = users.get(latest_ann.annotator_id)
+                reviewer = users.get(latest_ann.reviewer_id) if latest_ann.reviewer_id else None
                 
                 # 处理标注数据
                 data_str = json.dumps(latest_ann.data, ensure_ascii=False) if latest_ann.data else ""
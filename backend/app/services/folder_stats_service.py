@@ -0,0 +1,184 @@
+"""
+任务文件夹汇总
+每张图像计入根目录和 folder_relative_path 的每一级父文件夹。图像记录中保存已计入汇总的状态位
+（folder_stats_mask），同步时只把新旧状态位的差值累加到各级文件夹，不需要重新统计文件夹下的图像
+"""
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.image import Image
+from app.models.task_folder_stat import TaskFolderStat
+
+# 状态位：已计入、已标注、已审核、有未通过的标注
+COUNTED = 1
+ANNOTATED = 2
+REVIEWED = 4
+REJECTED = 8
+
+# 状态位 -> 汇总字段
+COUNT_FIELDS = [
+    (COUNTED, "image_count"),
+    (ANNOTATED, "annotated_count"),
+    (REVIEWED, "reviewed_count"),
+    (REJECTED, "rejected_count"),
+]
+
+
+def normalize_folder_path(folder: Optional[str]) -> str:
+    """文件夹路径统一为正斜杠分隔、以斜杠结尾，根目录为空字符串"""
+    folder = (folder or "").replace("\\", "/").strip("/")
+    return f"{folder}/" if folder else ""
+
+
+def get_parent_path(path: str) -> Optional[str]:
+    """父文件夹路径，根目录返回None"""
+    if not path:
+        return None
+    parent = path.rstrip("/").rpartition("/")[0]
+    return f"{parent}/" if parent else ""
+
+
+def get_folder_chain(folder_relative_path: Optional[str]) -> List[str]:
+    """图像所在的各级文件夹，从根目录开始（"a/b/c.jpg" -> ["", "a/", "a/b/"]）"""
+    parts = (folder_relative_path or "").replace("\\", "/").strip("/").split("/")[:-1]
+    chain = [""]
+    for part in parts:
+        if part:
+            chain.append(f"{chain[-1]}{part}/")
+    return chain
+
+
+def get_status_mask(is_annotated: bool, is_reviewed: bool, has_rejected: bool) -> int:
+    return (
+        COUNTED
+        | (ANNOTATED if is_annotated else 0)
+        | (REVIEWED if is_reviewed else 0)
+        | (REJECTED if has_rejected else 0)
+    )
+
+
+def _add_delta(deltas: Dict[Tuple[int, str], List[int]], task_id: int, folder_path: Optional[str], old_mask: int, new_mask: int):
+    changes = [bool(new_mask & bit) - bool(old_mask & bit) for bit, _ in COUNT_FIELDS]
+    for path in get_folder_chain(folder_path):
+        totals = deltas[(task_id, path)]
+        for index, change in enumerate(changes):
+            totals[index] += change
+
+
+def _apply_deltas(db: Session, deltas: Dict[Tuple[int, str], List[int]]):
+    """把差值累加到各文件夹；文件夹行不存在时新建（并发新建冲突时改为累加），图像数归零的行删除"""
+    emptied = []
+    for (task_id, path), changes in sorted(deltas.items()):
+        if not any(changes):
+            continue
+        values = {
+            field: getattr(TaskFolderStat, field) + change
+            for (_, field), change in zip(COUNT_FIELDS, changes)
+        }
+        condition = (TaskFolderStat.task_id == task_id, TaskFolderStat.path == path)
+        if db.execute(update(TaskFolderStat).where(*condition).values(**values)).rowcount == 0:
+            try:
+                with db.begin_nested():
+                    db.add(TaskFolderStat(
+                        task_id=task_id,
+                        path=path,
+                        parent_path=get_parent_path(path),
+                        name=path.rstrip("/").rpartition("/")[2],
+                        **{field: change for (_, field), change in zip(COUNT_FIELDS, changes)}
+                    ))
+            except IntegrityError:
+                db.execute(update(TaskFolderStat).where(*condition).values(**values))
+        if changes[0] < 0:
+            emptied.append(condition)
+    
+    for condition in emptied:
+        db.query(TaskFolderStat).filter(*condition, TaskFolderStat.image_count <= 0).delete(synchronize_session=False)
+
+
+def sync_folder_stats(db: Session, image_ids: Iterable[int], chunk_size: int = 1000):
+    """
+    把图像当前的标注、审核状态同步到文件夹汇总（新图像首次计入）
+    
+    在图像新增、标注状态变化的同一事务中提交前调用
+    """
+    sorted_ids = sorted(set(image_ids))
+    for start in range(0, len(sorted_ids), chunk_size):
+        rows = db.query(
+            Image.id, Image.task_id, Image.folder_relative_path,
+            Image.is_annotated, Image.is_reviewed, Image.has_rejected, Image.folder_stats_mask
+        ).filter(Image.id.in_(sorted_ids[start:start + chunk_size])).all()
+        
+        deltas = defaultdict(lambda: [0] * len(COUNT_FIELDS))
+        mask_updates = []
+        for image_id, task_id, folder_path, is_annotated, is_reviewed, has_rejected, old_mask in rows:
+            new_mask = get_status_mask(is_annotated, is_reviewed, has_rejected)
+            if new_mask == (old_mask or 0):
+                continue
+            _add_delta(deltas, task_id, folder_path, old_mask or 0, new_mask)
+            mask_updates.append({"id": image_id, "folder_stats_mask": new_mask})
+        
+        if mask_updates:
+            _apply_deltas(db, deltas)
+            db.execute(update(Image), mask_updates)
+
+
+def remove_folder_stats(db: Session, image_ids: Iterable[int]):
+    """从文件夹汇总中减去即将删除的图像，在删除图像的同一事务中调用"""
+    rows = db.query(
+        Image.task_id, Image.folder_relative_path, Image.folder_stats_mask
+    ).filter(Image.id.in_(list(image_ids)), Image.folder_stats_mask.isnot(None)).all()
+    
+    deltas = defaultdict(lambda: [0] * len(COUNT_FIELDS))
+    for task_id, folder_path, old_mask in rows:
+        _add_delta(deltas, task_id, folder_path, old_mask, 0)
+    _apply_deltas(db, deltas)
+
+
+def reset_folder_stats(db: Session, task_id: Optional[int] = None):
+    """清空文件夹汇总和图像的已计入状态位，之后重新同步全部图像即可重建"""
+    stats_query = db.query(TaskFolderStat)
+    images_query = update(Image).values(folder_stats_mask=None)
+    if task_id is not None:
+        stats_query = stats_query.filter(TaskFolderStat.task_id == task_id)
+        images_query = images_query.where(Image.task_id == task_id)
+    stats_query.delete(synchronize_session=False)
+    db.execute(images_query, execution_options={"synchronize_session": False})
+
+
+def _stat_dict(stat: Optional[TaskFolderStat]) -> Dict[str, int]:
+    return {field: getattr(stat, field) if stat else 0 for _, field in COUNT_FIELDS}
+
+
+def get_child_folders(db: Session, task_id: int, prefix: str) -> Optional[Dict[str, Any]]:
+    """
+    列出文件夹的直接子文件夹及其汇总，只读取汇总表
+    
+    Returns:
+        dict: 文件夹自身的汇总、直接位于该文件夹中的图像数和子文件夹列表；非根目录的文件夹不存在时返回None
+    """
+    current = db.query(TaskFolderStat).filter(
+        TaskFolderStat.task_id == task_id,
+        TaskFolderStat.path == prefix
+    ).first()
+    if current is None and prefix:
+        return None
+    
+    children = db.query(TaskFolderStat).filter(
+        TaskFolderStat.task_id == task_id,
+        TaskFolderStat.parent_path == prefix
+    ).order_by(TaskFolderStat.path).all()
+    
+    summary = _stat_dict(current)
+    return {
+        "prefix": prefix,
+        "parent": get_parent_path(prefix),
+        **summary,
+        # 不在任何子文件夹中的图像
+        "direct_image_count": summary["image_count"] - sum(child.image_count for child in children),
+        "folders": [
+            {"name": child.name, "path": child.path, **_stat_dict(child)}
+            for child in children
+        ]
+    }
@@ -0,0 +1,159 @@
+"""
+图像后台处理服务
+在进程池中完成解码、缩略图生成和元数据提取，避免阻塞事件循环
+"""
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from app.database import SessionLocal
+from app.models.image import Image
+from app.models.blob import ImageBlob
+from app.utils.image_optimizer import ImageOptimizer
+from app.utils.derivatives import get_derivative_targets, build_derivatives_record
+from app.config import settings
+
+
+def process_image_file(source_path: str, task_id: int) -> Dict[str, Any]:
+    """
+    处理单张图像（在工作进程中执行）
+    
+    只读取和解码一次，同时得到尺寸、EXIF方向、显示用中间尺寸、缩略图和感知哈希。
+    中间尺寸按内容哈希存放，只为内容寻址存储的图像生成。
+    
+    Returns:
+        dict: width, height, file_size, exif_orientation, perceptual_hash, has_thumbnail, thumbnail_path, derivatives；
+              无法读取时抛出 ValueError
+    """
+    thumbnail_path = ImageOptimizer.get_thumbnail_path(source_path, task_id)
+    
+    # 相同内容的缩略图已经生成过时直接共享
+    thumbnail_exists = ImageOptimizer.is_blob_path(source_path) and os.path.exists(thumbnail_path)
+    thumbnails = [] if thumbnail_exists else [(settings.THUMBNAIL_SIZE, thumbnail_path)]
+    
+    is_blob = ImageOptimizer.is_blob_path(source_path)
+    content_hash = os.path.splitext(os.path.basename(source_path))[0]
+    derivatives = get_derivative_targets(content_hash) if is_blob else []
+    
+    info = ImageOptimizer.process_image(source_path, thumbnails, derivatives=derivatives)
+    if not info:
+        raise ValueError("无法读取图像文件")
+    has_thumbnail = thumbnail_exists or bool(info["thumbnails"])
+    
+    return {
+        "width": info["width"],
+        "height": info["height"],
+        "file_size": info["file_size"],
+        "exif_orientation": info["orientation"],
+        "perceptual_hash": info["perceptual_hash"],
+        "has_thumbnail": has_thumbnail,
+        "thumbnail_path": thumbnail_path if has_thumbnail else None,
+        "derivatives": build_derivatives_record(info["derivatives"])
+    }
+
+
+class ImageProcessingService:
+    def __init__(self, max_workers: int = None):
+        self.max_workers = settings.IMAGE_PROCESS_WORKERS if max_workers is None else max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """懒加载进程池；工作进程数为0时退化为默认线程池"""
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """限制同时在途的处理数量，避免积压任务占用过多内存"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.IMAGE_PROCESS_MAX_PENDING)
+        return self._semaphore
+    
+    def submit(self, image_id: int, file_path: str, task_id: int):
+        """提交图像到后台处理，立即返回"""
+        task = asyncio.create_task(self._process(image_id, file_path, task_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def submit_many(self, images: List[Image]):
+        """批量提交图像到后台处理"""
+        for image in images:
+            self.submit(image.id, image.file_path, image.task_id)
+    
+    async def _process(self, image_id: int, file_path: str, task_id: int):
+        """在进程池中处理图像并回写结果"""
+        async with self._get_semaphore():
+            self._update_image(image_id, {"processing_status": "processing"})
+            
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(
+                    self._get_executor(), process_image_file, file_path, task_id
+                )
+            except Exception as e:
+                print(f"图像处理失败 image_id={image_id}: {e}")
+                self._update_image(image_id, {
+                    "processing_status": "failed",
+                    "processing_error": str(e)
+                })
+                return
+            
+            self._update_image(image_id, {
+                **result,
+                "processing_status": "completed",
+                "processing_error": None
+            }, sync_blob=True)
+    
+    def _update_image(self, image_id: int, values: Dict[str, Any], sync_blob: bool = False):
+        """更新图像处理状态，sync_blob 时同时缓存元数据到共享存储记录"""
+        db = SessionLocal()
+        try:
+            db.query(Image).filter(Image.id == image_id).update(
+                values, synchronize_session=False
+            )
+            
+            if sync_blob:
+                content_hash = db.query(Image.content_hash).filter(Image.id == image_id).scalar()
+                if content_hash:
+                    db.query(ImageBlob).filter(ImageBlob.content_hash == content_hash).update({
+                        "width": values["width"],
+                        "height": values["height"],
+                        "exif_orientation": values["exif_orientation"],
+                        "perceptual_hash": values["perceptual_hash"],
+                        "has_thumbnail": values["has_thumbnail"],
+                        "thumbnail_path": values["thumbnail_path"],
+                        "derivatives": values["derivatives"]
+                    }, synchronize_session=False)
+            
+            db.commit()
+        finally:
+            db.close()
+    
+    def resume_pending(self) -> int:
+        """重新提交服务重启前未处理完成的图像"""
+        db = SessionLocal()
+        try:
+            images = db.query(Image.id, Image.file_path, Image.task_id).filter(
+                Image.processing_status.in_(["pending", "processing"])
+            ).all()
+        finally:
+            db.close()
+        
+        for image_id, file_path, task_id in images:
+            self.submit(image_id, file_path, task_id)
+        
+        if images:
+            print(f"重新提交 {len(images)} 张未完成处理的图像")
+        return len(images)
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局图像处理服务实例
+image_processing_service = ImageProcessingService()
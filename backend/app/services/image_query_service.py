@@ -0,0 +1,205 @@
+"""
+任务图像列表的筛选和排序
+每个筛选条件和排序键都有以 task_id 开头的复合索引（见 Image / ImageAnnotatorState 模型），
+游标记录排序键和ID，翻页按 (排序键, id) 行值比较定位
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import select, exists, tuple_, func
+from sqlalchemy.orm import Query, aliased
+from app.models.image import Image
+from app.models.annotation import AnnotationStatus
+from app.models.image_annotator_state import ImageAnnotatorState
+from app.services.annotation_status_service import UNANNOTATED_LABEL, STATUS_LABELS
+from app.utils.pagination import InvalidCursorError
+
+# 排序参数 -> 排序列
+SORT_COLUMNS = {
+    "id": Image.id,
+    "created_at": Image.created_at,
+    "filename": Image.original_filename,
+}
+
+# 可筛选的状态文本
+STATUS_FILTERS = [UNANNOTATED_LABEL] + list(STATUS_LABELS.values())
+
+# 列表可返回的字段 -> 需要从图像表读取的列（id 总会读取）；顺序即默认返回顺序
+IMAGE_LIST_FIELDS = {
+    "id": (),
+    "filename": (Image.original_filename,),
+    "file_path": (Image.file_path,),
+    "thumbnail_url": (Image.thumbnail_path, Image.file_path),
+    "sprite": (),
+    "is_annotated": (Image.is_annotated,),
+    "is_reviewed": (Image.is_reviewed,),
+    "annotation_count": (),
+    "required_annotation_count": (Image.required_annotation_count,),
+    "annotation_status": (),
+    "has_rejected": (),
+    "folder_relative_path": (Image.folder_relative_path,),
+    "created_at": (Image.created_at,),
+    "width": (Image.width,),
+    "height": (Image.height,),
+}
+
+# 来自标注状态汇总的字段，都未请求时不查询状态表
+STATUS_FIELDS = {"annotation_count", "annotation_status", "has_rejected"}
+
+
+def parse_list_fields(fields: Optional[str]) -> List[str]:
+    """
+    解析逗号分隔的字段列表，未指定时返回全部字段
+    
+    Raises:
+        ValueError: 包含不支持的字段
+    """
+    if not fields:
+        return list(IMAGE_LIST_FIELDS)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in IMAGE_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}")
+    return names
+
+
+def get_list_columns(fields: List[str], sort: str) -> list:
+    """查询需要的列：ID、请求字段依赖的列和游标需要的排序键"""
+    columns = {"id": Image.id}
+    for name in fields:
+        for column in IMAGE_LIST_FIELDS[name]:
+            columns.setdefault(column.key, column)
+    sort_column = SORT_COLUMNS[sort]
+    columns.setdefault(sort_column.key, sort_column)
+    return list(columns.values())
+
+
+def _latest_own_status(annotator_id: int):
+    """标注员对当前图像最新一次标注的状态（按状态表主键定位）"""
+    return select(ImageAnnotatorState.latest_status).where(
+        ImageAnnotatorState.image_id == Image.id,
+        ImageAnnotatorState.annotator_id == annotator_id
+    ).correlate(Image).scalar_subquery()
+
+
+def apply_image_filters(
+    query: Query,
+    status_label: Optional[str] = None,
+    has_rejected: Optional[bool] = None,
+    folder: Optional[str] = None,
+    annotator_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    viewer_id: Optional[int] = None
+) -> Query:
+    """
+    在已按任务过滤的图像查询上追加筛选条件
+    
+    Args:
+        status_label: 列表中显示的状态文本（未标注、标注中、待审核、已通过、未通过）
+        has_rejected: 是否有未通过的标注
+        folder: 文件夹前缀，匹配该文件夹及其子文件夹中的图像
+        annotator_id: 只保留该标注员标注过的图像
+        created_from / created_to: 上传时间范围，左闭右开
+        viewer_id: 标注员视角，状态和是否未通过按该标注员最新一次标注判断（与列表显示一致）
+    """
+    if status_label is not None or has_rejected is not None:
+        if viewer_id is not None:
+            latest_status = _latest_own_status(viewer_id)
+            if status_label == UNANNOTATED_LABEL:
+                query = query.filter(~exists().where(
+                    ImageAnnotatorState.image_id == Image.id,
+                    ImageAnnotatorState.annotator_id == viewer_id
+                ))
+            elif status_label is not None:
+                statuses = [key for key, label in STATUS_LABELS.items() if label == status_label]
+                query = query.filter(latest_status.in_(statuses))
+            if has_rejected is not None:
+                query = query.filter(
+                    latest_status == AnnotationStatus.REJECTED if has_rejected
+                    else latest_status.is_distinct_from(AnnotationStatus.REJECTED)
+                )
+        else:
+            if status_label is not None:
+                query = query.filter(Image.overall_status == status_label)
+            if has_rejected is not None:
+                query = query.filter(Image.has_rejected == has_rejected)
+    
+    if folder:
+        # 区间条件可以直接使用 (task_id, folder_relative_path) 索引；
+        # LIKE 保证在非C排序规则下结果仍然准确（"/" 的下一个字符是 "0"）
+        query = query.filter(
+            Image.folder_relative_path >= folder,
+            Image.folder_relative_path < folder[:-1] + "0",
+            Image.folder_relative_path.startswith(folder, autoescape=True)
+        )
+    
+    if annotator_id is not None:
+        query = query.filter(Image.id.in_(
+            select(ImageAnnotatorState.image_id).where(ImageAnnotatorState.annotator_id == annotator_id)
+        ))
+    
+    if created_from is not None:
+        query = query.filter(Image.created_at >= created_from)
+    if created_to is not None:
+        query = query.filter(Image.created_at < created_to)
+    
+    return query
+
+
+def apply_image_sort(query: Query, sort: str, order: str) -> Query:
+    """按排序键和ID排序，ID保证排序键相同时顺序稳定"""
+    column = SORT_COLUMNS[sort]
+    if sort == "id":
+        return query.order_by(Image.id.desc() if order == "desc" else Image.id)
+    if order == "desc":
+        return query.order_by(column.desc(), Image.id.desc())
+    return query.order_by(column, Image.id)
+
+
+def get_cursor_values(image, sort: str, order: str) -> Dict[str, Any]:
+    """本页最后一张图像（Image 或包含排序列的查询行）的排序键，编码为下一页的游标"""
+    values = {"id": image.id}
+    if sort != "id" or order != "asc":
+        values.update({"sort": sort, "order": order})
+    if sort == "created_at":
+        values["key"] = image.created_at.isoformat() if image.created_at else None
+    elif sort == "filename":
+        values["key"] = image.original_filename
+    return values
+
+
+def apply_image_cursor(query: Query, values: Dict[str, Any], sort: str, order: str) -> Query:
+    """
+    从游标位置之后继续查询
+    
+    Raises:
+        InvalidCursorError: 游标的排序方式与本次请求不一致或排序键无效
+    """
+    if values.get("sort", "id") != sort or values.get("order", "asc") != order:
+        raise InvalidCursorError("分页游标与当前排序方式不一致")
+    
+    last_id = values["id"]
+    if sort == "id":
+        return query.filter(Image.id < last_id if order == "desc" else Image.id > last_id)
+    
+    key = values.get("key")
+    if not isinstance(key, str):
+        raise InvalidCursorError("无效的分页游标")
+    if sort == "created_at":
+        try:
+            key = datetime.fromisoformat(key)
+        except ValueError as e:
+            raise InvalidCursorError("无效的分页游标") from e
+    
+    # 优先取数据库中该图像存储的排序键（时间的文本格式因数据库而异，直接比较参数可能错位），
+    # 该图像已删除时使用游标记录的值
+    column = SORT_COLUMNS[sort]
+    last_image = aliased(Image)
+    stored_key = func.coalesce(
+        select(getattr(last_image, column.key)).where(last_image.id == last_id).scalar_subquery(),
+        key
+    )
+    position = tuple_(column, Image.id)
+    if order == "desc":
+        return query.filter(position < tuple_(stored_key, last_id))
+    return query.filter(position > tuple_(stored_key, last_id))
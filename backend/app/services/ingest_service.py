@@ -0,0 +1,589 @@
+"""
+服务器文件夹和压缩包导入服务
+后台并行复制和探测文件，分块提交，支持崩溃后断点续传
+"""
+import os
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple, Dict, Any
+from sqlalchemy import insert, func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.image import Image
+from app.models.task import Task
+from app.models.ingest import IngestJob, IngestJobFile
+from app.schemas.ingest import IngestJobProgress, IngestFileError
+from app.services.blob_service import store_blob
+from app.services.folder_stats_service import sync_folder_stats
+from app.utils.storage import copy_file_to_temp, copy_stream_to_temp, discard_temp_file, get_blob_path
+from app.utils.archive import scan_archive, iter_archive_members
+from app.utils.image_optimizer import ImageOptimizer
+from app.utils.derivatives import get_derivative_targets, build_derivatives_record
+from app.config import settings
+
+FOLDER_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp']
+
+
+def scan_folder(folder_path: str) -> List[str]:
+    """扫描文件夹，返回所有支持的图像文件相对路径"""
+    relative_paths = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() not in FOLDER_IMAGE_EXTENSIONS:
+                continue
+            relative_paths.append(os.path.relpath(os.path.join(root, file), folder_path))
+    return relative_paths
+
+
+def build_target_filename(relative_path: str, file_id: int) -> str:
+    """
+    根据相对路径和导入文件记录ID生成可读的图像文件名（用于展示和导出）
+    
+    文件名是确定性的，任务恢复后重新导入的同一文件得到相同的名称
+    """
+    folder, name = os.path.split(relative_path)
+    name_without_ext, file_extension = os.path.splitext(name)
+    
+    if folder:
+        folder_part = folder.replace('/', '_').replace('\\', '_').strip('_')
+        base_name = f"{folder_part}_{name_without_ext}"
+    else:
+        base_name = name_without_ext
+    
+    base_name = "".join(c for c in base_name if c.isalnum() or c in ('_', '-', '.'))
+    return f"{base_name}_i{file_id}{file_extension}"
+
+
+def copy_and_process(source_path: str) -> Tuple[str, int, str, Dict[str, Any]]:
+    """
+    复制文件到临时目录并完成图像处理（在线程池中执行）
+    
+    复制时同时计算内容哈希；随后从刚写入（仍在页缓存中）的文件单次解码，
+    得到尺寸、EXIF方向、缩略图和感知哈希。相同内容的缩略图已存在时不再生成。
+    
+    Returns:
+        (temp_path, file_size, content_hash, info)
+    """
+    temp_path, file_size, content_hash = copy_file_to_temp(source_path)
+    return process_temp_file(temp_path, file_size, content_hash, os.path.splitext(source_path)[1])
+
+
+def process_temp_file(
+    temp_path: str,
+    file_size: int,
+    content_hash: str,
+    file_extension: str
+) -> Tuple[str, int, str, Dict[str, Any]]:
+    """
+    对已写入临时目录的文件完成图像处理（在线程池中执行），失败时删除临时文件
+    
+    Returns:
+        (temp_path, file_size, content_hash, info)
+    """
+    blob_path = get_blob_path(content_hash, file_extension)
+    thumbnail_path = ImageOptimizer.get_thumbnail_path(blob_path, None)
+    thumbnail_exists = os.path.exists(thumbnail_path)
+    
+    info = ImageOptimizer.process_image(
+        temp_path,
+        [] if thumbnail_exists else [(settings.THUMBNAIL_SIZE, thumbnail_path)],
+        derivatives=get_derivative_targets(content_hash)
+    )
+    if not info:
+        discard_temp_file(temp_path)
+        raise ValueError("无法读取图像文件")
+    
+    info["has_thumbnail"] = thumbnail_exists or bool(info["thumbnails"])
+    info["thumbnail_path"] = thumbnail_path if info["has_thumbnail"] else None
+    info["derivatives"] = build_derivatives_record(info["derivatives"])
+    return temp_path, file_size, content_hash, info
+
+
+class IngestService:
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or settings.INGEST_WORKERS
+        self.chunk_size = settings.INGEST_COMMIT_CHUNK
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running = {}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """文件复制和探测以I/O为主，使用有界线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    async def start_ingest(
+        self,
+        task_id: int,
+        source_path: str,
+        user_id: int,
+        source_type: str = "folder",
+        delete_source: bool = False
+    ) -> str:
+        """
+        创建导入任务并在后台执行
+        
+        Args:
+            source_type: folder 导入服务器文件夹，archive 导入 zip/tar 压缩包
+            delete_source: 导入完成后删除来源文件（用于上传的压缩包）
+        """
+        job_id = str(uuid.uuid4())
+        
+        db = SessionLocal()
+        try:
+            job = IngestJob(
+                job_id=job_id,
+                task_id=task_id,
+                user_id=user_id,
+                source_path=source_path,
+                source_type=source_type,
+                delete_source=delete_source,
+                status="pending",
+                progress=0,
+                message="等待处理..."
+            )
+            db.add(job)
+            db.commit()
+        finally:
+            db.close()
+        
+        self._schedule(job_id)
+        return job_id
+    
+    def _schedule(self, job_id: str):
+        """调度导入任务，同一任务不会重复运行"""
+        if job_id in self._running and not self._running[job_id].done():
+            return
+        self._running[job_id] = asyncio.create_task(self._process_ingest(job_id))
+    
+    async def resume_ingest(self, job_id: str) -> bool:
+        """手动恢复失败或中断的导入任务"""
+        db = SessionLocal()
+        try:
+            job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+            if not job or job.status == "completed":
+                return False
+            job.status = "pending"
+            job.message = "等待恢复..."
+            job.completed_at = None
+            db.commit()
+        finally:
+            db.close()
+        
+        self._schedule(job_id)
+        return True
+    
+    def resume_incomplete(self) -> int:
+        """服务启动时恢复上次未完成的导入任务"""
+        db = SessionLocal()
+        try:
+            job_ids = [row[0] for row in db.query(IngestJob.job_id).filter(
+                IngestJob.status.in_(["pending", "scanning", "processing"])
+            ).all()]
+        finally:
+            db.close()
+        
+        for job_id in job_ids:
+            self._schedule(job_id)
+        
+        if job_ids:
+            print(f"恢复 {len(job_ids)} 个未完成的导入任务")
+        return len(job_ids)
+    
+    async def _process_ingest(self, job_id: str):
+        """处理导入任务"""
+        try:
+            db = SessionLocal()
+            try:
+                job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+                if not job:
+                    return
+                job_pk, task_id, source_path = job.id, job.task_id, job.source_path
+                is_archive = job.source_type == "archive"
+                scan_completed, delete_source = job.scan_completed, job.delete_source
+            finally:
+                db.close()
+            
+            if is_archive and not os.path.isfile(source_path):
+                raise Exception("压缩包不存在")
+            if not is_archive and not os.path.isdir(source_path):
+                raise Exception("文件夹不存在或不是有效目录")
+            
+            if not scan_completed:
+                await self._scan(job_id, job_pk, source_path, is_archive)
+            
+            self._update_job(job_id, status="processing", message="正在导入...")
+            
+            if is_archive:
+                await self._process_archive(job_pk, task_id, source_path)
+            else:
+                while True:
+                    done = await self._process_chunk(job_pk, task_id, source_path)
+                    if done:
+                        break
+            
+            db = SessionLocal()
+            try:
+                job = db.query(IngestJob).filter(IngestJob.id == job_pk).first()
+                message = (
+                    f"导入完成：成功 {job.success_count} 个，"
+                    f"重复 {job.duplicate_count or 0} 个，失败 {job.failed_count} 个"
+                )
+                if job.duplicate_member_count:
+                    message += f"，跳过压缩包内重名成员 {job.duplicate_member_count} 个"
+            finally:
+                db.close()
+            
+            self._update_job(job_id, status="completed", progress=100, message=message)
+            
+            if delete_source:
+                discard_temp_file(source_path)
+        
+        except Exception as e:
+            print(f"导入任务失败 {job_id}: {e}")
+            self._update_job(job_id, status="failed", message=f"导入失败: {str(e)}")
+    
+    async def _scan(self, job_id: str, job_pk: int, source_path: str, is_archive: bool = False):
+        """扫描文件夹或压缩包目录并登记待导入文件"""
+        self._update_job(job_id, status="scanning", message="正在扫描压缩包..." if is_archive else "正在扫描文件夹...")
+        
+        loop = asyncio.get_running_loop()
+        duplicate_members = 0
+        if is_archive:
+            relative_paths, duplicate_members = await loop.run_in_executor(
+                self._get_executor(), scan_archive, source_path, FOLDER_IMAGE_EXTENSIONS
+            )
+        else:
+            relative_paths = await loop.run_in_executor(self._get_executor(), scan_folder, source_path)
+        
+        db = SessionLocal()
+        try:
+            # 扫描未完成前不会开始导入，重新扫描时可以安全清除上次残留的记录
+            db.query(IngestJobFile).filter(IngestJobFile.job_id == job_pk).delete(synchronize_session=False)
+            
+            for start in range(0, len(relative_paths), self.chunk_size):
+                db.execute(insert(IngestJobFile), [
+                    {"job_id": job_pk, "relative_path": path, "status": "pending"}
+                    for path in relative_paths[start:start + self.chunk_size]
+                ])
+            
+            job = db.query(IngestJob).filter(IngestJob.id == job_pk).first()
+            job.total_files = len(relative_paths)
+            job.duplicate_member_count = duplicate_members
+            job.scan_completed = True
+            job.message = f"扫描完成，共 {len(relative_paths)} 个图像文件"
+            if duplicate_members:
+                job.message += f"，{duplicate_members} 个重名成员只导入最后一个"
+            db.commit()
+        finally:
+            db.close()
+    
+    async def _process_chunk(self, job_pk: int, task_id: int, source_path: str) -> bool:
+        """
+        并行处理一批待导入文件，并在同一事务中提交
+        
+        Returns:
+            bool: 是否已没有待处理文件
+        """
+        db = SessionLocal()
+        try:
+            file_rows = db.query(IngestJobFile).filter(
+                IngestJobFile.job_id == job_pk,
+                IngestJobFile.status == "pending"
+            ).order_by(IngestJobFile.id).limit(self.chunk_size).all()
+            
+            if not file_rows:
+                return True
+            
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    executor, copy_and_process,
+                    os.path.join(source_path, row.relative_path)
+                )
+                for row in file_rows
+            ], return_exceptions=True)
+            
+            self._commit_results(db, job_pk, task_id, file_rows, results)
+            return False
+        finally:
+            db.close()
+    
+    async def _process_archive(self, job_pk: int, task_id: int, archive_path: str):
+        """
+        单遍顺序读取压缩包并分块提交
+        
+        压缩包只能顺序读取：一个线程按包内顺序把待导入成员流式写入临时文件（同时计算哈希），
+        非图像成员和已完成的成员不会被解压；解码、缩略图等处理在线程池中并行执行。
+        """
+        db = SessionLocal()
+        try:
+            pending = dict(db.query(IngestJobFile.relative_path, IngestJobFile.id).filter(
+                IngestJobFile.job_id == job_pk,
+                IngestJobFile.status == "pending"
+            ).all())
+            has_duplicates = bool(db.query(IngestJob.duplicate_member_count).filter(IngestJob.id == job_pk).scalar())
+        finally:
+            db.close()
+        
+        if not pending:
+            return
+        
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # 有界队列：处理跟不上时暂停读取，临时文件数量不会无限增长
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_workers * 2)
+        remaining = set(pending)
+        stop = threading.Event()
+        
+        def read_members():
+            try:
+                for name, stream in iter_archive_members(archive_path, remaining, has_duplicates):
+                    if stop.is_set():
+                        break
+                    remaining.discard(name)
+                    try:
+                        item = copy_stream_to_temp(stream, name)
+                    except Exception as e:
+                        item = e
+                    asyncio.run_coroutine_threadsafe(queue.put((name, item)), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+        
+        # 读取线程使用默认线程池，不占用处理线程
+        reader = loop.run_in_executor(None, read_members)
+        
+        row_ids, futures = [], []
+        try:
+            while True:
+                entry = await queue.get()
+                if entry is not None:
+                    name, item = entry
+                    if isinstance(item, Exception):
+                        future = loop.create_future()
+                        future.set_exception(item)
+                    else:
+                        future = loop.run_in_executor(
+                            executor, process_temp_file, *item, os.path.splitext(name)[1]
+                        )
+                    row_ids.append(pending[name])
+                    futures.append(future)
+                
+                if row_ids and (entry is None or len(row_ids) >= self.chunk_size):
+                    results = await asyncio.gather(*futures, return_exceptions=True)
+                    self._commit_row_results(job_pk, task_id, row_ids, results)
+                    row_ids, futures = [], []
+                
+                if entry is None:
+                    break
+        finally:
+            # 异常退出时通知读取线程停止，并取空队列避免其阻塞
+            stop.set()
+            while not reader.done():
+                try:
+                    entry = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.05)
+                    continue
+                if entry is not None and not isinstance(entry[1], Exception):
+                    discard_temp_file(entry[1][0])
+        
+        # 读取压缩包出错时在这里抛出，任务标记为失败，可以恢复后从未提交的成员继续
+        await reader
+        
+        if remaining:
+            missing_ids = [pending[name] for name in remaining]
+            self._commit_row_results(
+                job_pk, task_id, missing_ids,
+                [ValueError("压缩包中未找到该文件")] * len(missing_ids)
+            )
+    
+    def _commit_row_results(self, job_pk: int, task_id: int, row_ids: List[int], results: List[Any]):
+        """按导入文件记录ID登记一批处理结果"""
+        db = SessionLocal()
+        try:
+            rows_by_id = {row.id: row for row in db.query(IngestJobFile).filter(
+                IngestJobFile.id.in_(row_ids)
+            ).all()}
+            self._commit_results(db, job_pk, task_id, [rows_by_id[row_id] for row_id in row_ids], results)
+        finally:
+            db.close()
+    
+    def _commit_results(
+        self,
+        db: Session,
+        job_pk: int,
+        task_id: int,
+        file_rows: List[IngestJobFile],
+        results: List[Any]
+    ):
+        """
+        登记一批文件的处理结果
+        
+        results 与 file_rows 一一对应，为 (temp_path, file_size, content_hash, info) 或异常
+        """
+        try:
+            # 一次查询找出任务内已有的内容，本批次内的重复也一并跳过
+            content_hashes = [result[2] for result in results if not isinstance(result, Exception)]
+            existing_images = dict(db.query(Image.content_hash, Image.id).filter(
+                Image.task_id == task_id,
+                Image.content_hash.in_(content_hashes)
+            ).all()) if content_hashes else {}
+            
+            new_images = []
+            succeeded_rows = []
+            duplicate_rows = []
+            failed = 0
+            for row, result in zip(file_rows, results):
+                if isinstance(result, Exception):
+                    row.status = "failed"
+                    row.error = str(result)
+                    failed += 1
+                    continue
+                
+                temp_path, file_size, content_hash, info = result
+                if content_hash in existing_images:
+                    discard_temp_file(temp_path)
+                    duplicate_rows.append((row, existing_images[content_hash]))
+                    continue
+                
+                blob, is_new_content = store_blob(
+                    db, temp_path, content_hash, file_size,
+                    os.path.splitext(row.relative_path)[1]
+                )
+                metadata = {
+                    "width": info["width"],
+                    "height": info["height"],
+                    "exif_orientation": info["orientation"],
+                    "perceptual_hash": info["perceptual_hash"],
+                    "has_thumbnail": info["has_thumbnail"],
+                    "thumbnail_path": info["thumbnail_path"],
+                    "derivatives": info["derivatives"]
+                }
+                if is_new_content or blob.width is None:
+                    for key, value in metadata.items():
+                        setattr(blob, key, value)
+                
+                image = Image(
+                    task_id=task_id,
+                    filename=build_target_filename(row.relative_path, row.id),
+                    original_filename=os.path.basename(row.relative_path),
+                    file_path=blob.file_path,
+                    file_size=file_size,
+                    content_hash=content_hash,
+                    folder_relative_path=row.relative_path,  # 记录文件夹内或压缩包内的相对路径
+                    **metadata
+                )
+                existing_images[content_hash] = image
+                new_images.append(image)
+                succeeded_rows.append(row)
+            
+            if new_images:
+                db.add_all(new_images)
+                db.flush()
+                sync_folder_stats(db, [image.id for image in new_images])
+                for row, image in zip(succeeded_rows, new_images):
+                    row.status = "completed"
+                    row.image_id = image.id
+                
+                db.query(Task).filter(Task.id == task_id).update(
+                    {Task.total_images: func.coalesce(Task.total_images, 0) + len(new_images)},
+                    synchronize_session=False
+                )
+            
+            for row, existing in duplicate_rows:
+                row.status = "duplicate"
+                row.image_id = existing.id if isinstance(existing, Image) else existing
+            
+            job = db.query(IngestJob).filter(IngestJob.id == job_pk).first()
+            job.processed_files = (job.processed_files or 0) + len(file_rows)
+            job.success_count = (job.success_count or 0) + len(new_images)
+            job.failed_count = (job.failed_count or 0) + failed
+            job.duplicate_count = (job.duplicate_count or 0) + len(duplicate_rows)
+            if job.total_files:
+                job.progress = min(99, int(job.processed_files * 100 / job.total_files))
+            job.message = f"已处理 {job.processed_files}/{job.total_files} 个文件"
+            
+            # 图像记录、文件状态和任务统计在同一事务中提交，崩溃后可从未提交的文件继续
+            db.commit()
+        finally:
+            # 已存入存储或已丢弃的临时文件不再存在；中途出错时清理本批其余文件的临时文件
+            for result in results:
+                if not isinstance(result, Exception):
+                    discard_temp_file(result[0])
+        print(f"导入任务 {job.job_id}: {job.message}")
+    
+    
+    def _update_job(self, job_id: str, status: str = None, progress: int = None, message: str = None):
+        """更新导入任务状态"""
+        db = SessionLocal()
+        try:
+            job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+            if not job:
+                print(f"Warning: Ingest job not found: {job_id}")
+                return
+            
+            if status:
+                job.status = status
+                if status in ["completed", "failed"]:
+                    job.completed_at = datetime.now()
+            if progress is not None:
+                job.progress = progress
+            if message:
+                job.message = message
+            
+            db.commit()
+        finally:
+            db.close()
+    
+    def get_job_progress(self, job_id: str, errors_limit: int = 100) -> Optional[IngestJobProgress]:
+        """获取导入任务进度和失败文件列表"""
+        db = SessionLocal()
+        try:
+            job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+            if not job:
+                return None
+            
+            failed_files = db.query(IngestJobFile).filter(
+                IngestJobFile.job_id == job.id,
+                IngestJobFile.status == "failed"
+            ).order_by(IngestJobFile.id).limit(errors_limit).all()
+            
+            return IngestJobProgress(
+                job_id=job.job_id,
+                task_id=job.task_id,
+                source_path=job.source_path,
+                source_type=job.source_type or "folder",
+                status=job.status,
+                progress=job.progress or 0,
+                message=job.message or "",
+                total_files=job.total_files or 0,
+                processed_files=job.processed_files or 0,
+                success_count=job.success_count or 0,
+                failed_count=job.failed_count or 0,
+                duplicate_count=job.duplicate_count or 0,
+                duplicate_member_count=job.duplicate_member_count or 0,
+                errors=[
+                    IngestFileError(relative_path=f.relative_path, error=f.error)
+                    for f in failed_files
+                ],
+                created_at=job.created_at,
+                completed_at=job.completed_at
+            )
+        finally:
+            db.close()
+    
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局导入服务实例
+ingest_service = IngestService()
@@ -0,0 +1,109 @@
+"""
+数据库结构升级
+结构变更由 alembic 迁移脚本（backend/alembic/versions）管理。服务启动和访问数据库的命令行脚本开始时调用 upgrade_schema，
+把数据库升级到最新版本（也可以在 backend 目录下执行 alembic upgrade head）；已是最新版本时不做任何修改，可以重复执行。
+新增或修改模型的列和表时，用 alembic revision --autogenerate 生成迁移脚本并检查后提交
+"""
+import os
+from typing import List, Optional
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.database import Base, engine
+import app.models  # noqa: F401 注册全部模型
+from app.services.annotation_status_service import rebuild_annotation_states
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 引入迁移之前的版本创建的表
+BASELINE_REVISION = "0001"
+BASELINE_TABLES = {"users", "tasks", "images", "task_assignments", "export_records", "annotations"}
+
+# 新增由标注表汇总得到的列和表的版本，从更早的版本升级后需要回填
+ANNOTATION_STATE_REVISION = "0002"
+
+
+def get_alembic_config(connection: Optional[Connection] = None) -> Config:
+    """backend/alembic.ini 的配置，传入连接时迁移在该连接上执行"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def _stamp_unversioned(connection: Connection, config: Config) -> Optional[str]:
+    """
+    为没有版本记录的数据库标记版本
+    
+    由 create_all 按当前模型创建（create_admin.py 等）的数据库标记为最新版本，
+    引入迁移之前的版本创建的数据库标记为基线版本，空数据库不标记（随后从头执行全部迁移）
+    
+    Returns:
+        Optional[str]: 标记的版本
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    if not tables:
+        return None
+    
+    complete = all(
+        table.name in tables
+        and {column.name for column in table.columns} <= {column["name"] for column in inspector.get_columns(table.name)}
+        for table in Base.metadata.sorted_tables
+    )
+    if complete:
+        command.stamp(config, "head")
+        return ScriptDirectory.from_config(config).get_current_head()
+    if tables <= BASELINE_TABLES:
+        command.stamp(config, BASELINE_REVISION)
+        return BASELINE_REVISION
+    raise RuntimeError(
+        f"无法确定数据库结构的版本（已有的表: {', '.join(sorted(tables))}），"
+        "请检查后用 alembic stamp 标记版本再升级"
+    )
+
+
+def _backfill_annotation_states(bind: Engine):
+    """按标注表回填图像整体状态、图像-标注员状态和文件夹汇总，新增相关列或表后执行一次（中断后可运行 rebuild_annotation_states.py）"""
+    print("🔧 正在按标注表回填图像标注状态...")
+    db = Session(bind=bind)
+    try:
+        processed = rebuild_annotation_states(db)
+    finally:
+        db.close()
+    print(f"✅ 已回填 {processed} 张图像的标注状态")
+
+
+def upgrade_schema(bind: Engine = engine, backfill: bool = True) -> List[str]:
+    """
+    把数据库升级到最新版本
+    
+    Args:
+        backfill: 是否回填新增的汇总列和汇总表（随后会自行重建时传False）
+    
+    Returns:
+        List[str]: 本次执行的迁移版本（按执行顺序）
+    """
+    with bind.begin() as connection:
+        config = get_alembic_config(connection)
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current is None:
+            current = _stamp_unversioned(connection, config)
+        
+        script = ScriptDirectory.from_config(config)
+        applied = [revision.revision for revision in script.iterate_revisions("heads", current)]
+        applied.reverse()
+        if applied:
+            command.upgrade(config, "heads")
+            print(f"🔧 数据库结构已升级: {' -> '.join([current or '空数据库'] + applied)}")
+    
+    # 已有数据的数据库新增了汇总列和汇总表
+    if backfill and current is not None and ANNOTATION_STATE_REVISION in applied:
+        _backfill_annotation_states(bind)
+    
+    return applied
@@ -0,0 +1,145 @@
+"""
+缩略图拼图服务
+任务内按固定的图像ID区间生成拼图，版本号由区间内图像计算，图像增删后URL随之变化；
+拼图在首次请求时于进程池中生成，同一拼图的并发请求合并为一次生成
+"""
+import os
+import glob
+import shutil
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from app.models.image import Image
+from app.utils.sprite import build_layout, get_sprite_path, render_sprite
+from app.services.delivery_service import delivery_service
+from app.config import settings
+
+
+class SpriteService:
+    def __init__(self, max_workers: int = None):
+        self.max_workers = settings.THUMBNAIL_WORKERS if max_workers is None else max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """懒加载进程池；工作进程数为0时退化为默认线程池"""
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _query_block(self, db: Session, task_id: int, block: int) -> List[tuple]:
+        block_size = settings.SPRITE_BLOCK_SIZE
+        return db.query(
+            Image.id, Image.width, Image.height, Image.exif_orientation,
+            Image.content_hash, Image.file_path, Image.thumbnail_path
+        ).filter(
+            Image.task_id == task_id,
+            Image.id >= block * block_size,
+            Image.id < (block + 1) * block_size
+        ).order_by(Image.id).all()
+    
+    @staticmethod
+    def _layout(rows: List[tuple]) -> Dict[str, Any]:
+        members = [
+            {
+                "id": image_id,
+                "width": width,
+                "height": height,
+                "exif_orientation": orientation,
+                "source": f"{content_hash or file_path}:{thumbnail_path or ''}"
+            }
+            for image_id, width, height, orientation, content_hash, file_path, thumbnail_path in rows
+        ]
+        return build_layout(members, settings.SPRITE_CELL_SIZE, settings.SPRITE_COLUMNS)
+    
+    def get_page_sprites(self, db: Session, task_id: int, image_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        返回列表页每张图像在拼图中的位置
+        
+        每个涉及的ID区间一次查询，只读取数据库中的尺寸信息，不访问文件系统。
+        尺寸未知（尚未处理完成）的图像不在拼图中，前端改用单独的缩略图。
+        一页图像的ID跨越超过 SPRITE_MAX_PAGE_BLOCKS 个区间时（ID稀疏，每张拼图只用到少数单元格，
+        下载拼图比单独的缩略图更多）不使用拼图，返回空字典。
+        """
+        blocks = {image_id // settings.SPRITE_BLOCK_SIZE for image_id in image_ids}
+        if len(blocks) > settings.SPRITE_MAX_PAGE_BLOCKS:
+            return {}
+        
+        result = {}
+        for block in sorted(blocks):
+            layout = self._layout(self._query_block(db, task_id, block))
+            if not layout["cells"]:
+                continue
+            url = f"/api/files/task/{task_id}/sprites/{block}_{layout['version']}.jpg"
+            for image_id, cell in layout["cells"].items():
+                result[image_id] = {
+                    "url": url,
+                    **cell,
+                    "sheet_width": layout["width"],
+                    "sheet_height": layout["height"]
+                }
+        return result
+    
+    async def get_sprite(self, db: Session, task_id: int, block: int, version: str) -> Optional[str]:
+        """
+        返回拼图路径，未生成时生成
+        
+        区间内图像已变化（版本号不一致）时返回None。
+        """
+        rows = self._query_block(db, task_id, block)
+        layout = self._layout(rows)
+        if not layout["cells"] or layout["version"] != version:
+            return None
+        
+        sprite_path = get_sprite_path(task_id, block, version)
+        if os.path.exists(sprite_path):
+            delivery_service.record("sprite_cache", "hit")
+            return sprite_path
+        
+        delivery_service.record("sprite_cache", "miss")
+        future = self._pending.get(sprite_path)
+        if future is None:
+            sources = [
+                (thumbnail_path or file_path, bool(thumbnail_path), layout["cells"][image_id])
+                for image_id, _, _, _, _, file_path, thumbnail_path in rows
+                if image_id in layout["cells"]
+            ]
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._get_executor(), render_sprite,
+                sources, (layout["width"], layout["height"]), sprite_path, settings.SPRITE_QUALITY
+            )
+            self._pending[sprite_path] = future
+            future.add_done_callback(lambda f: self._on_generated(task_id, block, sprite_path, f))
+        
+        # 单个请求取消时不影响其他等待者和正在进行的生成
+        await asyncio.shield(future)
+        return sprite_path
+    
+    def _on_generated(self, task_id: int, block: int, sprite_path: str, future: asyncio.Future):
+        """生成成功后删除同一区间的旧版本拼图"""
+        self._pending.pop(sprite_path, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        pattern = os.path.join(settings.SPRITE_DIR, str(task_id), f"{block}_*.jpg")
+        for path in glob.glob(pattern):
+            if path != sprite_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def remove_task_sprites(self, task_id: int):
+        """删除任务的全部拼图（任务删除后调用）"""
+        shutil.rmtree(os.path.join(settings.SPRITE_DIR, str(task_id)), ignore_errors=True)
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局拼图服务实例
+sprite_service = SpriteService()
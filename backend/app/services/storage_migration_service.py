@@ -0,0 +1,158 @@
+"""
+存储布局迁移服务
+将旧的平铺目录（static/uploads/<task_id>/）和按文件名哈希分级的图像迁移到内容寻址存储
+"""
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+from app.database import SessionLocal
+from app.models.image import Image
+from app.services.blob_service import acquire_blob
+from app.utils.image_optimizer import ImageOptimizer
+from app.utils.storage import get_blob_path, get_blob_temp_path, commit_blob_file, hash_file
+from app.config import settings
+
+
+def link_into_store(legacy_path: str, task_id: int) -> Dict[str, Any]:
+    """
+    计算旧文件哈希并链接到内容寻址路径（在线程池中执行）
+    
+    优先使用硬链接，跨文件系统时退化为复制；旧文件保留到数据库提交之后再删除，
+    任何时刻中断都可以重新执行。
+    """
+    file_size, content_hash = hash_file(legacy_path)
+    blob_path = get_blob_path(content_hash, os.path.splitext(legacy_path)[1])
+    
+    if not os.path.exists(blob_path):
+        temp_path = get_blob_temp_path()
+        try:
+            os.link(legacy_path, temp_path)
+        except OSError:
+            shutil.copy2(legacy_path, temp_path)
+        commit_blob_file(temp_path, blob_path)
+    
+    # 旧缩略图移到按内容哈希共享的位置，避免重新生成
+    has_thumbnail = False
+    legacy_thumbnail = ImageOptimizer.get_thumbnail_path(legacy_path, task_id)
+    blob_thumbnail = ImageOptimizer.get_thumbnail_path(blob_path, None)
+    if os.path.exists(blob_thumbnail):
+        has_thumbnail = True
+    elif os.path.exists(legacy_thumbnail):
+        shutil.copy2(legacy_thumbnail, blob_thumbnail)
+        has_thumbnail = True
+    
+    return {
+        "content_hash": content_hash,
+        "file_size": file_size,
+        "blob_path": blob_path,
+        "legacy_thumbnail": legacy_thumbnail,
+        "has_thumbnail": has_thumbnail,
+        "thumbnail_path": blob_thumbnail if has_thumbnail else None
+    }
+
+
+def remove_legacy_files(*paths: str):
+    """删除已迁移的旧文件"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除旧文件失败 {path}: {e}")
+
+
+def migrate_legacy_images(
+    task_id: Optional[int] = None,
+    batch_size: int = 500,
+    workers: int = 8,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    将尚未使用内容寻址存储的图像迁移到新布局
+    
+    按图像ID分批处理，每批并行计算哈希和建立链接，在一个事务中改写
+    Image.file_path 和引用计数，提交后再删除旧文件。已迁移的图像
+    （content_hash 非空）会被跳过，可以在服务运行期间反复执行。
+    
+    Returns:
+        dict: migrated, missing, failed 计数
+    """
+    stats = {"migrated": 0, "missing": 0, "failed": 0}
+    last_id = 0
+    started = time.time()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            db = SessionLocal()
+            try:
+                query = db.query(Image).filter(
+                    Image.content_hash.is_(None),
+                    Image.id > last_id
+                )
+                if task_id:
+                    query = query.filter(Image.task_id == task_id)
+                images = query.order_by(Image.id).limit(batch_size).all()
+                
+                if not images:
+                    break
+                last_id = images[-1].id
+                
+                existing = []
+                for image in images:
+                    if os.path.exists(image.file_path):
+                        existing.append(image)
+                    else:
+                        stats["missing"] += 1
+                        print(f"文件不存在，跳过: image_id={image.id}, path={image.file_path}")
+                
+                if dry_run:
+                    stats["migrated"] += len(existing)
+                    continue
+                
+                futures = [
+                    (image, executor.submit(link_into_store, image.file_path, image.task_id))
+                    for image in existing
+                ]
+                
+                cleanup = []
+                for image, future in futures:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"迁移失败: image_id={image.id}, error={e}")
+                        stats["failed"] += 1
+                        continue
+                    
+                    blob, _ = acquire_blob(db, result["content_hash"], result["blob_path"], result["file_size"])
+                    if result["has_thumbnail"]:
+                        blob.has_thumbnail = True
+                        blob.thumbnail_path = result["thumbnail_path"]
+                    if blob.width is None and image.width is not None:
+                        blob.width, blob.height = image.width, image.height
+                    
+                    cleanup.append((image.file_path, result["legacy_thumbnail"]))
+                    image.file_path = blob.file_path
+                    image.content_hash = result["content_hash"]
+                    image.has_thumbnail = bool(blob.has_thumbnail)
+                    image.thumbnail_path = blob.thumbnail_path
+                    stats["migrated"] += 1
+                
+                db.commit()
+            finally:
+                db.close()
+            
+            # 新路径提交后旧文件不再被引用
+            for legacy_path, legacy_thumbnail in cleanup:
+                remove_legacy_files(legacy_path, legacy_thumbnail)
+            
+            elapsed = max(time.time() - started, 1e-6)
+            print(f"已迁移 {stats['migrated']} 张图像（{stats['migrated'] / elapsed:.1f} 张/秒）")
+    
+    if not dry_run:
+        ImageOptimizer.cleanup_empty_directories(settings.UPLOAD_DIR)
+        ImageOptimizer.cleanup_empty_directories(settings.THUMBNAIL_DIR)
+    
+    return stats
@@ -0,0 +1,352 @@
+"""
+缩略图批量重建服务
+为任务或整个存储补生成缺失的默认缩略图，或在修改缩略图尺寸/质量配置后重新生成；
+在进程池中并行生成，每批提交后记录检查点，中断后从检查点继续
+"""
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.image import Image
+from app.models.blob import ImageBlob
+from app.models.thumbnail_job import ThumbnailJob
+from app.schemas.thumbnail_job import ThumbnailJobProgress
+from app.services.thumbnail_service import sync_image_thumbnails
+from app.utils.image_optimizer import ImageOptimizer
+from app.utils.thumbnail_engine import generate_thumbnails, get_thumbnail_signature, read_thumbnail_signature
+from app.config import settings
+
+PHASES = ("blobs", "legacy")
+
+
+def is_thumbnail_current(source_mtime: float, thumbnail_path: str, signature: bytes) -> bool:
+    """缩略图存在、不早于原图，且生成参数与当前配置一致"""
+    try:
+        if os.stat(thumbnail_path).st_mtime < source_mtime:
+            return False
+    except OSError:
+        return False
+    return read_thumbnail_signature(thumbnail_path) == signature
+
+
+def backfill_thumbnails(
+    items: List[Tuple[str, str]],
+    size: Tuple[int, int],
+    quality: int,
+    force: bool
+) -> List[str]:
+    """
+    生成一组缩略图（在工作进程中执行），已是最新的跳过
+    
+    Args:
+        items: [(原图路径, 缩略图路径), ...]
+    
+    Returns:
+        list: 每项的结果 generated, skipped, missing, failed
+    """
+    signature = get_thumbnail_signature(size, quality)
+    statuses = [None] * len(items)
+    pending = []
+    for index, (source_path, thumbnail_path) in enumerate(items):
+        try:
+            source_mtime = os.stat(source_path).st_mtime
+        except OSError:
+            statuses[index] = "missing"
+            continue
+        if not force and is_thumbnail_current(source_mtime, thumbnail_path, signature):
+            statuses[index] = "skipped"
+            continue
+        pending.append(index)
+    
+    results = generate_thumbnails([(items[i][0], items[i][1], size) for i in pending], quality)
+    for index, success in zip(pending, results):
+        statuses[index] = "generated" if success else "failed"
+    return statuses
+
+
+class ThumbnailBackfillService:
+    def __init__(self):
+        self._running: Dict[str, asyncio.Task] = {}
+        self._executors: Dict[str, ProcessPoolExecutor] = {}
+    
+    def create_job(self, task_id: Optional[int], user_id: Optional[int], force: bool = False, workers: int = 0) -> str:
+        """创建重建任务记录（命令行和接口共用）"""
+        job_id = str(uuid.uuid4())
+        db = SessionLocal()
+        try:
+            db.add(ThumbnailJob(
+                job_id=job_id,
+                task_id=task_id,
+                user_id=user_id,
+                force=force,
+                workers=workers,
+                status="pending",
+                progress=0,
+                message="等待处理..."
+            ))
+            db.commit()
+        finally:
+            db.close()
+        return job_id
+    
+    async def start_job(self, task_id: Optional[int], user_id: Optional[int], force: bool = False, workers: int = 0) -> str:
+        """创建重建任务并在后台执行"""
+        job_id = self.create_job(task_id, user_id, force, workers)
+        self._schedule(job_id)
+        return job_id
+    
+    def _schedule(self, job_id: str):
+        """调度重建任务，同一任务不会重复运行"""
+        if job_id in self._running and not self._running[job_id].done():
+            return
+        self._running[job_id] = asyncio.create_task(self.run_job(job_id))
+    
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._running and not self._running[job_id].done()
+    
+    async def resume_job(self, job_id: str) -> bool:
+        """从检查点恢复失败或中断的重建任务"""
+        if not self.reset_job(job_id):
+            return False
+        self._schedule(job_id)
+        return True
+    
+    def reset_job(self, job_id: str) -> bool:
+        """把未完成的任务改回等待状态，已完成或不存在时返回False"""
+        db = SessionLocal()
+        try:
+            job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+            if not job or job.status == "completed":
+                return False
+            job.status = "pending"
+            job.message = "等待恢复..."
+            job.completed_at = None
+            db.commit()
+            return True
+        finally:
+            db.close()
+    
+    def resume_incomplete(self) -> int:
+        """服务启动时恢复上次未完成的重建任务"""
+        db = SessionLocal()
+        try:
+            job_ids = [row[0] for row in db.query(ThumbnailJob.job_id).filter(
+                ThumbnailJob.status.in_(["pending", "processing"])
+            ).all()]
+        finally:
+            db.close()
+        
+        for job_id in job_ids:
+            self._schedule(job_id)
+        
+        if job_ids:
+            print(f"恢复 {len(job_ids)} 个未完成的缩略图重建任务")
+        return len(job_ids)
+    
+    @staticmethod
+    def _blob_query(db: Session, task_id: Optional[int]):
+        query = db.query(ImageBlob)
+        if task_id:
+            query = query.filter(ImageBlob.content_hash.in_(
+                select(Image.content_hash).where(Image.task_id == task_id)
+            ))
+        return query
+    
+    @staticmethod
+    def _legacy_query(db: Session, task_id: Optional[int]):
+        query = db.query(Image).filter(Image.content_hash.is_(None))
+        if task_id:
+            query = query.filter(Image.task_id == task_id)
+        return query
+    
+    def _load_batch(self, db: Session, job: ThumbnailJob, batch_size: int) -> List[Tuple[object, str, str]]:
+        """读取检查点之后的一批记录: [(记录, 原图路径, 缩略图路径), ...]"""
+        if job.phase == "blobs":
+            query = self._blob_query(db, job.task_id).filter(ImageBlob.id > job.last_id).order_by(ImageBlob.id)
+            return [
+                (blob, blob.file_path, ImageOptimizer.get_thumbnail_path(blob.file_path, None, create_dir=False))
+                for blob in query.limit(batch_size).all()
+            ]
+        query = self._legacy_query(db, job.task_id).filter(Image.id > job.last_id).order_by(Image.id)
+        return [
+            (image, image.file_path, ImageOptimizer.get_thumbnail_path(image.file_path, image.task_id, create_dir=False))
+            for image in query.limit(batch_size).all()
+        ]
+    
+    async def run_job(self, job_id: str):
+        """
+        执行重建任务
+        
+        每批先在进程池中并行生成，再在一个事务中更新缩略图记录、统计和检查点；
+        中断后重新处理的最多是最后一批，其中已生成的缩略图会被当作最新而跳过。
+        """
+        executor = None
+        try:
+            db = SessionLocal()
+            try:
+                job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+                if not job:
+                    return
+                job.status = "processing"
+                job.message = "正在生成缩略图..."
+                job.total_items = (
+                    self._blob_query(db, job.task_id).count()
+                    + self._legacy_query(db, job.task_id).count()
+                )
+                workers = job.workers or settings.THUMBNAIL_BACKFILL_WORKERS
+                db.commit()
+            finally:
+                db.close()
+            
+            executor = ProcessPoolExecutor(max_workers=max(1, workers))
+            self._executors[job_id] = executor
+            while await self._process_batch(job_id, executor):
+                pass
+            
+            db = SessionLocal()
+            try:
+                job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+                job.status = "completed"
+                job.progress = 100
+                job.completed_at = datetime.now()
+                job.message = (
+                    f"重建完成：生成 {job.generated_count} 张，已是最新 {job.skipped_count} 张，"
+                    f"原图缺失 {job.missing_count} 张，失败 {job.failed_count} 张，"
+                    f"{self._throughput(job):.1f} 张/秒"
+                )
+                db.commit()
+                print(f"缩略图重建任务 {job_id}: {job.message}")
+            finally:
+                db.close()
+        
+        except Exception as e:
+            print(f"缩略图重建任务失败 {job_id}: {e}")
+            self._update_job(job_id, status="failed", message=f"重建失败: {str(e)}")
+        finally:
+            self._executors.pop(job_id, None)
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _process_batch(self, job_id: str, executor: ProcessPoolExecutor) -> bool:
+        """处理检查点之后的一批记录，全部处理完时返回False"""
+        started = time.time()
+        db = SessionLocal()
+        try:
+            job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+            batch = self._load_batch(db, job, settings.THUMBNAIL_BACKFILL_BATCH)
+            if not batch:
+                if job.phase == PHASES[-1]:
+                    return False
+                # 进入下一阶段
+                job.phase = PHASES[PHASES.index(job.phase) + 1]
+                job.last_id = 0
+                db.commit()
+                return True
+            
+            chunk = settings.THUMBNAIL_BACKFILL_CHUNK
+            items = [(source_path, thumbnail_path) for _, source_path, thumbnail_path in batch]
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    executor, backfill_thumbnails,
+                    items[offset:offset + chunk], settings.THUMBNAIL_SIZE, settings.THUMBNAIL_QUALITY, bool(job.force)
+                )
+                for offset in range(0, len(items), chunk)
+            ])
+            statuses = [status for chunk_statuses in results for status in chunk_statuses]
+            
+            counters = {"generated": 0, "skipped": 0, "missing": 0, "failed": 0}
+            for (record, _, thumbnail_path), status in zip(batch, statuses):
+                counters[status] += 1
+                if status in ("generated", "skipped") and record.thumbnail_path != thumbnail_path:
+                    record.thumbnail_path = thumbnail_path
+                    record.has_thumbnail = True
+            if job.phase == "blobs":
+                db.flush()
+                sync_image_thumbnails(db, [record.content_hash for record, _, _ in batch])
+            
+            # 记录、统计和检查点在同一事务中提交
+            job.last_id = batch[-1][0].id
+            job.processed_items = (job.processed_items or 0) + len(batch)
+            job.generated_count = (job.generated_count or 0) + counters["generated"]
+            job.skipped_count = (job.skipped_count or 0) + counters["skipped"]
+            job.missing_count = (job.missing_count or 0) + counters["missing"]
+            job.failed_count = (job.failed_count or 0) + counters["failed"]
+            job.elapsed_seconds = (job.elapsed_seconds or 0) + (time.time() - started)
+            if job.total_items:
+                job.progress = min(99, int(job.processed_items / job.total_items * 100))
+            job.message = (
+                f"已处理 {job.processed_items}/{job.total_items} 张（{self._throughput(job):.1f} 张/秒）"
+            )
+            db.commit()
+            print(f"缩略图重建任务 {job_id}: {job.message}")
+            return True
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _throughput(job: ThumbnailJob) -> float:
+        return (job.processed_items or 0) / job.elapsed_seconds if job.elapsed_seconds else 0.0
+    
+    def _update_job(self, job_id: str, status: str = None, message: str = None):
+        """更新重建任务状态"""
+        db = SessionLocal()
+        try:
+            job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+            if not job:
+                return
+            if status:
+                job.status = status
+                if status in ["completed", "failed"]:
+                    job.completed_at = datetime.now()
+            if message:
+                job.message = message
+            db.commit()
+        finally:
+            db.close()
+    
+    def get_job_progress(self, job_id: str) -> Optional[ThumbnailJobProgress]:
+        """获取重建任务进度和吞吐"""
+        db = SessionLocal()
+        try:
+            job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).first()
+            if not job:
+                return None
+            return ThumbnailJobProgress(
+                job_id=job.job_id,
+                task_id=job.task_id,
+                force=bool(job.force),
+                status=job.status,
+                progress=job.progress or 0,
+                message=job.message or "",
+                total_items=job.total_items or 0,
+                processed_items=job.processed_items or 0,
+                generated_count=job.generated_count or 0,
+                skipped_count=job.skipped_count or 0,
+                missing_count=job.missing_count or 0,
+                failed_count=job.failed_count or 0,
+                elapsed_seconds=round(job.elapsed_seconds or 0, 3),
+                items_per_second=round(self._throughput(job), 2),
+                created_at=job.created_at,
+                completed_at=job.completed_at
+            )
+        finally:
+            db.close()
+    
+    def shutdown(self):
+        """停止正在运行的任务并关闭进程池，下次启动时从检查点继续"""
+        for task in self._running.values():
+            task.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+
+# 全局缩略图重建服务实例
+thumbnail_backfill_service = ThumbnailBackfillService()
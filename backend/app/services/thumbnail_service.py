@@ -0,0 +1,332 @@
+"""
+按需缩略图服务
+首次请求时在进程池中生成指定尺寸的缩略图并写入磁盘缓存，
+同一缩略图的并发请求合并为一次生成，缓存按总大小以最近最少使用顺序淘汰；
+后台定期核对数据库中记录的默认缩略图路径与实际文件
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.image import Image
+from app.models.blob import ImageBlob
+from app.utils.image_optimizer import ImageOptimizer
+from app.services.delivery_service import delivery_service
+from app.config import settings
+
+# 命中时最多每隔这么久更新一次文件修改时间，重启后按修改时间恢复使用顺序
+TOUCH_INTERVAL = 3600
+
+
+def render_thumbnail(source_path: str, thumbnail_path: str, size: int, quality: int) -> int:
+    """
+    生成缩略图（在工作进程中执行）
+    
+    Returns:
+        int: 缩略图文件大小；无法读取时抛出 ValueError
+    """
+    if not ImageOptimizer.generate_thumbnail(source_path, thumbnail_path, (size, size), quality):
+        raise ValueError("无法生成缩略图")
+    return os.path.getsize(thumbnail_path)
+
+
+def get_cache_key(image: Image) -> str:
+    """内容寻址的图像按哈希共享缩略图，其余按图像ID区分"""
+    return image.content_hash or f"image_{image.id}"
+
+
+def get_cache_path(cache_key: str, size: int) -> str:
+    """
+    缩略图缓存路径，纯字符串计算
+    
+    例如: static/thumbnails/cache/256/ab/abcd...ef.jpg
+    """
+    return os.path.join(settings.THUMBNAIL_CACHE_DIR, str(size), cache_key[-2:], f"{cache_key}.jpg")
+
+
+def normalize_size(size: int) -> int:
+    """请求尺寸向上取整到可选边长，限制缓存中同一图像的变体数量"""
+    for allowed in settings.THUMBNAIL_CACHE_SIZES:
+        if size <= allowed:
+            return allowed
+    return settings.THUMBNAIL_CACHE_SIZES[-1]
+
+
+def sync_image_thumbnails(db: Session, content_hashes: List[str]) -> int:
+    """
+    用关联子查询一次把存储记录的缩略图路径同步到引用它们的图像（调用前先 flush 存储记录）
+    
+    Returns:
+        int: 修改的图像数
+    """
+    blob_thumbnail = select(ImageBlob.thumbnail_path).where(
+        ImageBlob.content_hash == Image.content_hash
+    ).scalar_subquery()
+    blob_has_thumbnail = select(ImageBlob.has_thumbnail).where(
+        ImageBlob.content_hash == Image.content_hash
+    ).scalar_subquery()
+    result = db.execute(
+        update(Image).where(
+            Image.content_hash.in_(content_hashes),
+            Image.thumbnail_path.is_distinct_from(blob_thumbnail)
+        ).values(
+            thumbnail_path=blob_thumbnail,
+            has_thumbnail=blob_has_thumbnail
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class ThumbnailService:
+    def __init__(self, max_workers: int = None, max_bytes: int = None):
+        self.max_workers = settings.THUMBNAIL_WORKERS if max_workers is None else max_workers
+        self.max_bytes = settings.THUMBNAIL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.cache_dir = settings.THUMBNAIL_CACHE_DIR
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        # 缓存索引：路径 -> [文件大小, 上次更新修改时间]，按最近使用排序
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """懒加载进程池；工作进程数为0时退化为默认线程池"""
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _scan_cache_dir(self) -> List[tuple]:
+        """扫描缓存目录，返回按修改时间排序的 (路径, 大小, 修改时间)"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".part"):
+                    # 上次异常退出留下的临时文件
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+    
+    async def _ensure_loaded(self):
+        """首次使用时从磁盘重建缓存索引"""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for path, file_size, mtime in await asyncio.to_thread(self._scan_cache_dir):
+                self._entries[path] = [file_size, mtime]
+                self._total_bytes += file_size
+            self._loaded = True
+        await self._evict()
+    
+    def _touch(self, path: str):
+        """标记为最近使用"""
+        entry = self._entries[path]
+        self._entries.move_to_end(path)
+        now = time.time()
+        if now - entry[1] > TOUCH_INTERVAL:
+            entry[1] = now
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+    
+    def _add(self, path: str, file_size: int):
+        old = self._entries.pop(path, None)
+        if old:
+            self._total_bytes -= old[0]
+        self._entries[path] = [file_size, time.time()]
+        self._total_bytes += file_size
+    
+    async def _evict(self):
+        """超出容量时淘汰最久未使用的缩略图"""
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, (file_size, _) = self._entries.popitem(last=False)
+            self._total_bytes -= file_size
+            evicted.append(path)
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+    
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"删除缩略图缓存失败 {path}: {e}")
+    
+    async def get_thumbnail(self, image: Image, size: int) -> str:
+        """
+        返回指定尺寸缩略图的缓存路径，缓存未命中时生成
+        
+        命中时只查询内存索引，不读取和解码图像；正在生成时等待同一次生成完成。
+        """
+        await self._ensure_loaded()
+        
+        size = normalize_size(size)
+        path = get_cache_path(get_cache_key(image), size)
+        if path in self._entries:
+            self._touch(path)
+            delivery_service.record("thumbnail_cache", "hit")
+            return path
+        
+        delivery_service.record("thumbnail_cache", "miss")
+        future = self._pending.get(path)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._get_executor(), render_thumbnail,
+                image.file_path, path, size, settings.THUMBNAIL_QUALITY
+            )
+            self._pending[path] = future
+            future.add_done_callback(lambda f: self._on_generated(path, f))
+        
+        # 单个请求取消时不影响其他等待者和正在进行的生成
+        await asyncio.shield(future)
+        await self._evict()
+        return path
+    
+    def _on_generated(self, path: str, future: asyncio.Future):
+        """生成结束后登记到缓存索引，与移出等待表在同一回调中完成"""
+        self._pending.pop(path, None)
+        if not future.cancelled() and future.exception() is None:
+            self._add(path, future.result())
+    
+    def discard(self, cache_keys: List[str]):
+        """删除图像的全部尺寸缩略图（存储文件或图像删除后调用）"""
+        paths = [
+            get_cache_path(cache_key, size)
+            for cache_key in cache_keys
+            for size in settings.THUMBNAIL_CACHE_SIZES
+        ]
+        for path in paths:
+            entry = self._entries.pop(path, None)
+            if entry:
+                self._total_bytes -= entry[0]
+        self._remove_files(paths)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """磁盘缓存占用情况"""
+        return {
+            "entries": len(self._entries),
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "pending": len(self._pending)
+        }
+    
+    def reconcile(self, batch_size: int = None) -> Dict[str, int]:
+        """
+        核对数据库中记录的默认缩略图与文件系统，修正两者不一致的记录
+        
+        文件缺失时清除记录（列表改用按需缩略图接口），文件存在但未记录时补上路径。
+        内容寻址的图像以存储记录为准批量同步到引用它的图像。
+        
+        Returns:
+            dict: checked, fixed
+        """
+        batch_size = batch_size or settings.THUMBNAIL_RECONCILE_BATCH
+        stats = {"checked": 0, "fixed": 0}
+        db = SessionLocal()
+        try:
+            last_id = 0
+            while True:
+                blobs = db.query(ImageBlob).filter(
+                    ImageBlob.id > last_id
+                ).order_by(ImageBlob.id).limit(batch_size).all()
+                if not blobs:
+                    break
+                last_id = blobs[-1].id
+                
+                for blob in blobs:
+                    thumbnail_path = ImageOptimizer.get_thumbnail_path(blob.file_path, None, create_dir=False)
+                    expected = thumbnail_path if os.path.exists(thumbnail_path) else None
+                    if blob.thumbnail_path != expected or bool(blob.has_thumbnail) != bool(expected):
+                        blob.thumbnail_path = expected
+                        blob.has_thumbnail = expected is not None
+                        stats["fixed"] += 1
+                db.flush()
+                
+                stats["fixed"] += sync_image_thumbnails(db, [blob.content_hash for blob in blobs])
+                stats["checked"] += len(blobs)
+                db.commit()
+            
+            # 尚未迁移到内容寻址存储的旧图像逐个核对
+            last_id = 0
+            while True:
+                images = db.query(Image).filter(
+                    Image.content_hash.is_(None),
+                    Image.id > last_id
+                ).order_by(Image.id).limit(batch_size).all()
+                if not images:
+                    break
+                last_id = images[-1].id
+                
+                for image in images:
+                    thumbnail_path = ImageOptimizer.get_thumbnail_path(image.file_path, image.task_id, create_dir=False)
+                    expected = thumbnail_path if os.path.exists(thumbnail_path) else None
+                    if image.thumbnail_path != expected or bool(image.has_thumbnail) != bool(expected):
+                        image.thumbnail_path = expected
+                        image.has_thumbnail = expected is not None
+                        stats["fixed"] += 1
+                stats["checked"] += len(images)
+                db.commit()
+        finally:
+            db.close()
+        
+        if stats["fixed"]:
+            print(f"缩略图记录核对完成：检查 {stats['checked']} 条，修正 {stats['fixed']} 条")
+        return stats
+    
+    async def _reconcile_loop(self):
+        """定期核对缩略图记录"""
+        while True:
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                print(f"核对缩略图记录失败: {e}")
+            await asyncio.sleep(settings.THUMBNAIL_RECONCILE_INTERVAL)
+    
+    def start_reconciler(self):
+        """启动后台核对（启动时先执行一次，补全升级前没有记录路径的图像）"""
+        if settings.THUMBNAIL_RECONCILE_INTERVAL <= 0:
+            return
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+    
+    def stop_reconciler(self):
+        """停止后台核对"""
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局缩略图服务实例
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,127 @@
+"""
+瓦片金字塔服务
+超大图像按需在进程池中生成 DeepZoom 瓦片，同一图像的并发请求合并为一次生成
+"""
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+from app.models.image import Image
+from app.utils.tile_pyramid import (
+    generate_pyramid, is_pyramid_complete, get_tile_path, get_blob_pyramid_dir,
+    get_max_level, get_level_size, get_tile_grid
+)
+from app.config import settings
+
+
+class TileService:
+    def __init__(self, max_workers: int = None):
+        self.max_workers = settings.TILE_WORKERS if max_workers is None else max_workers
+        self.tile_dir = settings.TILE_DIR
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """懒加载进程池；工作进程数为0时退化为默认线程池"""
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    @staticmethod
+    def get_display_size(image: Image) -> Optional[tuple]:
+        """按EXIF方向旋转后的显示尺寸（瓦片与浏览器显示一致）"""
+        if not image.width or not image.height:
+            return None
+        if image.exif_orientation in (5, 6, 7, 8):
+            return image.height, image.width
+        return image.width, image.height
+    
+    def needs_pyramid(self, image: Image) -> bool:
+        """长边超过阈值的图像使用瓦片显示"""
+        size = self.get_display_size(image)
+        return size is not None and max(size) > settings.TILE_PYRAMID_MIN_SIZE
+    
+    def get_pyramid_dir(self, image: Image) -> str:
+        """内容寻址的图像按哈希共享瓦片，其余按图像ID存放"""
+        if image.content_hash:
+            return get_blob_pyramid_dir(image.content_hash)
+        return os.path.join(self.tile_dir, "images", str(image.id))
+    
+    def get_pyramid_info(self, image: Image) -> Optional[Dict[str, Any]]:
+        """
+        返回画布使用的金字塔元数据，小图返回None（直接加载原图）
+        
+        元数据只由尺寸计算，不依赖瓦片是否已生成
+        """
+        if not self.needs_pyramid(image):
+            return None
+        
+        width, height = self.get_display_size(image)
+        return {
+            "width": width,
+            "height": height,
+            "tile_size": settings.TILE_SIZE,
+            "overlap": settings.TILE_OVERLAP,
+            "format": "jpg",
+            "max_level": get_max_level(width, height),
+            "tile_url": f"/api/files/{image.id}/tiles/{{level}}/{{x}}_{{y}}",
+            "ready": is_pyramid_complete(self.get_pyramid_dir(image))
+        }
+    
+    def is_valid_tile(self, image: Image, level: int, col: int, row: int) -> bool:
+        """检查瓦片坐标是否在金字塔范围内"""
+        width, height = self.get_display_size(image)
+        max_level = get_max_level(width, height)
+        if level < 0 or level > max_level or col < 0 or row < 0:
+            return False
+        cols, rows = get_tile_grid(*get_level_size(width, height, level, max_level), settings.TILE_SIZE)
+        return col < cols and row < rows
+    
+    def get_tile_path(self, image: Image, level: int, col: int, row: int) -> str:
+        return get_tile_path(self.get_pyramid_dir(image), level, col, row)
+    
+    async def ensure_pyramid(self, image: Image):
+        """确保金字塔已生成；正在生成时等待同一次生成完成"""
+        pyramid_dir = self.get_pyramid_dir(image)
+        if is_pyramid_complete(pyramid_dir):
+            return
+        
+        future = self._pending.get(pyramid_dir)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._get_executor(), generate_pyramid,
+                image.file_path, pyramid_dir,
+                settings.TILE_SIZE, settings.TILE_OVERLAP, settings.TILE_QUALITY,
+                settings.TILE_MAX_IMAGE_PIXELS
+            )
+            self._pending[pyramid_dir] = future
+            future.add_done_callback(lambda _: self._pending.pop(pyramid_dir, None))
+        
+        # 单个请求取消时不影响其他等待者和正在进行的生成
+        await asyncio.shield(future)
+    
+    def schedule(self, image: Image):
+        """后台预生成金字塔（打开标注页面获取图像信息时触发），立即返回"""
+        if not self.needs_pyramid(image) or is_pyramid_complete(self.get_pyramid_dir(image)):
+            return
+        task = asyncio.create_task(self._generate_quietly(image))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _generate_quietly(self, image: Image):
+        try:
+            await self.ensure_pyramid(image)
+        except Exception as e:
+            print(f"生成瓦片金字塔失败 {image.id}: {e}")
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局瓦片服务实例
+tile_service = TileService()
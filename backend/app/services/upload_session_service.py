@@ -0,0 +1,207 @@
+"""
+分块上传会话服务
+按偏移量追加分块到磁盘，支持中断后续传，定期清理过期会话
+"""
+import os
+import uuid
+import asyncio
+import weakref
+from datetime import datetime, timedelta
+from typing import AsyncIterator, BinaryIO, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.upload_session import UploadSession
+from app.utils.storage import FileTooLargeError, discard_temp_file
+from app.config import settings
+
+
+class ChunkOffsetError(ValueError):
+    """分块偏移量与已接收数据不连续"""
+    def __init__(self, expected_offset: int):
+        super().__init__(f"偏移量不连续，应从 {expected_offset} 继续上传")
+        self.expected_offset = expected_offset
+
+
+class UploadSessionClosedError(ValueError):
+    """上传会话已结束（完成、过期或取消）"""
+    def __init__(self, session_status: str):
+        super().__init__(f"上传会话已结束: {session_status}")
+        self.session_status = session_status
+
+
+class UploadSessionService:
+    def __init__(self):
+        self.session_dir = os.path.join(settings.BLOB_DIR, "tmp", "sessions")
+        self._gc_task: Optional[asyncio.Task] = None
+        # 会话ID -> 锁，没有请求持有时自动释放
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+    
+    def session_lock(self, session_id: str) -> asyncio.Lock:
+        """
+        同一会话的分块写入和完成操作串行执行
+        
+        锁只在当前进程内有效，多个工作进程时需要把同一会话的请求路由到同一进程
+        """
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+    
+    def create_session(
+        self,
+        db: Session,
+        task_id: int,
+        user_id: int,
+        filename: str,
+        total_size: int
+    ) -> UploadSession:
+        """创建上传会话并预先创建空的临时文件"""
+        os.makedirs(self.session_dir, exist_ok=True)
+        
+        session_id = str(uuid.uuid4())
+        # 临时文件与内容寻址存储位于同一文件系统，完成时直接重命名，无需再复制
+        temp_path = os.path.join(self.session_dir, f"{session_id}.part")
+        open(temp_path, "wb").close()
+        
+        session = UploadSession(
+            session_id=session_id,
+            task_id=task_id,
+            user_id=user_id,
+            filename=filename,
+            total_size=total_size,
+            received_size=0,
+            temp_path=temp_path,
+            status="uploading",
+            last_activity_at=datetime.now()
+        )
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+        return session
+    
+    def sync_received_size(self, db: Session, session: UploadSession) -> int:
+        """
+        以磁盘上的实际文件大小为准校正已接收字节数
+        
+        写入完成但记录未来得及更新时（例如进程崩溃），两者可能不一致
+        """
+        if session.status != "uploading":
+            return session.received_size or 0
+        
+        actual_size = os.path.getsize(session.temp_path) if os.path.exists(session.temp_path) else 0
+        if actual_size != session.received_size:
+            session.received_size = actual_size
+            db.commit()
+        return actual_size
+    
+    async def append_chunk(
+        self,
+        db: Session,
+        session: UploadSession,
+        offset: int,
+        stream: AsyncIterator[bytes]
+    ) -> int:
+        """
+        从指定偏移量写入分块
+        
+        偏移量小于已接收大小时视为重传（上一块的响应丢失），截断后重新写入；
+        大于已接收大小时拒绝，客户端需先查询状态再续传。
+        
+        Returns:
+            int: 写入后的已接收字节数
+        """
+        async with self.session_lock(session.session_id):
+            # 等待锁期间其他请求可能已写入分块或结束会话
+            db.refresh(session)
+            if session.status != "uploading":
+                raise UploadSessionClosedError(session.status)
+            
+            received_size = self.sync_received_size(db, session)
+            if offset > received_size:
+                raise ChunkOffsetError(received_size)
+            
+            written = await self._write_stream(session, offset, stream)
+            
+            session.received_size = written
+            session.last_activity_at = datetime.now()
+            db.commit()
+        return written
+    
+    async def _write_stream(self, session: UploadSession, offset: int, stream: AsyncIterator[bytes]) -> int:
+        """截断到偏移量后写入请求体，文件操作在线程池中执行，不阻塞事件循环"""
+        f = await asyncio.to_thread(self._open_at, session.temp_path, offset)
+        try:
+            written = offset
+            async for data in stream:
+                written += len(data)
+                if written > session.total_size or written > settings.MAX_FILE_SIZE:
+                    await asyncio.to_thread(f.truncate, offset)
+                    raise FileTooLargeError(f"文件过大: {session.filename}")
+                await asyncio.to_thread(f.write, data)
+            await asyncio.to_thread(self._sync_file, f)
+        finally:
+            await asyncio.to_thread(f.close)
+        return written
+    
+    @staticmethod
+    def _open_at(path: str, offset: int) -> BinaryIO:
+        f = open(path, "r+b")
+        f.seek(offset)
+        f.truncate()
+        return f
+    
+    @staticmethod
+    def _sync_file(f: BinaryIO):
+        f.flush()
+        os.fsync(f.fileno())
+    
+    def close_session(self, db: Session, session: UploadSession, status: str, message: str = None):
+        """结束会话（完成、过期或取消），删除残留的临时文件（完成时已移入存储则无需删除）"""
+        discard_temp_file(session.temp_path)
+        session.status = status
+        session.message = message
+        session.completed_at = datetime.now()
+        db.commit()
+    
+    def expire_stale_sessions(self) -> int:
+        """清理长时间无活动的上传会话"""
+        cutoff = datetime.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        db = SessionLocal()
+        try:
+            stale_sessions = db.query(UploadSession).filter(
+                UploadSession.status == "uploading",
+                UploadSession.last_activity_at < cutoff
+            ).all()
+            for session in stale_sessions:
+                self.close_session(db, session, "expired", "上传会话已过期")
+            
+            if stale_sessions:
+                print(f"清理 {len(stale_sessions)} 个过期上传会话")
+            return len(stale_sessions)
+        finally:
+            db.close()
+    
+    async def _gc_loop(self):
+        """定期清理过期会话"""
+        while True:
+            try:
+                self.expire_stale_sessions()
+            except Exception as e:
+                print(f"清理过期上传会话失败: {e}")
+            await asyncio.sleep(settings.UPLOAD_SESSION_GC_INTERVAL)
+    
+    def start_gc(self):
+        """启动过期会话清理"""
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.create_task(self._gc_loop())
+    
+    def stop_gc(self):
+        """停止过期会话清理"""
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            self._gc_task = None
+
+
+# 全局上传会话服务实例
+upload_session_service = UploadSessionService()
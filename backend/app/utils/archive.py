@@ -0,0 +1,134 @@
+"""
+压缩包读取工具
+只读取目录信息列出成员，按顺序流式读取所需成员，不解压到磁盘
+"""
+import os
+import zipfile
+import tarfile
+from typing import Dict, List, Iterator, Tuple, IO, Container
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive_path(path: str) -> bool:
+    """根据扩展名判断是否为支持的压缩包"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def get_archive_extension(path: str) -> str:
+    """返回压缩包扩展名（包括 .tar.gz 这样的双扩展名）"""
+    lower_path = path.lower()
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if lower_path.endswith(ext):
+            return ext
+    return os.path.splitext(lower_path)[1]
+
+
+def _normalize_member_name(name: str) -> str:
+    """统一成员路径分隔符并去掉开头的 ./ 和 /"""
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+
+def _is_wanted(name: str, extensions: Container[str]) -> bool:
+    """跳过 macOS 生成的 __MACOSX/ 和 ._ 元数据文件以及非图像成员"""
+    if name.startswith('__MACOSX/') or os.path.basename(name).startswith('._'):
+        return False
+    return os.path.splitext(name)[1].lower() in extensions
+
+
+def scan_archive(archive_path: str, extensions: Container[str]) -> Tuple[List[str], int]:
+    """
+    列出压缩包中的图像成员路径（按压缩包内顺序）
+    
+    zip 只读取中央目录；tar 依次读取成员头并跳过数据，未压缩的 tar 直接 seek 跳过，
+    gz/bz2/xz 压缩的 tar 因格式所限需要顺序解压整个流。
+    规范化后路径相同的成员（./a.jpg 与 a.jpg、tar 中追加的同名成员）与解压结果一致，只保留最后一个。
+    
+    Returns:
+        (成员路径列表, 丢弃的重名成员数)
+    """
+    names: Dict[str, None] = {}
+    dropped = 0
+    for name in _iter_member_names(archive_path):
+        if _is_wanted(name, extensions):
+            if name in names:
+                # 按最后一个成员的位置排序
+                del names[name]
+                dropped += 1
+            names[name] = None
+    return list(names), dropped
+
+
+def _iter_member_names(archive_path: str) -> Iterator[str]:
+    """按压缩包内顺序列出文件成员的规范化路径（包括重名成员）"""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    yield _normalize_member_name(info.filename)
+        return
+    
+    with tarfile.open(archive_path, "r:*") as tf:
+        for member in tf:
+            if member.isfile():
+                yield _normalize_member_name(member.name)
+            # 不保留已读取的成员信息，超大压缩包的内存占用保持恒定
+            tf.members = []
+
+
+def iter_archive_members(
+    archive_path: str,
+    wanted: Container[str],
+    has_duplicates: bool = False
+) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    按压缩包内顺序逐个打开所需成员，返回 (成员路径, 只读流)
+    
+    不在 wanted 中的成员不会被打开和解压；流只在下一次迭代前有效。
+    重名成员只打开最后一个（与 scan_archive 一致）：zip 从中央目录得知，
+    tar 需要先读取一遍成员头，只在 scan_archive 发现重名成员时传 has_duplicates=True。
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            last_infos = {}
+            for info in zf.infolist():
+                if not info.is_dir():
+                    last_infos[_normalize_member_name(info.filename)] = info
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                name = _normalize_member_name(info.filename)
+                if name not in wanted or last_infos[name] is not info:
+                    continue
+                with zf.open(info) as stream:
+                    yield name, stream
+        return
+    
+    last_offsets = _get_last_tar_offsets(archive_path, wanted) if has_duplicates else None
+    with tarfile.open(archive_path, "r:*") as tf:
+        for member in tf:
+            if member.isfile():
+                name = _normalize_member_name(member.name)
+                if name in wanted and (last_offsets is None or last_offsets[name] == member.offset):
+                    stream = tf.extractfile(member)
+                    try:
+                        yield name, stream
+                    finally:
+                        stream.close()
+            tf.members = []
+
+
+def _get_last_tar_offsets(archive_path: str, wanted: Container[str]) -> Dict[str, int]:
+    """读取一遍 tar 成员头，返回所需路径最后一个成员的头部偏移量"""
+    offsets = {}
+    with tarfile.open(archive_path, "r:*") as tf:
+        for member in tf:
+            if member.isfile():
+                name = _normalize_member_name(member.name)
+                if name in wanted:
+                    offsets[name] = member.offset
+            tf.members = []
+    return offsets
@@ -0,0 +1,133 @@
+"""
+显示用中间尺寸工具
+标注页面按显示尺寸选择中间尺寸，按浏览器 Accept 头选择 AVIF/WebP，JPEG 兜底
+"""
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+# 格式名 -> (PIL保存格式, MIME类型, 扩展名)
+DERIVATIVE_FORMAT_INFO = {
+    "avif": ("AVIF", "image/avif", ".avif"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+}
+
+
+def get_derivative_formats() -> List[str]:
+    """
+    生成的格式（按优先级），去掉当前 Pillow 不支持编码的格式
+
+    JPEG 作为兜底格式始终生成并排在最后。
+    """
+    try:
+        from PIL import features
+    except ImportError:
+        return ["jpeg"]
+
+    formats = []
+    for name in settings.DERIVATIVE_FORMATS:
+        name = name.strip().lower()
+        if name in ("avif", "webp") and features.check(name) and name not in formats:
+            formats.append(name)
+    formats.append("jpeg")
+    return formats
+
+
+def plan_derivative_sizes(longest_edge: int, sizes: List[int]) -> List[int]:
+    """
+    根据原图长边确定需要生成的尺寸
+
+    只生成小于原图的尺寸；原图不大于某个尺寸时只保留其中最小的一个
+    （原尺寸重新压缩，用于替代未压缩的 BMP/TIFF 原图）。
+    """
+    sizes = sorted(set(sizes))
+    smaller = [size for size in sizes if size < longest_edge]
+    larger = [size for size in sizes if size >= longest_edge]
+    return smaller + larger[:1]
+
+
+def get_derivative_dir(content_hash: str) -> str:
+    """内容寻址图像的中间尺寸目录，相同内容的图像共享"""
+    return os.path.join(settings.DERIVATIVE_DIR, content_hash[0:2], content_hash[2:4], content_hash)
+
+
+def get_derivative_path(content_hash: str, size: int, format_name: str) -> str:
+    """中间尺寸文件路径: <目录>/<尺寸><扩展名>"""
+    return os.path.join(get_derivative_dir(content_hash), f"{size}{DERIVATIVE_FORMAT_INFO[format_name][2]}")
+
+
+def get_derivative_targets(content_hash: str) -> List[Tuple[int, Dict[str, str]]]:
+    """全部配置尺寸和格式的保存路径，传给图像处理流程: [(尺寸, {格式: 路径}), ...]"""
+    formats = get_derivative_formats()
+    return [
+        (size, {name: get_derivative_path(content_hash, size, name) for name in formats})
+        for size in settings.DERIVATIVE_SIZES
+    ]
+
+
+def build_derivatives_record(variants: List[dict]) -> Optional[dict]:
+    """记录到数据库的中间尺寸信息，没有生成时为None"""
+    if not variants:
+        return None
+    return {"formats": get_derivative_formats(), "variants": variants}
+
+
+def save_derivative(img, path: str, format_name: str, quality: int = None):
+    """先写临时文件再原子重命名"""
+    quality = quality or settings.DERIVATIVE_QUALITY
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        img.save(temp_path, DERIVATIVE_FORMAT_INFO[format_name][0], quality=quality)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def parse_accept(accept: Optional[str]) -> Dict[str, float]:
+    """解析 Accept 头，返回 MIME类型 -> q值"""
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type] = quality
+    return accepted
+
+
+def choose_derivative_format(accept: Optional[str], available: List[str]) -> str:
+    """
+    按服务端优先级选择客户端明确支持的格式，否则返回 JPEG
+
+    只认可明确列出的 image/avif、image/webp；image/* 和 */* 不代表能解码新格式。
+    """
+    accepted = parse_accept(accept)
+    for name in available:
+        if name != "jpeg" and accepted.get(DERIVATIVE_FORMAT_INFO[name][1], 0) > 0:
+            return name
+    return "jpeg"
+
+
+def choose_derivative(variants: List[dict], size: Optional[int]) -> Optional[dict]:
+    """选择长边不小于请求尺寸的最小中间尺寸；都不够大时返回最大的一个，未指定尺寸时返回最大的"""
+    if not variants:
+        return None
+    ordered = sorted(variants, key=lambda variant: variant["size"])
+    if size:
+        for variant in ordered:
+            if max(variant["width"], variant["height"]) >= size:
+                return variant
+    return ordered[-1]
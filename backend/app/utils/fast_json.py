@@ -0,0 +1,86 @@
+"""
+JSON序列化
+安装了 orjson 时（JSON_SERIALIZER=auto/orjson）用于接口响应和数据库 JSON 列，否则使用标准库 json。
+
+返回字典的接口默认先经过 FastAPI 的 jsonable_encoder 逐个值转换再序列化，标注数据较多时转换占大部分耗时；
+这些接口直接返回 FastJSONResponse，由 orjson 一次完成序列化（datetime、Enum 原生支持）。
+声明了 response_model 的接口由 FastAPI 用 Pydantic 直接序列化为 JSON 字节，已经足够快，
+因此不修改应用的默认响应类（自定义默认响应类会让这些接口退回先转字典再序列化）。
+"""
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+from app.config import settings
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def get_json_backend() -> str:
+    """实际使用的序列化后端：orjson 或 std（配置的后端不可用时使用标准库）"""
+    if settings.JSON_SERIALIZER in ("auto", "orjson") and ORJSON_AVAILABLE:
+        return "orjson"
+    return "std"
+
+
+USE_ORJSON = get_json_backend() == "orjson"
+
+if USE_ORJSON:
+    # 与标准库一致允许非字符串键（如以图像ID为键的字典）
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """序列化器不直接支持的类型"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"无法序列化为JSON的类型: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> str:
+    """数据库 JSON 列的序列化（engine 的 json_serializer）"""
+    if USE_ORJSON:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj)
+
+
+def loads(value: Any) -> Any:
+    """数据库 JSON 列的反序列化（engine 的 json_deserializer）"""
+    if USE_ORJSON:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def dumps_bytes(content: Any) -> bytes:
+    """接口响应的序列化，输出与 JSONResponse 相同（UTF-8、不转义非ASCII字符、紧凑格式）"""
+    if isinstance(content, BaseModel):
+        # Pydantic 模型由 pydantic-core 直接序列化
+        return content.model_dump_json().encode("utf-8")
+    if USE_ORJSON:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """不经过 jsonable_encoder，直接序列化字典、列表和 Pydantic 模型的JSON响应"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
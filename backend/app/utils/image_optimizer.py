@@ -3,17 +3,24 @@
 处理图像存储、缩略图生成等
 """
 import os
+import mmap
 import hashlib
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List, Dict, Any
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
+EXIF_ORIENTATION_TAG = 0x0112
+
 from app.config import settings
+from app.utils.derivatives import plan_derivative_sizes, save_derivative
+from app.utils.thumbnail_engine import (
+    generate_thumbnails, generate_thumbnail_from_image, get_image_format, open_image, to_rgb
+)
 
 
 class ImageOptimizer:
@@ -71,6 +78,9 @@ class ImageOptimizer:
         """
         生成缩略图
         
+        按图像格式选择缩略图引擎的后端（见 thumbnail_engine），按EXIF方向摆正后缩放，
+        先写入同目录的临时文件再原子重命名，并发读取缩略图的请求不会读到写了一半的文件。
+        
         Args:
             source_path: 源图像路径
             thumbnail_path: 缩略图保存路径
@@ -83,43 +93,140 @@ class ImageOptimizer:
         if not PIL_AVAILABLE:
             return False
         
+        size = size or settings.THUMBNAIL_SIZE
+        quality = quality or settings.THUMBNAIL_QUALITY
+        return generate_thumbnails([(source_path, thumbnail_path, size)], quality)[0]
+    
+    @staticmethod
+    def _to_rgb(img: "Image.Image") -> "Image.Image":
+        """转换为RGB，带透明通道的图像合成到白色背景上"""
+        return to_rgb(img)
+    
+    @staticmethod
+    def compute_dhash(img: "Image.Image", hash_size: int = 8) -> str:
+        """
+        计算差异哈希（dHash），用于查找视觉上近似的图像
+        
+        Returns:
+            str: 16位十六进制字符串（64位哈希）
+        """
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        # L 模式每个像素一个字节，按行排列
+        pixels = small.tobytes()
+        
+        value = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        
+        return f"{value:0{hash_size * hash_size // 4}x}"
+    
+    @staticmethod
+    def process_image(
+        source_path: str,
+        thumbnails: List[Tuple[Tuple[int, int], str]] = None,
+        quality: int = None,
+        derivatives: List[Tuple[int, Dict[str, str]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        完成图像入库所需的全部处理
+        
+        通过 mmap 读取文件后只解码一次，得到尺寸、EXIF方向、显示用中间尺寸、缩略图和感知哈希。
+        中间尺寸和缩略图从大到小逐级缩放，较小的尺寸复用上一级结果，不再回到原图；
+        缩略图由缩略图引擎按配置选择的后端从已解码的图像缩放（generate_thumbnail_from_image）。
+        
+        Args:
+            source_path: 源图像路径
+            thumbnails: [(尺寸, 保存路径), ...]，为空时不生成缩略图
+            quality: 缩略图质量，默认使用配置
+            derivatives: [(长边, {格式: 保存路径}), ...]，显示用中间尺寸，
+                         按原图尺寸只生成需要的部分，已存在的文件不再重新编码
+        
+        Returns:
+            dict: width, height, file_size, orientation, perceptual_hash, thumbnails(已生成的路径列表),
+                  derivatives(已生成的 [{size, width, height}, ...])；无法读取时返回 None
+        """
+        if not PIL_AVAILABLE:
+            return None
+        
+        quality = quality or settings.THUMBNAIL_QUALITY
+        thumbnails = thumbnails or []
+        derivative_paths = dict(derivatives or [])
+        
         try:
-            size = size or settings.THUMBNAIL_SIZE
-            quality = quality or settings.THUMBNAIL_QUALITY
+            with open(source_path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    with open_image(buffer) as img:
+                        width, height = img.size
+                        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+                        derivative_sizes = plan_derivative_sizes(max(width, height), list(derivative_paths))
+                        
+                        # JPEG 只解码到不小于最大输出尺寸的 1/2、1/4、1/8（DCT域缩小），
+                        # 需要原尺寸重新压缩时不缩小
+                        largest = max([max(size) for size, _ in thumbnails] + derivative_sizes + [1])
+                        img.draft("RGB", (largest, largest))
+                        
+                        # 原图只在这里解码一次，之后的缩放都基于解码结果
+                        img.load()
+                        
+                        # 按EXIF方向摆正后再缩放，缩略图与浏览器显示方向一致
+                        working = ImageOps.exif_transpose(img) if orientation != 1 else img
+                        working = ImageOptimizer._to_rgb(working)
+                        if working is img:
+                            working = img.copy()
             
-            # 确保目标目录存在
-            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            # 中间尺寸和缩略图按输出尺寸从大到小排列
+            steps = [((size, size), None) for size in derivative_sizes] + list(thumbnails)
+            steps.sort(key=lambda step: step[0][0] * step[0][1], reverse=True)
             
-            # 打开并处理图像
-            with Image.open(source_path) as img:
-                # 转换RGBA为RGB
-                if img.mode == 'RGBA':
-                    # 创建白色背景
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[3])  # 使用alpha通道作为mask
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 使用高质量的缩略图算法
-                img.thumbnail(size, Image.Resampling.LANCZOS)
+            image_format = get_image_format(source_path)
+            generated_derivatives = []
+            generated = []
+            for size, thumbnail_path in steps:
+                if thumbnail_path is not None:
+                    thumbnail = generate_thumbnail_from_image(working, thumbnail_path, size, quality, image_format)
+                    if thumbnail is not None:
+                        generated.append(thumbnail_path)
+                        working = thumbnail
+                    continue
                 
-                # 保存缩略图
-                img.save(thumbnail_path, 'JPEG', quality=quality, optimize=True)
+                working.thumbnail(size, Image.Resampling.LANCZOS)
+                for format_name, derivative_path in derivative_paths[size[0]].items():
+                    if not os.path.exists(derivative_path):
+                        save_derivative(working, derivative_path, format_name)
+                generated_derivatives.append({
+                    "size": size[0],
+                    "width": working.width,
+                    "height": working.height
+                })
             
-            return True
+            # 感知哈希基于最小的输出图像计算，避免再对原图缩放
+            perceptual_hash = ImageOptimizer.compute_dhash(working)
+            
+            return {
+                "width": width,
+                "height": height,
+                "file_size": file_size,
+                "orientation": orientation,
+                "perceptual_hash": perceptual_hash,
+                "thumbnails": [thumbnail_path for _, thumbnail_path in thumbnails if thumbnail_path in generated],
+                "derivatives": generated_derivatives
+            }
         except Exception as e:
-            print(f"生成缩略图失败: {e}")
-            return False
+            print(f"处理图像失败: {e}")
+            return None
     
     @staticmethod
-    def get_thumbnail_path(original_path: str, task_id: int) -> str:
+    def get_thumbnail_path(original_path: str, task_id: int, create_dir: bool = True) -> str:
         """
         获取缩略图路径
         
         Args:
             original_path: 原始图像路径
-            task_id: 任务ID
+            task_id: 任务ID（内容寻址存储的图像不使用）
+            create_dir: 是否创建所在目录，只检查路径时传False
         
         Returns:
             str: 缩略图路径
@@ -131,17 +238,26 @@ class ImageOptimizer:
         # 缩略图统一使用.jpg格式
         thumbnail_filename = f"{name_without_ext}_thumb.jpg"
         
-        # 使用相同的hash路径结构
-        if settings.USE_HASH_DIRECTORY:
+        # 内容寻址存储的图像按内容哈希共享缩略图，与任务无关
+        if ImageOptimizer.is_blob_path(original_path):
+            relative_dir = os.path.join("blobs", name_without_ext[0:2], name_without_ext[2:4])
+        elif settings.USE_HASH_DIRECTORY:
             relative_dir = ImageOptimizer.get_hash_path(task_id, filename)
         else:
             relative_dir = str(task_id)
         
         thumbnail_dir = os.path.join(settings.THUMBNAIL_DIR, relative_dir)
-        os.makedirs(thumbnail_dir, exist_ok=True)
+        if create_dir:
+            os.makedirs(thumbnail_dir, exist_ok=True)
         
         return os.path.join(thumbnail_dir, thumbnail_filename)
     
+    @staticmethod
+    def is_blob_path(file_path: str) -> bool:
+        """判断文件是否位于内容寻址存储目录"""
+        blob_dir = os.path.normpath(settings.BLOB_DIR)
+        return os.path.normpath(file_path).startswith(blob_dir + os.sep)
+    
     @staticmethod
     def get_image_info(image_path: str) -> Optional[Tuple[int, int, int]]:
         """
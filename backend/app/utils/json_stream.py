@@ -0,0 +1,126 @@
+"""
+大型JSON流式读取工具
+按顶层键读取JSON对象，指定的数组逐个元素解析，内存占用与文件大小无关
+"""
+import re
+import json
+from typing import Any, Container, Iterator, TextIO, Tuple
+
+_NON_WHITESPACE = re.compile(r'\S')
+
+# 被截断的值解析失败或结束的位置与缓冲区末尾的最大距离（\uXXXX 转义序列6个字符）
+_TRUNCATION_MARGIN = 6
+
+
+class JsonStreamReader:
+    """
+    顶层为对象的JSON文件的流式读取器
+    
+    每个值都由标准库的 raw_decode 解析（C实现），缓冲区按块读取，
+    值跨越缓冲区边界时补充数据后重新解析。
+    """
+    
+    def __init__(self, fp: TextIO, chunk_size: int = 1024 * 1024):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.chars_read = 0  # 已读取的字符数，用于估算进度
+        self._decoder = json.JSONDecoder()
+    
+    def _fill(self, size: int = None) -> bool:
+        """丢弃已解析的数据并读取下一块（默认 chunk_size 个字符），没有更多数据时返回False"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.chars_read += len(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def _near_end(self, pos: int) -> bool:
+        """位置是否在缓冲区末尾，值可能被截断（true/null 等字面量、转义序列、数字的小数和指数部分）"""
+        return not self.eof and pos >= len(self.buf) - _TRUNCATION_MARGIN
+    
+    def _peek(self) -> str:
+        """跳过空白并返回下一个字符，文件结束时返回空字符串"""
+        while True:
+            match = _NON_WHITESPACE.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._fill():
+                return ""
+    
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"JSON格式错误：位置 {self.chars_read - len(self.buf) + self.pos} 处应为 '{char}'")
+        self.pos += 1
+    
+    def _decode(self) -> Any:
+        """
+        解析当前位置的一个完整JSON值
+        
+        只有解析在缓冲区末尾停止（值被截断）时才补充数据重新解析，
+        中间位置的格式错误直接抛出；每次补充的数据量加倍，跨越多块的大值总的重新解析量与值的大小成正比
+        """
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # 未结束的字符串报告的是字符串的起始位置
+                truncated = self._near_end(e.pos) or (not self.eof and e.msg.startswith("Unterminated string"))
+                if truncated and self._fill(size):
+                    size *= 2
+                    continue
+                raise
+            # 数字等标量在缓冲区末尾可能被截断，需要确认后面还有足够的字符
+            if self._near_end(end) and self._fill(size):
+                size *= 2
+                continue
+            self.pos = end
+            return value
+    
+    def iter_items(self, stream_keys: Container[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        遍历顶层对象，返回 (键, 值)
+        
+        stream_keys 中的数组逐个元素返回 (键, 元素)，其余键整体解析后返回一次
+        """
+        self._expect('{')
+        while True:
+            char = self._peek()
+            if char == '}':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            if char == "":
+                raise ValueError("JSON格式错误：文件不完整")
+            
+            key = self._decode()
+            self._expect(':')
+            
+            if key in stream_keys and self._peek() == '[':
+                self.pos += 1
+                while True:
+                    char = self._peek()
+                    if char == ']':
+                        self.pos += 1
+                        break
+                    if char == ',':
+                        self.pos += 1
+                        continue
+                    if char == "":
+                        raise ValueError("JSON格式错误：文件不完整")
+                    yield key, self._decode()
+            else:
+                yield key, self._decode()
@@ -0,0 +1,31 @@
+"""
+游标分页工具
+游标是排序键取值的 base64url 编码，对客户端不透明；翻页按 (task_id, 排序键, id) 索引定位，
+与页码深度无关，不需要扫描并丢弃前面的记录
+"""
+import json
+import base64
+from typing import Dict, Any
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前查询不匹配"""
+    pass
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """把上一页最后一条记录的排序键编码为游标"""
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解析游标，格式错误时抛出 InvalidCursorError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("无效的分页游标") from e
+    if not isinstance(values, dict) or not isinstance(values.get("id"), int):
+        raise InvalidCursorError("无效的分页游标")
+    return values
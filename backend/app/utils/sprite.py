@@ -0,0 +1,112 @@
+"""
+缩略图拼图工具
+按固定的图像ID区间把缩略图拼成一张图，列表页一次请求即可显示整页缩略图
+"""
+import os
+import uuid
+import hashlib
+from typing import List, Dict, Any, Tuple, Optional
+from app.config import settings
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+def get_cell_size(width: Optional[int], height: Optional[int], orientation: Optional[int], cell_size: int) -> Optional[Tuple[int, int]]:
+    """按EXIF方向摆正后等比缩放到单元格内的尺寸，尺寸未知（尚未处理）时返回None"""
+    if not width or not height:
+        return None
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    scale = min(cell_size / width, cell_size / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def build_layout(members: List[Dict[str, Any]], cell_size: int, columns: int) -> Dict[str, Any]:
+    """
+    计算拼图布局和版本号，纯计算，不访问文件系统
+    
+    Args:
+        members: 按ID排序的 [{id, width, height, exif_orientation, source}, ...]，source 为内容标识
+                 （内容哈希或文件路径），内容变化时版本号随之变化
+    
+    Returns:
+        dict: version, width, height, cells({image_id: {x, y, width, height}})
+    """
+    cells = {}
+    fingerprint = hashlib.md5(f"{cell_size}:{columns}".encode())
+    for member in members:
+        size = get_cell_size(member["width"], member["height"], member["exif_orientation"], cell_size)
+        if size is None:
+            continue
+        index = len(cells)
+        cells[member["id"]] = {
+            "x": (index % columns) * cell_size,
+            "y": (index // columns) * cell_size,
+            "width": size[0],
+            "height": size[1]
+        }
+        fingerprint.update(f"|{member['id']}:{member['source']}:{size[0]}x{size[1]}".encode())
+    
+    rows = (len(cells) + columns - 1) // columns
+    return {
+        "version": fingerprint.hexdigest()[:16],
+        "width": min(len(cells), columns) * cell_size,
+        "height": rows * cell_size,
+        "cells": cells
+    }
+
+
+def get_sprite_path(task_id: int, block: int, version: str) -> str:
+    """拼图路径: static/sprites/<任务ID>/<区间>_<版本>.jpg"""
+    return os.path.join(settings.SPRITE_DIR, str(task_id), f"{block}_{version}.jpg")
+
+
+def render_sprite(
+    sources: List[Tuple[str, bool, Dict[str, int]]],
+    sheet_size: Tuple[int, int],
+    sprite_path: str,
+    quality: int
+) -> str:
+    """
+    生成拼图（在工作进程中执行）
+    
+    Args:
+        sources: [(图像路径, 是否为已摆正的缩略图, 单元格{x, y, width, height}), ...]
+                 优先使用缩略图，没有缩略图时从原图按 draft 快速缩小解码
+        sheet_size: 拼图尺寸
+    
+    Returns:
+        str: 拼图路径；个别图像读取失败时对应单元格留空
+    """
+    if not PIL_AVAILABLE:
+        raise ValueError("未安装Pillow")
+    
+    sheet = Image.new("RGB", sheet_size, (240, 240, 240))
+    for path, is_thumbnail, cell in sources:
+        size = (cell["width"], cell["height"])
+        try:
+            with Image.open(path) as img:
+                if not is_thumbnail:
+                    img.draft("RGB", size)
+                    img = ImageOps.exif_transpose(img)
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                tile = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            sheet.paste(tile, (cell["x"], cell["y"]))
+        except Exception as e:
+            print(f"拼图读取图像失败 {path}: {e}")
+    
+    os.makedirs(os.path.dirname(sprite_path), exist_ok=True)
+    temp_path = f"{sprite_path}.{uuid.uuid4().hex}.part"
+    try:
+        sheet.save(temp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(temp_path, sprite_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return sprite_path
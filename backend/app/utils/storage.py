@@ -0,0 +1,221 @@
+"""
+文件存储工具
+处理上传文件的流式落盘、内容哈希计算和内容寻址存储路径
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+from typing import Tuple, BinaryIO
+
+from fastapi import UploadFile
+
+from app.config import settings
+
+
+class FileTooLargeError(ValueError):
+    """文件超过大小限制"""
+    pass
+
+
+def get_blob_path(content_hash: str, file_extension: str) -> str:
+    """
+    根据内容哈希生成存储路径，纯字符串计算，不访问文件系统
+    
+    例如: static/blobs/ab/cd/abcd...ef.jpg
+    """
+    return os.path.join(
+        settings.BLOB_DIR,
+        content_hash[0:2],
+        content_hash[2:4],
+        f"{content_hash}{file_extension.lower()}"
+    )
+
+
+def get_blob_temp_path() -> str:
+    """生成内容寻址存储的临时文件路径（与正式文件位于同一文件系统）"""
+    temp_dir = os.path.join(settings.BLOB_DIR, "tmp")
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, f"{uuid.uuid4().hex}.part")
+
+
+def commit_blob_file(temp_path: str, blob_path: str) -> bool:
+    """
+    将临时文件原子移动到内容寻址路径
+    
+    Returns:
+        bool: 是否写入了新文件；目标已存在时丢弃临时文件并返回False
+    """
+    if os.path.exists(blob_path):
+        os.remove(temp_path)
+        return False
+    
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(temp_path, blob_path)
+    return True
+
+
+def discard_temp_file(temp_path: str):
+    """删除临时文件（不存在时忽略）"""
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def hash_file(file_path: str, chunk_size: int = None) -> Tuple[int, str]:
+    """流式计算文件的大小和SHA-256"""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    hasher = hashlib.sha256()
+    file_size = 0
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            hasher.update(chunk)
+    return file_size, hasher.hexdigest()
+
+
+async def stream_upload_to_path(
+    file: UploadFile,
+    target_path: str,
+    max_size: int = None,
+    chunk_size: int = None
+) -> Tuple[int, str]:
+    """
+    将上传文件分块流式写入目标路径
+    
+    数据先写入同目录下的临时文件，边写边计算SHA-256并检查大小，
+    全部写完后原子重命名到目标路径。任何失败都会清理临时文件，
+    目标路径上不会出现写了一半的文件。
+    
+    Args:
+        file: 上传文件
+        target_path: 最终保存路径（所在目录需已存在）
+        max_size: 最大文件大小，默认使用配置
+        chunk_size: 每次读取的块大小，默认使用配置
+    
+    Returns:
+        (file_size, content_hash): 文件大小和SHA-256十六进制摘要
+    
+    Raises:
+        FileTooLargeError: 文件超过大小限制
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    
+    # 临时文件与目标在同一目录，保证 os.replace 是同文件系统内的原子操作
+    temp_path = f"{target_path}.{uuid.uuid4().hex}.part"
+    hasher = hashlib.sha256()
+    file_size = 0
+    
+    # 写入、哈希计算和 fsync 在线程池中执行，不阻塞事件循环
+    buffer = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        try:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise FileTooLargeError(f"文件过大: {file.filename}")
+                
+                await asyncio.to_thread(_write_chunk, buffer, hasher, chunk)
+            
+            await asyncio.to_thread(_sync_file, buffer)
+        finally:
+            await asyncio.to_thread(buffer.close)
+        
+        await asyncio.to_thread(os.replace, temp_path, target_path)
+    except BaseException:
+        discard_temp_file(temp_path)
+        raise
+    
+    return file_size, hasher.hexdigest()
+
+
+def _write_chunk(buffer: BinaryIO, hasher, chunk: bytes):
+    """更新哈希并写入一块数据（hashlib 处理大块数据时释放GIL）"""
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+def _sync_file(buffer: BinaryIO):
+    buffer.flush()
+    os.fsync(buffer.fileno())
+
+
+async def stream_upload_to_temp(file: UploadFile) -> Tuple[str, int, str]:
+    """
+    将上传文件流式写入内容寻址存储的临时目录
+    
+    内容哈希要等数据全部到达后才能确定，调用方随后根据哈希决定
+    复用已有文件还是用 commit_blob_file 落到正式路径。
+    
+    Returns:
+        (temp_path, file_size, content_hash)
+    """
+    temp_path = await asyncio.to_thread(get_blob_temp_path)
+    file_size, content_hash = await stream_upload_to_path(file, temp_path)
+    return temp_path, file_size, content_hash
+
+
+def copy_stream_to_temp(
+    stream: BinaryIO,
+    name: str,
+    max_size: int = None,
+    chunk_size: int = None
+) -> Tuple[str, int, str]:
+    """
+    将可读流复制到内容寻址存储的临时目录，复制过程中同时计算哈希
+    
+    用于文件夹和压缩包导入等同步场景（在线程池中执行）。
+    
+    Returns:
+        (temp_path, file_size, content_hash)
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    
+    temp_path = get_blob_temp_path()
+    hasher = hashlib.sha256()
+    file_size = 0
+    
+    try:
+        with open(temp_path, "wb") as buffer:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise FileTooLargeError(f"文件过大: {name}")
+                
+                hasher.update(chunk)
+                buffer.write(chunk)
+            
+            buffer.flush()
+            os.fsync(buffer.fileno())
+    except BaseException:
+        discard_temp_file(temp_path)
+        raise
+    
+    return temp_path, file_size, hasher.hexdigest()
+
+
+def copy_file_to_temp(source_path: str, max_size: int = None, chunk_size: int = None) -> Tuple[str, int, str]:
+    """
+    复制服务器文件到内容寻址存储的临时目录，复制过程中同时计算哈希
+    
+    每个文件只读取一次。
+    
+    Returns:
+        (temp_path, file_size, content_hash)
+    """
+    with open(source_path, "rb") as source:
+        return copy_stream_to_temp(source, os.path.basename(source_path), max_size, chunk_size)
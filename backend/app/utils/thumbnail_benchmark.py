@@ -0,0 +1,206 @@
+"""
+缩略图引擎基准测试
+在合成图像集上分别测试每个后端对每种格式的吞吐（张/秒）和峰值内存，
+选出各格式最快的后端写入配置文件，供 thumbnail_engine 自动选择
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Any, List, Optional, Tuple
+from app.utils.thumbnail_engine import get_available_backends, get_backend, save_thumbnail
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 格式名 -> (PIL保存格式, 扩展名, 保存参数)
+CORPUS_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", {"quality": 90}),
+    "png": ("PNG", ".png", {}),
+    "webp": ("WEBP", ".webp", {"quality": 90}),
+    "bmp": ("BMP", ".bmp", {}),
+    "tiff": ("TIFF", ".tif", {}),
+}
+
+# 合成图像尺寸：相机照片、全高清截图
+CORPUS_SIZES = [(4000, 3000), (1920, 1080)]
+
+
+def build_corpus(corpus_dir: str, formats: List[str], copies: int = 2) -> Dict[str, List[str]]:
+    """
+    生成合成图像集：渐变加噪声，压缩率接近真实照片；PNG 带透明通道
+    
+    Returns:
+        dict: 格式名 -> 图像路径列表
+    """
+    import numpy as np
+    from PIL import Image
+    
+    rng = np.random.default_rng(0)
+    corpus = {name: [] for name in formats}
+    for width, height in CORPUS_SIZES:
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        for copy in range(copies):
+            noise = rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+            pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2) + noise
+            img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+            for name in formats:
+                pil_format, ext, params = CORPUS_FORMATS[name]
+                source = img.convert("RGBA") if name == "png" else img
+                path = os.path.join(corpus_dir, f"{width}x{height}_{copy}{ext}")
+                source.save(path, pil_format, **params)
+                corpus[name].append(path)
+    return corpus
+
+
+def reset_peak_rss():
+    """清零峰值常驻内存（仅Linux支持），之后的峰值只反映被测后端"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss() -> Optional[int]:
+    """
+    当前进程的峰值常驻内存（字节），不支持的平台返回None
+    
+    Linux 读取 /proc/self/status 的 VmHWM（getrusage 的峰值会继承启动进程前父进程的峰值）
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_backend(
+    backend_name: str,
+    paths: List[str],
+    size: Tuple[int, int],
+    quality: int,
+    rounds: int,
+    output_dir: str
+) -> Dict[str, Any]:
+    """
+    在独立进程中测试单个后端（每次测试使用新进程，峰值内存互不影响）
+    
+    先生成一轮预热，再计时生成 rounds 轮，单轮内按批处理调用后端
+    """
+    backend = get_backend(backend_name)
+    reset_peak_rss()
+    baseline_rss = get_peak_rss()
+    jobs = [(path, size) for path in paths]
+    
+    def run_round(round_index: int) -> int:
+        images = backend.render_batch(jobs)
+        for path, img in zip(paths, images):
+            if img is not None:
+                name = f"{backend_name}_{round_index}_{os.path.basename(path)}.jpg"
+                save_thumbnail(img, os.path.join(output_dir, name), quality)
+        return sum(img is not None for img in images)
+    
+    run_round(-1)
+    started = time.perf_counter()
+    generated = sum(run_round(index) for index in range(rounds))
+    elapsed = time.perf_counter() - started
+    
+    peak_rss = get_peak_rss()
+    return {
+        "images": generated,
+        "failed": len(paths) * rounds - generated,
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(generated / elapsed, 2) if elapsed > 0 else 0,
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+        "rss_growth_mb": round((peak_rss - baseline_rss) / 1024 / 1024, 1) if peak_rss and baseline_rss else None
+    }
+
+
+def run_benchmark(
+    size: int = 256,
+    quality: int = 85,
+    rounds: int = 3,
+    formats: List[str] = None,
+    backends: List[str] = None,
+    corpus_dir: str = None
+) -> Dict[str, Any]:
+    """
+    测试全部可用后端和格式的组合
+    
+    Returns:
+        dict: results([{backend, format, images_per_second, peak_rss_mb, ...}, ...]),
+              backends(格式 -> 最快的后端)
+    """
+    formats = formats or list(CORPUS_FORMATS)
+    backends = [name for name in (backends or get_available_backends()) if name in get_available_backends()]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if corpus_dir is None:
+            corpus_dir = os.path.join(temp_dir, "corpus")
+            os.makedirs(corpus_dir)
+            corpus = build_corpus(corpus_dir, formats)
+        else:
+            corpus = {name: [] for name in formats}
+            for filename in sorted(os.listdir(corpus_dir)):
+                ext = os.path.splitext(filename)[1].lower()
+                for name in formats:
+                    if CORPUS_FORMATS[name][1] == ext or (name == "jpeg" and ext == ".jpeg"):
+                        corpus[name].append(os.path.join(corpus_dir, filename))
+        
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        
+        results = []
+        for image_format in formats:
+            if not corpus[image_format]:
+                continue
+            for backend_name in backends:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    result = executor.submit(
+                        run_backend, backend_name, corpus[image_format], (size, size), quality, rounds, output_dir
+                    ).result()
+                result.update({"backend": backend_name, "format": image_format})
+                results.append(result)
+                print(
+                    f"{image_format:<5} {backend_name:<13} {result['images_per_second']:>8.2f} 张/秒  "
+                    f"峰值内存 {result['peak_rss_mb']} MB"
+                )
+    
+    fastest = {}
+    for result in results:
+        if result["failed"]:
+            continue
+        current = fastest.get(result["format"])
+        if current is None or result["images_per_second"] > current["images_per_second"]:
+            fastest[result["format"]] = result
+    
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "size": size,
+        "backends": {image_format: result["backend"] for image_format, result in fastest.items()},
+        "results": results
+    }
+
+
+def write_profile(report: Dict[str, Any], profile_path: str):
+    """写入配置文件，thumbnail_engine 在各进程首次生成缩略图时读取"""
+    directory = os.path.dirname(profile_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
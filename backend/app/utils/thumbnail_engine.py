@@ -0,0 +1,419 @@
+"""
+缩略图引擎
+提供可切换的缩略图后端，按图像格式选择最快的后端：
+- pillow: 完整解码后 LANCZOS 缩放（原有实现）
+- pillow_draft: JPEG 在 DCT 域按 1/2、1/4、1/8 缩小解码后再缩放
+- opencv: numpy 数组上 INTER_AREA 缩放，JPEG 使用缩小解码，批量处理时预读下一张图像
+默认选择可由基准测试（benchmark_thumbnails.py）生成的配置文件覆盖
+"""
+import os
+import json
+import uuid
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+# 扩展名 -> 格式名，用于按格式选择后端
+IMAGE_FORMATS = {
+    ".jpg": "jpeg", ".jpeg": "jpeg",
+    ".png": "png",
+    ".webp": "webp",
+    ".bmp": "bmp",
+    ".tif": "tiff", ".tiff": "tiff",
+    ".gif": "gif",
+}
+
+# 没有基准测试结果时的默认选择（合成图像集上速度和内存综合最优），其余格式使用 pillow
+DEFAULT_BACKENDS = {
+    "jpeg": "pillow_draft",
+    "webp": "opencv",
+}
+
+
+def get_image_format(path: str) -> str:
+    """按扩展名判断图像格式，未知格式返回 other"""
+    return IMAGE_FORMATS.get(os.path.splitext(path)[1].lower(), "other")
+
+
+def _fit_size(width: int, height: int, size: Tuple[int, int]) -> Tuple[int, int]:
+    """等比缩放到 size 范围内的尺寸，不放大"""
+    scale = min(size[0] / width, size[1] / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# 正在使用配置上限的打开操作数，全部结束后才恢复 Pillow 的默认上限
+_pixel_limit_lock = threading.Lock()
+_pixel_limit_users = 0
+_default_pixel_limit = None
+
+
+@contextmanager
+def open_image(fp, max_image_pixels: int = None):
+    """
+    打开图像，像素数超过配置的 TILE_MAX_IMAGE_PIXELS 时抛出 DecompressionBombError
+    
+    Pillow 在打开和解码时按全局的 MAX_IMAGE_PIXELS 检查，默认值会拒绝超大图像；
+    这里只在 with 块内（打开和解码期间）放宽全局值，退出后恢复 Pillow 的默认上限
+    """
+    global _pixel_limit_users, _default_pixel_limit
+    max_image_pixels = max_image_pixels or settings.TILE_MAX_IMAGE_PIXELS
+    with _pixel_limit_lock:
+        if _pixel_limit_users == 0:
+            _default_pixel_limit = Image.MAX_IMAGE_PIXELS
+        _pixel_limit_users += 1
+        if Image.MAX_IMAGE_PIXELS is not None:
+            Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS, max_image_pixels)
+    try:
+        with Image.open(fp) as img:
+            if img.width * img.height > max_image_pixels:
+                raise Image.DecompressionBombError(
+                    f"图像像素数 {img.width * img.height} 超过上限 {max_image_pixels}"
+                )
+            yield img
+    finally:
+        with _pixel_limit_lock:
+            _pixel_limit_users -= 1
+            if _pixel_limit_users == 0:
+                Image.MAX_IMAGE_PIXELS = _default_pixel_limit
+
+
+def to_rgb(img: "Image.Image") -> "Image.Image":
+    """转换为RGB，带透明通道的图像合成到白色背景上"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[3])
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+class ThumbnailBackend(ABC):
+    """缩略图后端基类，render 返回已摆正方向的RGB缩略图"""
+    name = ""
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return PIL_AVAILABLE
+    
+    @abstractmethod
+    def render(self, source_path: str, size: Tuple[int, int]) -> "Image.Image":
+        """读取原图并生成缩略图"""
+    
+    def render_image(self, img: "Image.Image", size: Tuple[int, int]) -> "Image.Image":
+        """从已解码并摆正方向的RGB图像缩放，不修改传入的图像"""
+        return img.resize(_fit_size(img.width, img.height, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    
+    def render_batch(self, jobs: List[Tuple[str, Tuple[int, int]]]) -> List[Optional["Image.Image"]]:
+        """批量生成，单张失败时对应位置为None"""
+        results = []
+        for source_path, size in jobs:
+            try:
+                results.append(self.render(source_path, size))
+            except Exception as e:
+                print(f"生成缩略图失败 {source_path}: {e}")
+                results.append(None)
+        return results
+
+
+class PillowBackend(ThumbnailBackend):
+    """完整解码后 LANCZOS 缩放"""
+    name = "pillow"
+    
+    def render(self, source_path: str, size: Tuple[int, int]) -> "Image.Image":
+        with open_image(source_path) as img:
+            img = to_rgb(ImageOps.exif_transpose(img))
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+            return img
+
+
+class PillowDraftBackend(ThumbnailBackend):
+    """
+    JPEG 先用 draft 在 DCT 域缩小解码（只解码到不小于目标尺寸的 1/2、1/4、1/8），
+    解码的像素量最多减少到 1/64；其余格式与 pillow 相同
+    """
+    name = "pillow_draft"
+    
+    def render(self, source_path: str, size: Tuple[int, int]) -> "Image.Image":
+        with open_image(source_path) as img:
+            orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+            # 旋转90度的图像按摆正前的方向申请解码尺寸
+            img.draft("RGB", (size[1], size[0]) if orientation in (5, 6, 7, 8) else size)
+            img = to_rgb(ImageOps.exif_transpose(img))
+            img.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            return img
+
+
+class OpenCVBackend(ThumbnailBackend):
+    """
+    OpenCV 解码后在 numpy 数组上 INTER_AREA 缩放，JPEG 使用 IMREAD_REDUCED_* 缩小解码；
+    OpenCV 无法解码的格式（如 GIF）改用 Pillow
+    """
+    name = "opencv"
+    
+    # 缩小倍数 -> 缩小解码标志
+    REDUCED_FLAGS = {}
+    if OPENCV_AVAILABLE:
+        REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+    
+    def __init__(self):
+        if OPENCV_AVAILABLE:
+            # 已经按进程并行，避免每个进程再开满线程
+            cv2.setNumThreads(1)
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return PIL_AVAILABLE and OPENCV_AVAILABLE
+    
+    def render(self, source_path: str, size: Tuple[int, int]) -> "Image.Image":
+        return self._render_data(source_path, np.fromfile(source_path, dtype=np.uint8), size)
+    
+    def render_image(self, img: "Image.Image", size: Tuple[int, int]) -> "Image.Image":
+        target = _fit_size(img.width, img.height, size)
+        if target == img.size:
+            return img.copy()
+        return Image.fromarray(cv2.resize(np.asarray(img), target, interpolation=cv2.INTER_AREA))
+    
+    def render_batch(self, jobs: List[Tuple[str, Tuple[int, int]]]) -> List[Optional["Image.Image"]]:
+        """批量生成：后台线程预读下一张图像的文件数据，读盘与解码、缩放重叠进行（读文件时释放GIL）"""
+        results = []
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            next_data = reader.submit(np.fromfile, jobs[0][0], dtype=np.uint8) if jobs else None
+            for index, (source_path, size) in enumerate(jobs):
+                data = next_data
+                if index + 1 < len(jobs):
+                    next_data = reader.submit(np.fromfile, jobs[index + 1][0], dtype=np.uint8)
+                try:
+                    results.append(self._render_data(source_path, data.result(), size))
+                except Exception as e:
+                    print(f"生成缩略图失败 {source_path}: {e}")
+                    results.append(None)
+        return results
+    
+    def _render_data(self, source_path: str, data: "np.ndarray", size: Tuple[int, int]) -> "Image.Image":
+        # 只读取文件头获取尺寸和EXIF方向，不解码
+        with open_image(source_path) as header:
+            width, height = header.size
+            orientation = header.getexif().get(EXIF_ORIENTATION_TAG, 1)
+            image_format = header.format
+        
+        if image_format == "JPEG":
+            # 选择不小于目标尺寸的最大缩小倍数（方向未知时按两个方向中较大的缩放比计算）
+            scale = max(min(size[0] / width, size[1] / height), min(size[0] / height, size[1] / width))
+            factor = next((f for f in (8, 4, 2) if f * scale <= 1), 1)
+            flags = self.REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR) | cv2.IMREAD_IGNORE_ORIENTATION
+        else:
+            flags = cv2.IMREAD_UNCHANGED
+        
+        array = cv2.imdecode(data, flags)
+        if array is None:
+            return PillowBackend().render(source_path, size)
+        
+        # 先缩小再做颜色转换和透明通道合成，只处理缩略图大小的数据
+        array = self._to_uint8(array)
+        array = self._apply_orientation(array, orientation)
+        target = _fit_size(array.shape[1], array.shape[0], size)
+        if target != (array.shape[1], array.shape[0]):
+            array = cv2.resize(array, target, interpolation=cv2.INTER_AREA)
+        return Image.fromarray(self._to_rgb(array))
+    
+    @staticmethod
+    def _to_uint8(array: "np.ndarray") -> "np.ndarray":
+        """16位和浮点图像转换为8位"""
+        if array.dtype == np.uint16:
+            return (array >> 8).astype(np.uint8)
+        if array.dtype != np.uint8:
+            return cv2.normalize(array, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        return array
+    
+    @staticmethod
+    def _to_rgb(array: "np.ndarray") -> "np.ndarray":
+        """转换为RGB，带透明通道的图像合成到白色背景上"""
+        if array.ndim == 2:
+            return cv2.cvtColor(array, cv2.COLOR_GRAY2RGB)
+        if array.shape[2] == 4:
+            alpha = array[:, :, 3:4].astype(np.float32) / 255.0
+            blended = array[:, :, :3].astype(np.float32) * alpha + 255.0 * (1.0 - alpha)
+            return cv2.cvtColor(blended.astype(np.uint8), cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
+    
+    @staticmethod
+    def _apply_orientation(array: "np.ndarray", orientation: int) -> "np.ndarray":
+        """按EXIF方向摆正，与 ImageOps.exif_transpose 一致"""
+        if orientation == 2:
+            return cv2.flip(array, 1)
+        if orientation == 3:
+            return cv2.rotate(array, cv2.ROTATE_180)
+        if orientation == 4:
+            return cv2.flip(array, 0)
+        if orientation == 5:
+            return cv2.transpose(array)
+        if orientation == 6:
+            return cv2.rotate(array, cv2.ROTATE_90_CLOCKWISE)
+        if orientation == 7:
+            return cv2.flip(cv2.transpose(array), -1)
+        if orientation == 8:
+            return cv2.rotate(array, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        return array
+
+
+# 后端名 -> 后端类
+BACKENDS = {
+    backend.name: backend
+    for backend in (PillowBackend, PillowDraftBackend, OpenCVBackend)
+}
+
+# 每个进程内缓存的后端实例和基准测试结果
+_instances: Dict[str, ThumbnailBackend] = {}
+_profile: Optional[Dict[str, str]] = None
+
+
+def get_available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.is_available()]
+
+
+def load_profile() -> Dict[str, str]:
+    """读取基准测试选出的 格式 -> 后端，文件不存在或无法解析时为空"""
+    global _profile
+    if _profile is None:
+        try:
+            with open(settings.THUMBNAIL_ENGINE_PROFILE, "r", encoding="utf-8") as f:
+                _profile = json.load(f).get("backends", {})
+        except (OSError, ValueError):
+            _profile = {}
+    return _profile
+
+
+def get_backend_name(image_format: str) -> str:
+    """
+    选择后端：配置指定的后端优先；auto 时依次使用基准测试结果、默认选择，
+    选中的后端不可用时退回 pillow
+    """
+    available = get_available_backends()
+    configured = settings.THUMBNAIL_ENGINE
+    if configured != "auto" and configured in available:
+        return configured
+    
+    for name in (load_profile().get(image_format), DEFAULT_BACKENDS.get(image_format)):
+        if name in available:
+            return name
+    return "pillow"
+
+
+def get_backend(name: str) -> ThumbnailBackend:
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def get_thumbnail_signature(size: Tuple[int, int], quality: int) -> bytes:
+    """写入缩略图 JPEG 注释的生成参数，修改尺寸或质量配置后据此识别过期的缩略图"""
+    return f"thumbnail:{size[0]}x{size[1]}:q{quality}".encode()
+
+
+def read_thumbnail_signature(thumbnail_path: str) -> Optional[bytes]:
+    """只读取文件头中的生成参数，无法读取时返回None"""
+    try:
+        with Image.open(thumbnail_path) as img:
+            return img.info.get("comment")
+    except Exception:
+        return None
+
+
+def save_thumbnail(img: "Image.Image", thumbnail_path: str, quality: int, size: Tuple[int, int] = None):
+    """
+    先写入同目录的临时文件再原子重命名，并发读取缩略图的请求不会读到写了一半的文件
+    
+    指定 size 时把生成参数写入 JPEG 注释
+    """
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    temp_path = f"{thumbnail_path}.{uuid.uuid4().hex}.part"
+    options = {"comment": get_thumbnail_signature(size, quality)} if size else {}
+    try:
+        img.save(temp_path, 'JPEG', quality=quality, optimize=True, **options)
+        os.replace(temp_path, thumbnail_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def generate_thumbnail_from_image(
+    img: "Image.Image",
+    thumbnail_path: str,
+    size: Tuple[int, int],
+    quality: int,
+    image_format: str = "other",
+    backend: str = None
+) -> Optional["Image.Image"]:
+    """
+    从已解码并摆正方向的RGB图像生成缩略图（入库时复用已解码的原图，不再读取文件）
+    
+    Args:
+        image_format: 原图格式，用于按格式选择后端
+        backend: 指定后端，默认按格式自动选择
+    
+    Returns:
+        生成的缩略图，失败时返回None
+    """
+    name = backend or get_backend_name(image_format)
+    try:
+        thumbnail = get_backend(name).render_image(img, size)
+        save_thumbnail(thumbnail, thumbnail_path, quality, size)
+        return thumbnail
+    except Exception as e:
+        print(f"生成缩略图失败 {thumbnail_path}: {e}")
+        return None
+
+
+def generate_thumbnails(
+    jobs: List[Tuple[str, str, Tuple[int, int]]],
+    quality: int,
+    backend: str = None
+) -> List[bool]:
+    """
+    批量生成缩略图（可在工作进程中执行），同一后端的任务一起处理
+    
+    Args:
+        jobs: [(源图像路径, 缩略图路径, 尺寸), ...]
+        backend: 指定后端，默认按格式自动选择
+    
+    Returns:
+        list: 每个任务是否成功
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, (source_path, _, _) in enumerate(jobs):
+        name = backend or get_backend_name(get_image_format(source_path))
+        groups.setdefault(name, []).append(index)
+    
+    results = [False] * len(jobs)
+    for name, indexes in groups.items():
+        images = get_backend(name).render_batch([(jobs[i][0], jobs[i][2]) for i in indexes])
+        for index, img in zip(indexes, images):
+            if img is None:
+                continue
+            try:
+                save_thumbnail(img, jobs[index][1], quality, jobs[index][2])
+                results[index] = True
+            except Exception as e:
+                print(f"保存缩略图失败 {jobs[index][1]}: {e}")
+    return results
@@ -0,0 +1,122 @@
+"""
+DeepZoom 瓦片金字塔工具
+计算金字塔层级和瓦片网格，从原图一次解码生成全部瓦片
+"""
+import os
+import json
+import math
+import uuid
+from typing import Dict, Any, Tuple
+from PIL import Image, ImageOps
+from app.config import settings
+from app.utils.thumbnail_engine import open_image
+
+PYRAMID_DESCRIPTOR = "pyramid.json"  # 全部瓦片写完后才写入，存在即表示金字塔完整
+
+
+def get_max_level(width: int, height: int) -> int:
+    """最高层级（原图分辨率），第0层为 1x1"""
+    return int(math.ceil(math.log2(max(width, height, 1))))
+
+
+def get_level_size(width: int, height: int, level: int, max_level: int) -> Tuple[int, int]:
+    """指定层级的图像尺寸，每降一级长宽减半（向上取整）"""
+    scale = 2 ** (max_level - level)
+    return int(math.ceil(width / scale)), int(math.ceil(height / scale))
+
+
+def get_tile_grid(level_width: int, level_height: int, tile_size: int) -> Tuple[int, int]:
+    """指定层级的瓦片列数和行数"""
+    return int(math.ceil(level_width / tile_size)), int(math.ceil(level_height / tile_size))
+
+
+def get_tile_box(col: int, row: int, level_width: int, level_height: int, tile_size: int, overlap: int) -> Tuple[int, int, int, int]:
+    """瓦片在该层图像中的裁剪区域（包含与相邻瓦片的重叠像素）"""
+    left = col * tile_size - (overlap if col > 0 else 0)
+    top = row * tile_size - (overlap if row > 0 else 0)
+    right = min((col + 1) * tile_size + overlap, level_width)
+    bottom = min((row + 1) * tile_size + overlap, level_height)
+    return left, top, right, bottom
+
+
+def get_tile_path(pyramid_dir: str, level: int, col: int, row: int) -> str:
+    """瓦片文件路径: <pyramid_dir>/<level>/<col>_<row>.jpg"""
+    return os.path.join(pyramid_dir, str(level), f"{col}_{row}.jpg")
+
+
+def get_blob_pyramid_dir(content_hash: str) -> str:
+    """内容寻址图像的金字塔目录，相同内容的图像共享瓦片"""
+    return os.path.join(settings.TILE_DIR, "blobs", content_hash[0:2], content_hash[2:4], content_hash)
+
+
+def is_pyramid_complete(pyramid_dir: str) -> bool:
+    return os.path.exists(os.path.join(pyramid_dir, PYRAMID_DESCRIPTOR))
+
+
+def save_tile(tile: "Image.Image", tile_path: str, quality: int):
+    """先写入同目录的临时文件再原子重命名，请求已存在的瓦片时不会读到写了一半的文件"""
+    temp_path = f"{tile_path}.{uuid.uuid4().hex}.part"
+    try:
+        tile.save(temp_path, "JPEG", quality=quality)
+        os.replace(temp_path, tile_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def generate_pyramid(
+    source_path: str,
+    pyramid_dir: str,
+    tile_size: int,
+    overlap: int,
+    quality: int,
+    max_image_pixels: int = None
+) -> Dict[str, Any]:
+    """
+    生成 DeepZoom 瓦片金字塔（在工作进程中执行）
+    
+    原图只解码一次并按EXIF方向旋转（与浏览器显示一致），
+    之后每一层都由上一层 2x 缩小得到。
+    
+    Returns:
+        dict: width, height, tile_size, overlap, max_level
+    """
+    # 超大图像超过 Pillow 默认的解压炸弹保护阈值，只在打开这张图像时使用配置的上限
+    with open_image(source_path, max_image_pixels) as img:
+        level_image = ImageOps.exif_transpose(img)
+        if level_image.mode not in ("RGB", "L"):
+            level_image = level_image.convert("RGB")
+        
+        width, height = level_image.size
+        max_level = get_max_level(width, height)
+        
+        for level in range(max_level, -1, -1):
+            level_width, level_height = get_level_size(width, height, level, max_level)
+            if level_image.size != (level_width, level_height):
+                level_image = level_image.reduce(2)
+                if level_image.size != (level_width, level_height):
+                    level_image = level_image.resize((level_width, level_height), Image.Resampling.BILINEAR)
+            
+            level_dir = os.path.join(pyramid_dir, str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            
+            cols, rows = get_tile_grid(level_width, level_height, tile_size)
+            for row in range(rows):
+                for col in range(cols):
+                    box = get_tile_box(col, row, level_width, level_height, tile_size, overlap)
+                    save_tile(level_image.crop(box), get_tile_path(pyramid_dir, level, col, row), quality)
+    
+    descriptor = {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "format": "jpg",
+        "max_level": max_level
+    }
+    temp_path = os.path.join(pyramid_dir, f"{PYRAMID_DESCRIPTOR}.part")
+    with open(temp_path, "w") as f:
+        json.dump(descriptor, f)
+    os.replace(temp_path, os.path.join(pyramid_dir, PYRAMID_DESCRIPTOR))
+    return descriptor
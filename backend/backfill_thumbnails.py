@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+缩略图批量重建脚本
+为任务或整个存储补生成缺失的默认缩略图，或在修改 THUMBNAIL_SIZE / THUMBNAIL_QUALITY 后重新生成；
+已是最新的缩略图会被跳过，中断后可用 --resume 从检查点继续
+
+用法:
+    python backfill_thumbnails.py [--task-id 1] [--workers 8] [--force]
+    python backfill_thumbnails.py --resume <job_id>
+"""
+import sys
+import os
+import asyncio
+import argparse
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models import *  # 导入所有模型
+from app.services.schema_upgrade_service import upgrade_schema
+from app.services.thumbnail_backfill_service import thumbnail_backfill_service
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成或重新生成默认缩略图")
+    parser.add_argument("--task-id", type=int, default=None, help="只处理指定任务的图像，默认整个存储")
+    parser.add_argument("--workers", type=int, default=0, help="进程数，默认使用 THUMBNAIL_BACKFILL_WORKERS")
+    parser.add_argument("--force", action="store_true", help="忽略已是最新的缩略图，全部重新生成")
+    parser.add_argument("--resume", metavar="JOB_ID", default=None, help="从检查点继续中断的任务")
+    args = parser.parse_args()
+    
+    # 确保数据库表存在，并为旧版本创建的表补充新增的列
+    upgrade_schema()
+    
+    if args.resume:
+        if not thumbnail_backfill_service.reset_job(args.resume):
+            print(f"❌ 任务不存在或已完成: {args.resume}")
+            sys.exit(1)
+        job_id = args.resume
+    else:
+        job_id = thumbnail_backfill_service.create_job(args.task_id, None, args.force, args.workers)
+    
+    print(f"🔧 开始重建缩略图，任务ID: {job_id}")
+    asyncio.run(thumbnail_backfill_service.run_job(job_id))
+    
+    progress = thumbnail_backfill_service.get_job_progress(job_id)
+    print(f"{'✅' if progress.status == 'completed' else '❌'} {progress.message}")
+    if progress.status != "completed":
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+JSON序列化基准测试脚本
+用合成的标注数据比较标准库 json 与当前序列化后端（JSON_SERIALIZER）在以下场景的耗时：
+图像标注详情这类返回字典的接口、返回 AnnotationResponse 列表的接口、标注数据 JSON 列的写入和读取
+
+用法:
+    python benchmark_json.py [--annotations 200] [--shapes 30] [--rounds 20]
+"""
+import sys
+import os
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from typing import List
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+from app.models.annotation import AnnotationType, AnnotationStatus
+from app.schemas.annotation import AnnotationResponse
+from app.utils import fast_json
+
+def make_annotation_data(shapes: int) -> dict:
+    """一条包含多个多边形的标注数据"""
+    return {
+        "shapes": [
+            {
+                "label": f"类别{index % 5}",
+                "points": [[index * 1.5 + offset, index * 2.25 + offset] for offset in range(8)],
+                "attributes": {"occluded": index % 2 == 0, "score": 0.93}
+            }
+            for index in range(shapes)
+        ],
+        "image_size": [1920, 1080]
+    }
+
+def make_annotations(count: int, shapes: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": index + 1,
+            "annotation_type": AnnotationType.POLYGON,
+            "label": f"类别{index % 5}",
+            "data": make_annotation_data(shapes),
+            "notes": None,
+            "image_id": index // 3 + 1,
+            "annotator_id": index % 3 + 1,
+            "annotator": {"id": index % 3 + 1, "full_name": "标注员", "username": f"annotator{index % 3}"},
+            "reviewer_id": None,
+            "status": AnnotationStatus.SUBMITTED,
+            "review_notes": None,
+            "created_at": now,
+            "updated_at": now,
+            "reviewed_at": None
+        }
+        for index in range(count)
+    ]
+
+def measure(func, rounds: int) -> float:
+    """平均耗时（毫秒），先执行一次预热"""
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="比较标准库json与当前JSON序列化后端")
+    parser.add_argument("--annotations", type=int, default=200, help="每次序列化的标注数")
+    parser.add_argument("--shapes", type=int, default=30, help="每条标注的图形数")
+    parser.add_argument("--rounds", type=int, default=20, help="每项计时的轮数")
+    args = parser.parse_args()
+    
+    backend = fast_json.get_json_backend()
+    print(f"🔧 序列化后端: {backend}（JSON_SERIALIZER={fast_json.settings.JSON_SERIALIZER}）")
+    if backend == "std":
+        print("⚠️ 未使用orjson，安装 orjson 后重新运行可看到差异")
+    
+    annotations = make_annotations(args.annotations, args.shapes)
+    payload = {"image_id": 1, "filename": "sample.jpg", "annotations": annotations}
+    models = [AnnotationResponse.model_validate(annotation) for annotation in annotations]
+    adapter = TypeAdapter(List[AnnotationResponse])
+    column_values = [annotation["data"] for annotation in annotations]
+    stored_values = [json.dumps(value) for value in column_values]
+    
+    size = len(fast_json.dumps_bytes(payload))
+    print(f"📦 {args.annotations} 条标注，每条 {args.shapes} 个图形，响应 {size / 1024:.1f} KB")
+    
+    cases = [
+        (
+            "字典响应（图像标注详情）",
+            lambda: JSONResponse(jsonable_encoder(payload)).body,
+            lambda: fast_json.FastJSONResponse(payload).body
+        ),
+        (
+            "响应模型 List[AnnotationResponse]",
+            # 旧版 FastAPI：先转为字典再经过 jsonable_encoder 和 json.dumps
+            lambda: JSONResponse(jsonable_encoder(adapter.dump_python(models, mode="json"))).body,
+            # 当前 FastAPI：Pydantic 直接序列化为JSON字节
+            lambda: adapter.dump_json(models)
+        ),
+        (
+            "JSON列写入（Annotation.data）",
+            lambda: [json.dumps(value) for value in column_values],
+            lambda: [fast_json.dumps(value) for value in column_values]
+        ),
+        (
+            "JSON列读取（Annotation.data）",
+            lambda: [json.loads(value) for value in stored_values],
+            lambda: [fast_json.loads(value) for value in stored_values]
+        ),
+    ]
+    
+    print(f"{'场景':<32}{'标准库(ms)':>12}{'快速路径(ms)':>14}{'加速':>8}")
+    for name, baseline, fast in cases:
+        baseline_ms = measure(baseline, args.rounds)
+        fast_ms = measure(fast, args.rounds)
+        print(f"{name:<32}{baseline_ms:>12.2f}{fast_ms:>14.2f}{baseline_ms / fast_ms:>7.1f}x")
+    
+    print("✅ 测试完成")
+
+if __name__ == "__main__":
+    main()
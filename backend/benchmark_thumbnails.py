@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+缩略图引擎基准测试脚本
+测试各后端对各格式的吞吐和峰值内存，并把各格式最快的后端写入配置文件（THUMBNAIL_ENGINE_PROFILE），
+服务重启后按格式自动选择
+
+用法:
+    python benchmark_thumbnails.py [--size 256] [--rounds 3] [--formats jpeg,png] [--corpus-dir DIR] [--no-write]
+"""
+import sys
+import os
+import argparse
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from app.utils.thumbnail_benchmark import CORPUS_FORMATS, run_benchmark, write_profile
+
+def main():
+    parser = argparse.ArgumentParser(description="测试缩略图后端并按格式选择最快的后端")
+    parser.add_argument("--size", type=int, default=256, help="缩略图边长")
+    parser.add_argument("--rounds", type=int, default=3, help="每个组合计时的轮数")
+    parser.add_argument("--formats", default=",".join(CORPUS_FORMATS), help="测试的格式，逗号分隔")
+    parser.add_argument("--backends", default=None, help="测试的后端，逗号分隔，默认全部可用后端")
+    parser.add_argument("--corpus-dir", default=None, help="使用已有图像目录代替合成图像")
+    parser.add_argument("--output", default=settings.THUMBNAIL_ENGINE_PROFILE, help="配置文件路径")
+    parser.add_argument("--no-write", action="store_true", help="只输出结果，不写配置文件")
+    args = parser.parse_args()
+    
+    print("🔧 开始测试缩略图后端...")
+    report = run_benchmark(
+        size=args.size,
+        quality=settings.THUMBNAIL_QUALITY,
+        rounds=args.rounds,
+        formats=[name.strip() for name in args.formats.split(",") if name.strip() in CORPUS_FORMATS],
+        backends=args.backends.split(",") if args.backends else None,
+        corpus_dir=args.corpus_dir
+    )
+    
+    for image_format, backend in report["backends"].items():
+        print(f"✅ {image_format}: {backend}")
+    
+    if not args.no_write:
+        write_profile(report, args.output)
+        print(f"✅ 已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
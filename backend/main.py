@@ -3,13 +3,20 @@
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 from app.routes import auth, tasks, annotations, users, files, quality_control, export
-from app.database import engine, Base
+from app.services.schema_upgrade_service import upgrade_schema
+from app.services.image_processing_service import image_processing_service
+from app.services.ingest_service import ingest_service
+from app.services.upload_session_service import upload_session_service
+from app.services.tile_service import tile_service
+from app.services.thumbnail_service import thumbnail_service
+from app.services.sprite_service import sprite_service
+from app.services.thumbnail_backfill_service import thumbnail_backfill_service
+from app.services.delivery_service import CachedStaticFiles
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+# 创建数据库表，并为旧版本创建的表补充新增的列和索引
+upgrade_schema()
 
 app = FastAPI(
     title="图像数据标注管理系统",
@@ -22,6 +29,27 @@ app = FastAPI(
 async def health_check():
     return {"status": "healthy", "message": "服务运行正常"}
 
+@app.on_event("startup")
+async def resume_background_jobs():
+    """重新提交上次未处理完成的图像、导入和缩略图重建任务，启动过期上传会话清理和缩略图记录核对"""
+    image_processing_service.resume_pending()
+    ingest_service.resume_incomplete()
+    thumbnail_backfill_service.resume_incomplete()
+    upload_session_service.start_gc()
+    thumbnail_service.start_reconciler()
+
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    """关闭后台处理进程池和线程池"""
+    upload_session_service.stop_gc()
+    thumbnail_service.stop_reconciler()
+    image_processing_service.shutdown()
+    ingest_service.shutdown()
+    tile_service.shutdown()
+    thumbnail_service.shutdown()
+    sprite_service.shutdown()
+    thumbnail_backfill_service.shutdown()
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,8 +59,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 静态文件服务
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# 静态文件服务（内容寻址的文件带强ETag和永久缓存头，支持条件请求和范围请求）
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # 注册路由
 app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+存储布局迁移脚本
+将旧的平铺/分级目录中的图像迁移到内容寻址存储，可在服务运行期间重复执行
+开始时先升级数据库结构，可以直接用于旧版本创建的数据库
+
+用法:
+    python migrate_storage.py [--task-id 1] [--batch-size 500] [--workers 8] [--dry-run]
+"""
+import sys
+import os
+import argparse
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.schema_upgrade_service import upgrade_schema
+from app.services.storage_migration_service import migrate_legacy_images
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移旧存储布局的图像到内容寻址存储")
+    parser.add_argument("--task-id", type=int, default=None, help="只迁移指定任务的图像")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批提交的图像数")
+    parser.add_argument("--workers", type=int, default=8, help="并行处理的线程数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计待迁移的图像，不做修改")
+    args = parser.parse_args()
+    
+    # 旧数据库缺少 content_hash 等新增列，先升级数据库结构
+    upgrade_schema()
+    
+    print("🔧 开始迁移图像存储布局...")
+    stats = migrate_legacy_images(
+        task_id=args.task_id,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        dry_run=args.dry_run
+    )
+    
+    action = "待迁移" if args.dry_run else "已迁移"
+    print(f"✅ {action} {stats['migrated']} 张，文件缺失 {stats['missing']} 张，失败 {stats['failed']} 张")
+
+if __name__ == "__main__":
+    main()
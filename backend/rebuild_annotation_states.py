@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+标注状态重建脚本
+按标注表重建每个 (图像, 标注员) 的最新标注状态表、图像的整体状态字段和文件夹汇总。
+服务启动升级数据库结构时会自动回填一次，自动回填中断或发现状态不一致时执行（重建期间文件夹汇总不完整）
+
+用法:
+    python rebuild_annotation_states.py [--task-id 1] [--batch-size 1000]
+"""
+import sys
+import os
+import argparse
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.models import *  # 导入所有模型
+from app.services.annotation_status_service import rebuild_annotation_states
+from app.services.schema_upgrade_service import upgrade_schema
+
+def main():
+    parser = argparse.ArgumentParser(description="重建图像-标注员标注状态表")
+    parser.add_argument("--task-id", type=int, default=None, help="只重建指定任务的图像")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批提交的图像数")
+    args = parser.parse_args()
+    
+    # 确保数据库表存在，并为旧版本创建的表补充新增的列（随后整体重建，不单独回填）
+    upgrade_schema(backfill=False)
+    
+    def report(processed, total):
+        print(f"   {processed}/{total}")
+    
+    print("🔧 开始重建标注状态...")
+    db = SessionLocal()
+    try:
+        processed = rebuild_annotation_states(
+            db, task_id=args.task_id, batch_size=args.batch_size, on_progress=report
+        )
+    finally:
+        db.close()
+    
+    print(f"✅ 已重建 {processed} 张图像的标注状态")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+测试公共配置
+每个测试使用临时目录中的独立 SQLite 数据库，内容寻址存储也指向临时目录，不影响开发数据
+"""
+import os
+import sys
+import tempfile
+
+# 在导入应用之前指定数据库，避免连接开发环境的数据库
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="datalabels-test-"), "app.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database import Base, JSON_OPTIONS
+from app.models import User, UserRole, Task
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", **JSON_OPTIONS)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def blob_dir(tmp_path, monkeypatch):
+    """内容寻址存储目录"""
+    path = tmp_path / "blobs"
+    monkeypatch.setattr(settings, "BLOB_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def user(db):
+    user = User(
+        username="admin",
+        email="admin@example.com",
+        full_name="管理员",
+        role=UserRole.ADMIN,
+        hashed_password="x"
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def task(db, user):
+    task = Task(title="测试任务", annotation_type="bbox", labels=["a"], creator_id=user.id)
+    db.add(task)
+    db.commit()
+    return task
@@ -0,0 +1,58 @@
+"""
+标注导入失败处理测试
+"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.models.annotation_import import AnnotationImportRecord
+from app.models.image import Image
+from app.services import annotation_import_service as import_module
+from app.services.annotation_import_service import AnnotationImportService
+
+
+@pytest.fixture
+def service(engine, monkeypatch):
+    monkeypatch.setattr(import_module, "SessionLocal", sessionmaker(bind=engine))
+    service = AnnotationImportService()
+    service.batch_size = 1
+    return service
+
+
+@pytest.fixture
+def record(db, task, user):
+    db.add(Image(filename="a.jpg", original_filename="a.jpg", file_path="static/a.jpg", task_id=task.id))
+    record = AnnotationImportRecord(
+        import_id="import-1", task_id=task.id, user_id=user.id, format="coco",
+        source_path="annotations.json", status="processing"
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+
+def test_failed_count_refresh_does_not_hide_import_error(service, record, monkeypatch):
+    def parse(source_path, matcher, progress):
+        yield 1, "a", {"x": 1}
+        raise ValueError("标注文件格式错误")
+    
+    def refresh_counts(db, task_id, user_id, image_ids):
+        raise RuntimeError("数据库连接中断")
+    
+    monkeypatch.setattr(service, "_parse_coco", parse)
+    monkeypatch.setattr(service, "_refresh_counts", refresh_counts)
+    
+    with pytest.raises(ValueError, match="标注文件格式错误"):
+        service._run_import(record.import_id)
+
+
+def test_count_refresh_error_is_raised_when_import_succeeds(service, record, monkeypatch):
+    def parse(source_path, matcher, progress):
+        yield 1, "a", {"x": 1}
+    
+    def refresh_counts(db, task_id, user_id, image_ids):
+        raise RuntimeError("数据库连接中断")
+    
+    monkeypatch.setattr(service, "_parse_coco", parse)
+    monkeypatch.setattr(service, "_refresh_counts", refresh_counts)
+    
+    with pytest.raises(RuntimeError, match="数据库连接中断"):
+        service._run_import(record.import_id)
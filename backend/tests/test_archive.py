@@ -0,0 +1,48 @@
+"""
+压缩包读取测试
+"""
+import io
+import tarfile
+import zipfile
+from app.utils.archive import scan_archive, iter_archive_members
+
+EXTENSIONS = [".jpg", ".png"]
+
+
+def read_members(archive_path, wanted, has_duplicates=False):
+    return [(name, stream.read()) for name, stream in iter_archive_members(archive_path, wanted, has_duplicates)]
+
+
+def add_tar_member(tf, name, content: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    tf.addfile(info, io.BytesIO(content))
+
+
+def test_zip_members_with_same_normalized_path_keep_last(tmp_path):
+    archive_path = str(tmp_path / "a.zip")
+    with zipfile.ZipFile(archive_path, "w") as zf:
+        zf.writestr("./a.jpg", b"first")
+        zf.writestr("b.png", b"b")
+        zf.writestr("__MACOSX/._a.jpg", b"meta")
+        zf.writestr("notes.txt", b"text")
+        zf.writestr("a.jpg", b"second")
+    
+    names, dropped = scan_archive(archive_path, EXTENSIONS)
+    
+    assert (names, dropped) == (["b.png", "a.jpg"], 1)
+    assert read_members(archive_path, set(names)) == [("b.png", b"b"), ("a.jpg", b"second")]
+
+
+def test_tar_repeated_members_keep_last(tmp_path):
+    archive_path = str(tmp_path / "a.tar.gz")
+    with tarfile.open(archive_path, "w:gz") as tf:
+        add_tar_member(tf, "dir/a.jpg", b"first")
+        add_tar_member(tf, "dir/b.jpg", b"b")
+        add_tar_member(tf, "./dir/a.jpg", b"second")
+        add_tar_member(tf, "dir/a.jpg", b"third")
+    
+    names, dropped = scan_archive(archive_path, EXTENSIONS)
+    
+    assert (names, dropped) == (["dir/b.jpg", "dir/a.jpg"], 2)
+    assert read_members(archive_path, set(names), has_duplicates=True) == [("dir/b.jpg", b"b"), ("dir/a.jpg", b"third")]
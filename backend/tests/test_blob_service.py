@@ -0,0 +1,179 @@
+"""
+内容寻址存储引用计数测试
+"""
+import hashlib
+import os
+from sqlalchemy.orm import sessionmaker
+from app.models.blob import ImageBlob
+from app.models.image import Image
+from app.services import blob_service
+from app.services.blob_service import acquire_blob, store_blob, release_blobs, release_task_blobs
+from app.utils.storage import get_blob_temp_path, get_blob_path
+
+
+def write_temp_file(content: bytes):
+    """模拟上传：写入临时文件，返回 (temp_path, content_hash)"""
+    temp_path = get_blob_temp_path()
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    return temp_path, hashlib.sha256(content).hexdigest()
+
+
+def insert_before_own_insert(db, engine, monkeypatch, blob: ImageBlob):
+    """模拟并发：本会话增加引用计数时记录还不存在，随后另一事务抢先插入了相同内容"""
+    real_increment = blob_service._increment_ref_count
+    calls = {"count": 0}
+    
+    def increment(session, content_hash, delta):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            other = sessionmaker(bind=engine)()
+            other.add(blob)
+            other.commit()
+            other.close()
+            return 0
+        return real_increment(session, content_hash, delta)
+    
+    monkeypatch.setattr(blob_service, "_increment_ref_count", increment)
+
+
+def test_store_new_content_moves_file_and_counts_one_reference(db, blob_dir):
+    temp_path, content_hash = write_temp_file(b"image-1")
+    
+    blob, is_new = store_blob(db, temp_path, content_hash, 7, ".JPG")
+    db.commit()
+    
+    assert is_new
+    assert blob.ref_count == 1
+    assert blob.file_path == get_blob_path(content_hash, ".jpg")
+    assert os.path.exists(blob.file_path)
+    assert not os.path.exists(temp_path)
+
+
+def test_store_same_content_reuses_file(db, blob_dir):
+    first_temp, content_hash = write_temp_file(b"image-1")
+    first, _ = store_blob(db, first_temp, content_hash, 7, ".jpg")
+    db.commit()
+    
+    second_temp, _ = write_temp_file(b"image-1")
+    second, is_new = store_blob(db, second_temp, content_hash, 7, ".png")
+    db.commit()
+    
+    assert not is_new
+    assert second.id == first.id
+    assert second.ref_count == 2
+    assert second.file_path.endswith(".jpg")
+    assert not os.path.exists(second_temp)
+    assert db.query(ImageBlob).count() == 1
+
+
+def test_release_deletes_blob_when_last_reference_is_released(db, blob_dir):
+    temp_path, content_hash = write_temp_file(b"image-1")
+    blob, _ = store_blob(db, temp_path, content_hash, 7, ".jpg")
+    acquire_blob(db, content_hash, blob.file_path, 7)
+    db.commit()
+    
+    assert release_blobs(db, {content_hash: 1}) == []
+    db.commit()
+    assert db.query(ImageBlob.ref_count).filter(ImageBlob.content_hash == content_hash).scalar() == 1
+    
+    assert release_blobs(db, {content_hash: 1}) == [get_blob_path(content_hash, ".jpg")]
+    db.commit()
+    assert db.query(ImageBlob).count() == 0
+
+
+def test_release_ignores_unknown_hashes(db, blob_dir):
+    assert release_blobs(db, {}) == []
+    assert release_blobs(db, {"0" * 64: 1}) == []
+
+
+def test_release_task_blobs_releases_one_reference_per_image(db, blob_dir, task):
+    shared_temp, shared_hash = write_temp_file(b"shared")
+    shared, _ = store_blob(db, shared_temp, shared_hash, 6, ".jpg")
+    acquire_blob(db, shared_hash, shared.file_path, 6)
+    acquire_blob(db, shared_hash, shared.file_path, 6)  # 另一个任务中的图像
+    single_temp, single_hash = write_temp_file(b"single")
+    single, _ = store_blob(db, single_temp, single_hash, 6, ".jpg")
+    db.add_all([
+        Image(filename=name, original_filename=name, file_path=path, content_hash=content_hash, task_id=task.id)
+        for name, path, content_hash in [
+            ("a.jpg", shared.file_path, shared_hash),
+            ("b.jpg", shared.file_path, shared_hash),
+            ("c.jpg", single.file_path, single_hash),
+        ]
+    ])
+    db.commit()
+    
+    removed = release_task_blobs(db, task.id)
+    db.commit()
+    
+    assert removed == [get_blob_path(single_hash, ".jpg")]
+    assert db.query(ImageBlob.ref_count).filter(ImageBlob.content_hash == shared_hash).scalar() == 1
+    assert db.query(ImageBlob).filter(ImageBlob.content_hash == single_hash).count() == 0
+
+
+def test_acquire_after_concurrent_insert_increments_existing_blob(db, engine, blob_dir, monkeypatch):
+    content_hash = "a" * 64
+    insert_before_own_insert(db, engine, monkeypatch, ImageBlob(
+        content_hash=content_hash, file_path="blobs/a.jpg", file_size=1, ref_count=1
+    ))
+    
+    blob, is_new = acquire_blob(db, content_hash, "blobs/a.jpg", 1)
+    db.commit()
+    
+    assert not is_new
+    assert blob.ref_count == 2
+    assert db.query(ImageBlob).count() == 1
+
+
+def test_store_after_concurrent_insert_with_other_extension_removes_own_file(db, engine, blob_dir, monkeypatch):
+    temp_path, content_hash = write_temp_file(b"image-1")
+    winner_path = get_blob_path(content_hash, ".png")
+    insert_before_own_insert(db, engine, monkeypatch, ImageBlob(
+        content_hash=content_hash, file_path=winner_path, file_size=7, ref_count=1
+    ))
+    
+    blob, is_new = store_blob(db, temp_path, content_hash, 7, ".jpg")
+    db.commit()
+    
+    assert not is_new
+    assert blob.file_path == winner_path
+    assert blob.ref_count == 2
+    assert not os.path.exists(get_blob_path(content_hash, ".jpg"))
+    assert not os.path.exists(temp_path)
+
+
+def test_concurrent_acquire_does_not_lose_increment(db, engine, blob_dir):
+    temp_path, content_hash = write_temp_file(b"image-1")
+    blob, _ = store_blob(db, temp_path, content_hash, 7, ".jpg")
+    db.commit()
+    assert blob.ref_count == 1  # 会话中已加载该记录
+    
+    other = sessionmaker(bind=engine)()
+    acquire_blob(other, content_hash, blob.file_path, 7)
+    other.commit()
+    other.close()
+    
+    acquired, _ = acquire_blob(db, content_hash, blob.file_path, 7)
+    db.commit()
+    
+    assert acquired.ref_count == 3
+
+
+def test_concurrent_release_keeps_blob_referenced_by_other_session(db, engine, blob_dir):
+    temp_path, content_hash = write_temp_file(b"image-1")
+    blob, _ = store_blob(db, temp_path, content_hash, 7, ".jpg")
+    db.commit()
+    assert blob.ref_count == 1
+    
+    other = sessionmaker(bind=engine)()
+    acquire_blob(other, content_hash, blob.file_path, 7)
+    other.commit()
+    other.close()
+    
+    # 本会话中的计数已过期（1），释放一个引用后另一个会话的引用仍在，文件不能删除
+    assert release_blobs(db, {content_hash: 1}) == []
+    db.commit()
+    
+    assert db.query(ImageBlob.ref_count).filter(ImageBlob.content_hash == content_hash).scalar() == 1
+    assert blob.ref_count == 1
@@ -0,0 +1,65 @@
+"""
+图像分发缓存头测试
+"""
+import os
+import pytest
+from starlette.datastructures import Headers
+from app.config import settings
+from app.services.delivery_service import (
+    DeliveryService, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+)
+
+CONTENT_HASH = "ab" * 32
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    return DeliveryService()
+
+
+def write_file(path, content: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def test_content_addressed_file_is_immutable_and_revalidates(service, tmp_path):
+    path = write_file(tmp_path / "derivatives" / "ab" / "ab" / f"{CONTENT_HASH}_640.jpg", b"jpeg")
+    
+    response = service.file_response(Headers(), path, "derivative")
+    etag = response.headers["etag"]
+    
+    assert etag.startswith(f'"{CONTENT_HASH}-')
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert service.file_response(Headers({"if-none-match": f'W/{etag}'}), path, "derivative").status_code == 304
+    assert service.file_response(Headers({"if-none-match": '"other"'}), path, "derivative").status_code == 200
+    assert service.get_stats()["derivative"] == {"full": 2, "not_modified": 1}
+
+
+def test_regenerated_thumbnail_gets_new_etag(service, tmp_path):
+    path = write_file(tmp_path / "thumbnails" / "blobs" / "ab" / "ab" / f"{CONTENT_HASH}_thumb.jpg", b"small")
+    
+    response = service.file_response(Headers(), path, "thumbnail")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert service.file_response(Headers({"if-none-match": etag}), path, "thumbnail").status_code == 304
+    
+    # 修改缩略图尺寸/质量配置后在同一路径重新生成
+    write_file(path, b"larger thumbnail")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    
+    response = service.file_response(Headers({"if-none-match": etag}), path, "thumbnail")
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_file_without_content_hash_uses_last_modified(service, tmp_path):
+    path = write_file(tmp_path / "uploads" / "1" / "a.jpg", b"jpeg")
+    
+    response = service.file_response(Headers(), path, "image")
+    
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    last_modified = response.headers["last-modified"]
+    assert service.file_response(Headers({"if-modified-since": last_modified}), path, "image").status_code == 304
@@ -0,0 +1,61 @@
+"""
+CSV导出测试
+"""
+import asyncio
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+from app.models import User, UserRole, Image, Annotation, AnnotationType, AnnotationStatus
+from app.services.export_service import ExportService
+
+
+def export_rows(db, tmp_path, task, status_filter=None):
+    """按导出接口的方式读取图像和（按状态筛选的）标注，返回CSV中的 (图像ID, 标注ID)"""
+    service = ExportService()
+    service.export_dir = str(tmp_path)
+    images = db.query(Image).filter(Image.task_id == task.id).all()
+    query = db.query(Annotation).join(Image).filter(Image.task_id == task.id)
+    if status_filter:
+        query = query.filter(Annotation.status.in_(status_filter))
+    
+    path = asyncio.run(service._export_csv("export", task, images, query.all(), False, db))
+    
+    with zipfile.ZipFile(path) as zip_file:
+        if "annotations.csv" not in zip_file.namelist():
+            return []
+        content = zip_file.read("annotations.csv").decode("utf-8-sig")
+    return [(int(row["图像ID"]), int(row["标注ID"])) for row in csv.DictReader(io.StringIO(content))]
+
+
+def test_csv_exports_latest_annotation_among_filtered(db, tmp_path, task):
+    annotators = [
+        User(username=f"ann{index}", email=f"ann{index}@example.com", full_name="标注员",
+             role=UserRole.ANNOTATOR, hashed_password="x")
+        for index in range(2)
+    ]
+    image = Image(filename="f.jpg", original_filename="f.jpg", file_path="static/f.jpg", task_id=task.id)
+    db.add_all([*annotators, image])
+    db.flush()
+    base = datetime(2024, 1, 1)
+    annotations = [
+        Annotation(annotation_type=AnnotationType.BBOX, label="a", data={"x": index}, status=status,
+                   image_id=image.id, annotator_id=annotator.id, created_at=base + timedelta(minutes=index))
+        for index, (annotator, status) in enumerate([
+            (annotators[0], AnnotationStatus.APPROVED),
+            (annotators[0], AnnotationStatus.SUBMITTED),
+            (annotators[1], AnnotationStatus.APPROVED),
+            (annotators[1], AnnotationStatus.APPROVED),
+        ])
+    ]
+    db.add_all(annotations)
+    db.commit()
+    
+    # 第一个标注员最新的标注已提交待审核，已通过的导出中保留其较早的已通过标注
+    assert sorted(export_rows(db, tmp_path, task, [AnnotationStatus.APPROVED])) == [
+        (image.id, annotations[0].id), (image.id, annotations[3].id)
+    ]
+    assert sorted(export_rows(db, tmp_path, task)) == [
+        (image.id, annotations[1].id), (image.id, annotations[3].id)
+    ]
+    assert export_rows(db, tmp_path, task, [AnnotationStatus.REJECTED]) == []
@@ -0,0 +1,64 @@
+"""
+图像接口权限测试
+"""
+import asyncio
+import pytest
+from app.config import settings
+from app.models import User, UserRole, Task
+from app.models.image import Image
+from app.models.ingest import IngestJob, IngestJobFile
+from app.models.upload_session import UploadSession
+from app.models.task_assignment import TaskAssignment
+from app.routes.files import get_processing_status, delete_image
+
+
+@pytest.fixture
+def annotator(db):
+    annotator = User(username="ann", email="ann@example.com", full_name="标注员", role=UserRole.ANNOTATOR, hashed_password="x")
+    db.add(annotator)
+    db.commit()
+    return annotator
+
+
+def add_image(db, task_id):
+    image = Image(filename="a.jpg", original_filename="a.jpg", file_path="static/blobs/a.jpg", task_id=task_id, processing_status="pending")
+    db.add(image)
+    db.commit()
+    return image
+
+
+def test_processing_status_only_returns_accessible_tasks(db, user, task, annotator):
+    assigned_task = Task(title="已分配", annotation_type="bbox", labels=["a"], creator_id=user.id)
+    own_task = Task(title="自建", annotation_type="bbox", labels=["a"], creator_id=annotator.id)
+    db.add_all([assigned_task, own_task])
+    db.commit()
+    db.add(TaskAssignment(task_id=assigned_task.id, user_id=annotator.id, role="annotator"))
+    db.commit()
+    hidden, assigned, own = (add_image(db, t.id) for t in (task, assigned_task, own_task))
+    image_ids = [hidden.id, assigned.id, own.id]
+    
+    result = asyncio.run(get_processing_status(image_ids=image_ids, db=db, current_user=annotator))
+    assert sorted(item["id"] for item in result["images"]) == [assigned.id, own.id]
+    
+    result = asyncio.run(get_processing_status(image_ids=image_ids, db=db, current_user=user))
+    assert sorted(item["id"] for item in result["images"]) == sorted(image_ids)
+    assert {item["processing_status"] for item in result["images"]} == {"pending"}
+
+
+def test_delete_image_clears_ingest_and_upload_references(db, user, task, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    image = add_image(db, task.id)
+    job = IngestJob(job_id="job", task_id=task.id, user_id=user.id, source_path=str(tmp_path))
+    db.add(job)
+    db.flush()
+    db.add(IngestJobFile(job_id=job.id, relative_path="a.jpg", status="completed", image_id=image.id))
+    db.add(UploadSession(
+        session_id="session", task_id=task.id, user_id=user.id, filename="a.jpg", total_size=1,
+        temp_path=str(tmp_path / "a.part"), status="completed", image_id=image.id
+    ))
+    db.commit()
+    
+    asyncio.run(delete_image(image_id=image.id, db=db, current_user=user))
+    
+    assert db.query(IngestJobFile.image_id).scalar() is None
+    assert db.query(UploadSession.image_id).scalar() is None
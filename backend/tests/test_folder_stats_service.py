@@ -0,0 +1,150 @@
+"""
+文件夹汇总增量同步测试
+"""
+import pytest
+from app.models.image import Image
+from app.models.task_folder_stat import TaskFolderStat
+from app.services.folder_stats_service import (
+    normalize_folder_path, get_parent_path, get_folder_chain,
+    sync_folder_stats, remove_folder_stats, reset_folder_stats, get_child_folders
+)
+
+
+def add_images(db, task, paths):
+    images = [
+        Image(filename=f"f{index}.jpg", original_filename=path.rpartition("/")[2], file_path=f"static/{index}.jpg",
+              task_id=task.id, folder_relative_path=path)
+        for index, path in enumerate(paths)
+    ]
+    db.add_all(images)
+    db.flush()
+    return images
+
+
+def folder_stats(db, task):
+    """{路径: (图像数, 已标注, 已审核, 未通过)}"""
+    return {
+        stat.path: (stat.image_count, stat.annotated_count, stat.reviewed_count, stat.rejected_count)
+        for stat in db.query(TaskFolderStat).filter(TaskFolderStat.task_id == task.id)
+    }
+
+
+@pytest.mark.parametrize("path, expected", [
+    (None, [""]),
+    ("img.jpg", [""]),
+    ("a/b/img.jpg", ["", "a/", "a/b/"]),
+    ("a\\b\\img.jpg", ["", "a/", "a/b/"]),
+    ("/a//img.jpg", ["", "a/"]),
+])
+def test_folder_chain(path, expected):
+    assert get_folder_chain(path) == expected
+
+
+def test_folder_path_helpers():
+    assert normalize_folder_path(None) == ""
+    assert normalize_folder_path("\\a\\b") == "a/b/"
+    assert get_parent_path("") is None
+    assert get_parent_path("a/") == ""
+    assert get_parent_path("a/b/") == "a/"
+
+
+def test_sync_counts_image_in_every_ancestor_folder(db, task):
+    images = add_images(db, task, ["a/b/1.jpg", "a/2.jpg", "3.jpg"])
+    
+    sync_folder_stats(db, [image.id for image in images])
+    db.commit()
+    
+    assert folder_stats(db, task) == {"": (3, 0, 0, 0), "a/": (2, 0, 0, 0), "a/b/": (1, 0, 0, 0)}
+    assert all(image.folder_stats_mask == 1 for image in db.query(Image))
+
+
+def test_status_change_is_applied_once(db, task):
+    images = add_images(db, task, ["a/1.jpg", "a/2.jpg"])
+    sync_folder_stats(db, [image.id for image in images])
+    
+    images[0].is_annotated = True
+    images[0].is_reviewed = True
+    images[1].is_annotated = True
+    images[1].has_rejected = True
+    db.flush()
+    sync_folder_stats(db, [image.id for image in images])
+    sync_folder_stats(db, [image.id for image in images])
+    db.commit()
+    assert folder_stats(db, task) == {"": (2, 2, 1, 1), "a/": (2, 2, 1, 1)}
+    
+    images[1].has_rejected = False
+    db.flush()
+    sync_folder_stats(db, [images[1].id])
+    db.commit()
+    assert folder_stats(db, task)["a/"] == (2, 2, 1, 0)
+
+
+def test_remove_deletes_emptied_folders(db, task):
+    images = add_images(db, task, ["a/b/1.jpg", "a/2.jpg"])
+    images[0].is_annotated = True
+    db.flush()
+    sync_folder_stats(db, [image.id for image in images])
+    
+    remove_folder_stats(db, [images[0].id])
+    db.delete(images[0])
+    db.commit()
+    
+    assert folder_stats(db, task) == {"": (1, 0, 0, 0), "a/": (1, 0, 0, 0)}
+
+
+def test_remove_skips_images_never_counted(db, task):
+    images = add_images(db, task, ["a/1.jpg", "a/2.jpg"])
+    sync_folder_stats(db, [images[0].id])
+    
+    remove_folder_stats(db, [image.id for image in images])
+    db.commit()
+    
+    assert folder_stats(db, task) == {}
+
+
+def test_incremental_sync_matches_full_rebuild(db, task):
+    images = add_images(db, task, ["x/y/1.jpg", "x/2.jpg", "z/3.jpg", "4.jpg", "x/y/5.jpg"])
+    sync_folder_stats(db, [image.id for image in images])
+    for index, image in enumerate(images):
+        image.is_annotated = index % 2 == 0
+        image.is_reviewed = index == 0
+        image.has_rejected = index == 4
+        db.flush()
+        sync_folder_stats(db, [image.id])
+    remove_folder_stats(db, [images[2].id])
+    db.delete(images[2])
+    db.commit()
+    incremental = folder_stats(db, task)
+    
+    reset_folder_stats(db, task.id)
+    sync_folder_stats(db, [image.id for image in db.query(Image)])
+    db.commit()
+    
+    assert incremental == folder_stats(db, task)
+    assert "z/" not in incremental
+
+
+def test_child_folders(db, task):
+    images = add_images(db, task, ["a/b/1.jpg", "a/2.jpg", "a/3.jpg", "c/4.jpg"])
+    sync_folder_stats(db, [image.id for image in images])
+    db.commit()
+    
+    root = get_child_folders(db, task.id, "")
+    folder = get_child_folders(db, task.id, "a/")
+    
+    assert [child["path"] for child in root["folders"]] == ["a/", "c/"]
+    assert root["image_count"] == 4 and root["direct_image_count"] == 0
+    assert folder["parent"] == ""
+    assert folder["image_count"] == 3 and folder["direct_image_count"] == 2
+    assert folder["folders"] == [{
+        "name": "b", "path": "a/b/",
+        "image_count": 1, "annotated_count": 0, "reviewed_count": 0, "rejected_count": 0
+    }]
+    assert get_child_folders(db, task.id, "missing/") is None
+
+
+def test_child_folders_of_empty_task(db, task):
+    root = get_child_folders(db, task.id, "")
+    
+    assert root["image_count"] == 0
+    assert root["folders"] == []
@@ -0,0 +1,70 @@
+"""
+图像入库处理测试
+"""
+import pytest
+from PIL import Image
+from app.config import settings
+from app.utils import thumbnail_engine
+from app.utils.image_optimizer import ImageOptimizer
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "a.jpg"
+    Image.new("RGB", (1600, 900), (200, 10, 10)).save(path, "JPEG")
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", [
+    "pillow",
+    "pillow_draft",
+    pytest.param("opencv", marks=pytest.mark.skipif(
+        not thumbnail_engine.OpenCVBackend.is_available(), reason="未安装 OpenCV"
+    )),
+])
+def test_process_image_renders_thumbnails_with_configured_engine(tmp_path, source, monkeypatch, engine):
+    monkeypatch.setattr(settings, "THUMBNAIL_ENGINE", engine)
+    backend = thumbnail_engine.BACKENDS[engine]
+    used = []
+    render_image = backend.render_image
+    
+    def spy(self, img, size):
+        used.append(self.name)
+        return render_image(self, img, size)
+    
+    def read_source(self, *args):
+        raise AssertionError("缩略图应从已解码的图像生成，不再读取原图")
+    
+    monkeypatch.setattr(backend, "render_image", spy)
+    monkeypatch.setattr(backend, "render", read_source)
+    monkeypatch.setattr(backend, "render_batch", read_source)
+    thumbnail_path = str(tmp_path / "thumbs" / "a.jpg")
+    derivative_path = str(tmp_path / "display" / "a_640.jpg")
+    
+    info = ImageOptimizer.process_image(
+        source, [((256, 256), thumbnail_path)], quality=80, derivatives=[(640, {"jpeg": derivative_path})]
+    )
+    
+    assert used == [engine]
+    assert info["thumbnails"] == [thumbnail_path]
+    assert info["derivatives"] == [{"size": 640, "width": 640, "height": 360}]
+    assert len(info["perceptual_hash"]) == 16
+    with Image.open(thumbnail_path) as thumbnail:
+        assert thumbnail.size == (256, 144)
+        assert thumbnail.info["comment"] == thumbnail_engine.get_thumbnail_signature((256, 256), 80)
+
+
+def test_process_image_uses_configured_pixel_limit(tmp_path, monkeypatch):
+    # 缩小 Pillow 默认上限模拟超大图像，默认上限下这张图像无法打开
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    monkeypatch.setattr(settings, "TILE_MAX_IMAGE_PIXELS", 50000)
+    source = str(tmp_path / "large.tif")
+    Image.new("L", (200, 150), 128).save(source, "TIFF")
+    
+    info = ImageOptimizer.process_image(source, [((64, 64), str(tmp_path / "thumb.jpg"))])
+    
+    assert (info["width"], info["height"]) == (200, 150)
+    assert Image.MAX_IMAGE_PIXELS == 1000
+    
+    monkeypatch.setattr(settings, "TILE_MAX_IMAGE_PIXELS", 20000)
+    assert ImageOptimizer.process_image(source) is None
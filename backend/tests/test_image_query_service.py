@@ -0,0 +1,167 @@
+"""
+任务图像列表筛选和游标分页测试
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models import User, UserRole
+from app.models.annotation import AnnotationStatus
+from app.models.image import Image
+from app.models.image_annotator_state import ImageAnnotatorState
+from app.services.annotation_status_service import UNANNOTATED_LABEL
+from app.services.image_query_service import (
+    apply_image_filters, apply_image_sort, apply_image_cursor, get_cursor_values, get_list_columns
+)
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
+
+
+SORT_KEYS = {
+    "id": lambda image: image.id,
+    "created_at": lambda image: image.created_at,
+    "filename": lambda image: image.original_filename,
+}
+
+
+@pytest.fixture
+def images(db, task):
+    """上传时间每3张相同、文件名每4张重复，检验排序键相同时按ID继续定位"""
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    images = [
+        Image(
+            filename=f"f{index}.jpg",
+            original_filename=f"img{index % 4}.jpg",
+            file_path=f"static/blobs/{index}.jpg",
+            task_id=task.id,
+            created_at=base + timedelta(minutes=index // 3),
+            folder_relative_path=f"{'a' if index % 2 else 'b'}/img{index}.jpg"
+        )
+        for index in range(14)
+    ]
+    db.add_all(images)
+    db.commit()
+    return images
+
+
+def expected_ids(images, sort, order):
+    ordered = sorted(images, key=lambda image: (SORT_KEYS[sort](image), image.id), reverse=order == "desc")
+    return [image.id for image in ordered]
+
+
+def fetch_page(db, task_id, sort, order, limit, cursor=None, **filters):
+    """与任务图像列表接口相同的查询方式读取一页，返回 (本页行, 下一页游标)"""
+    query = apply_image_filters(
+        db.query(*get_list_columns(["id", "filename"], sort)).filter(Image.task_id == task_id),
+        **filters
+    )
+    if cursor:
+        query = apply_image_cursor(query, decode_cursor(cursor), sort, order)
+    rows = apply_image_sort(query, sort, order).limit(limit + 1).all()
+    next_cursor = encode_cursor(get_cursor_values(rows[limit - 1], sort, order)) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def paginate(db, task_id, sort, order, limit, **filters):
+    """按游标读取全部页，返回图像ID"""
+    ids, cursor = [], None
+    while True:
+        rows, cursor = fetch_page(db, task_id, sort, order, limit, cursor, **filters)
+        ids.extend(row.id for row in rows)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort", ["id", "created_at", "filename"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("limit", [1, 4, 5])
+def test_cursor_pages_cover_every_image_once_in_order(db, task, images, sort, order, limit):
+    assert paginate(db, task.id, sort, order, limit) == expected_ids(images, sort, order)
+
+
+def test_cursor_combined_with_folder_filter(db, task, images):
+    in_folder = [image for image in images if image.folder_relative_path.startswith("a/")]
+    
+    ids = paginate(db, task.id, "created_at", "desc", 2, folder="a/")
+    
+    assert ids == expected_ids(in_folder, "created_at", "desc")
+
+
+def test_cursor_continues_after_last_image_is_deleted(db, task, images):
+    expected = expected_ids(images, "filename", "asc")[3:]
+    rows, cursor = fetch_page(db, task.id, "filename", "asc", 3)
+    db.query(Image).filter(Image.id == rows[-1].id).delete()
+    db.commit()
+    
+    remaining = []
+    while cursor:
+        page, cursor = fetch_page(db, task.id, "filename", "asc", 3, cursor)
+        remaining.extend(row.id for row in page)
+    
+    assert remaining == expected
+
+
+def test_cursor_for_another_sort_is_rejected(db, task, images):
+    _, cursor = fetch_page(db, task.id, "created_at", "asc", 2)
+    
+    with pytest.raises(InvalidCursorError):
+        fetch_page(db, task.id, "filename", "asc", 2, cursor)
+    with pytest.raises(InvalidCursorError):
+        fetch_page(db, task.id, "created_at", "desc", 2, cursor)
+
+
+@pytest.mark.parametrize("values", [
+    {"id": 3, "sort": "created_at", "order": "asc"},
+    {"id": 3, "sort": "created_at", "order": "asc", "key": "not-a-date"},
+    {"id": 3, "sort": "filename", "order": "asc", "key": 5},
+])
+def test_cursor_with_invalid_key_is_rejected(db, task, values):
+    sort = values["sort"]
+    query = db.query(Image.id).filter(Image.task_id == task.id)
+    
+    with pytest.raises(InvalidCursorError):
+        apply_image_cursor(query, values, sort, "asc")
+
+
+def test_decode_cursor_rejects_malformed_input():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not base64 json")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor({"key": "x"}))
+
+
+def filtered_ids(db, task_id, **filters):
+    return paginate(db, task_id, "id", "asc", 5, **filters)
+
+
+def test_status_filters_use_overall_status_or_viewer_state(db, task, user, images):
+    other = User(username="ann", email="ann@example.com", full_name="标注员", role=UserRole.ANNOTATOR, hashed_password="x")
+    db.add(other)
+    db.flush()
+    images[0].overall_status, images[0].has_rejected = "已通过", True
+    images[1].overall_status = "已通过"
+    db.add_all([
+        ImageAnnotatorState(image_id=images[0].id, annotator_id=user.id, latest_annotation_id=1,
+                            latest_status=AnnotationStatus.REJECTED),
+        ImageAnnotatorState(image_id=images[1].id, annotator_id=user.id, latest_annotation_id=2,
+                            latest_status=AnnotationStatus.APPROVED),
+        ImageAnnotatorState(image_id=images[2].id, annotator_id=other.id, latest_annotation_id=3,
+                            latest_status=AnnotationStatus.APPROVED),
+    ])
+    db.commit()
+    
+    # 管理员视角按整体状态
+    assert filtered_ids(db, task.id, status_label="已通过") == [images[0].id, images[1].id]
+    assert filtered_ids(db, task.id, status_label="已通过", has_rejected=False) == [images[1].id]
+    # 标注员视角按自己最新一次标注
+    assert filtered_ids(db, task.id, status_label="已通过", viewer_id=user.id) == [images[1].id]
+    assert filtered_ids(db, task.id, has_rejected=True, viewer_id=user.id) == [images[0].id]
+    assert filtered_ids(db, task.id, status_label=UNANNOTATED_LABEL, viewer_id=user.id) == [
+        image.id for image in images[2:]
+    ]
+    assert filtered_ids(db, task.id, annotator_id=other.id) == [images[2].id]
+
+
+def test_created_range_is_half_open(db, task, images):
+    start = images[3].created_at
+    
+    ids = filtered_ids(db, task.id, created_from=start, created_to=start + timedelta(minutes=2))
+    
+    assert ids == [image.id for image in images[3:9]]
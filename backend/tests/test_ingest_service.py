@@ -0,0 +1,60 @@
+"""
+压缩包导入测试
+"""
+import asyncio
+import hashlib
+import io
+import tarfile
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.models.image import Image
+from app.models.ingest import IngestJob, IngestJobFile
+from app.services import ingest_service as ingest_module
+from app.services.ingest_service import IngestService
+
+
+@pytest.fixture
+def service(engine, blob_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_module, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(settings, "DERIVATIVE_DIR", str(tmp_path / "derivatives"))
+    return IngestService(max_workers=2)
+
+
+def jpeg(color) -> bytes:
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (64, 48), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def ingest(service, task, user, archive_path):
+    async def run():
+        job_id = await service.start_ingest(task.id, archive_path, user.id, source_type="archive")
+        await service._running[job_id]
+        return job_id
+    
+    return asyncio.run(run())
+
+
+def test_archive_ingest_keeps_last_of_repeated_members(db, service, task, user, tmp_path):
+    members = [("a.jpg", jpeg((255, 0, 0))), ("b.jpg", jpeg((0, 255, 0))), ("./a.jpg", jpeg((0, 0, 255)))]
+    archive_path = str(tmp_path / "images.tar")
+    with tarfile.open(archive_path, "w") as tf:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+    
+    job_id = ingest(service, task, user, archive_path)
+    
+    job = db.query(IngestJob).filter(IngestJob.job_id == job_id).one()
+    assert job.status == "completed", job.message
+    assert (job.total_files, job.success_count, job.duplicate_member_count) == (2, 2, 1)
+    assert service.get_job_progress(job_id).duplicate_member_count == 1
+    
+    files = {row.relative_path: row for row in db.query(IngestJobFile).filter(IngestJobFile.job_id == job.id)}
+    assert sorted(files) == ["a.jpg", "b.jpg"]
+    image = db.query(Image).filter(Image.id == files["a.jpg"].image_id).one()
+    assert image.content_hash == hashlib.sha256(members[2][1]).hexdigest()
@@ -0,0 +1,55 @@
+"""
+JSON流式读取测试
+"""
+import io
+import json
+import pytest
+from app.utils.json_stream import JsonStreamReader
+
+DOCUMENT = {
+    "info": {"name": "数据集 é\\\"", "version": 1.5e-3, "flag": True, "none": None},
+    "images": [{"id": i, "file_name": f"img{i}.jpg", "score": -12.25e+2 * i, "ok": i % 2 == 0} for i in range(5)],
+    "annotations": [{"id": 1, "bbox": [1.5, 2, 30.125, -4e10], "label": "\\u0041"}],
+    "count": 123456789
+}
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+    
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 4096])
+def test_values_split_across_chunks(chunk_size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    items = list(JsonStreamReader(io.StringIO(text), chunk_size=chunk_size).iter_items({"images", "annotations"}))
+    
+    assert [value for key, value in items if key == "images"] == DOCUMENT["images"]
+    assert dict((key, value) for key, value in items if key not in ("images", "annotations")) == {
+        "info": DOCUMENT["info"], "count": DOCUMENT["count"]
+    }
+
+
+def test_malformed_value_fails_without_reading_rest_of_file():
+    text = '{"images": [{"id": 1, "bad": tru}, ' + ", ".join(['{"id": 2}'] * 10000) + ']}'
+    fp = CountingReader(text)
+    reader = JsonStreamReader(fp, chunk_size=64)
+    
+    with pytest.raises(json.JSONDecodeError):
+        list(reader.iter_items({"images"}))
+    assert fp.reads == 1
+
+
+def test_large_value_refills_with_growing_chunks():
+    text = json.dumps({"info": {"data": "x" * 100000}})
+    fp = CountingReader(text)
+    
+    items = list(JsonStreamReader(fp, chunk_size=100).iter_items(()))
+    
+    assert items == [("info", {"data": "x" * 100000})]
+    assert fp.reads < 20
@@ -0,0 +1,129 @@
+"""
+旧版本数据库结构升级测试
+"""
+import os
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database import Base, JSON_OPTIONS
+from app.models import User, UserRole, Task, Image, Annotation, AnnotationType, AnnotationStatus, ImageBlob
+from app.services import storage_migration_service
+from app.services.schema_upgrade_service import upgrade_schema
+
+# 旧版本已有的表；其中只有 images 之后新增了列，annotations 之后新增了索引
+BASELINE_TABLES = ["users", "tasks", "task_assignments", "export_records", "annotations"]
+BASELINE_IMAGES = """
+CREATE TABLE images (
+    id INTEGER NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_size INTEGER,
+    width INTEGER,
+    height INTEGER,
+    task_id INTEGER NOT NULL,
+    is_annotated BOOLEAN,
+    is_reviewed BOOLEAN,
+    annotation_status VARCHAR(50),
+    annotation_data JSON,
+    review_notes TEXT,
+    annotation_count INTEGER,
+    required_annotation_count INTEGER,
+    completed_by_users JSON,
+    folder_relative_path VARCHAR(500),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME,
+    annotated_at DATETIME,
+    reviewed_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(task_id) REFERENCES tasks (id)
+)
+"""
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """旧版本代码创建的数据库：一个任务、两张旧目录中的图像和一条已通过的标注"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", **JSON_OPTIONS)
+    Base.metadata.create_all(bind=engine, tables=[Base.metadata.tables[name] for name in BASELINE_TABLES])
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_annotations_image_annotator"))
+        conn.execute(text(BASELINE_IMAGES))
+        conn.execute(text("CREATE INDEX ix_images_id ON images (id)"))
+    
+    db = sessionmaker(bind=engine)()
+    user = User(username="ann", email="ann@example.com", full_name="标注员", role=UserRole.ANNOTATOR, hashed_password="x")
+    db.add(user)
+    db.flush()
+    task = Task(title="旧任务", annotation_type="bbox", labels=["a"], creator_id=user.id)
+    db.add(task)
+    db.flush()
+    upload_dir = tmp_path / "uploads" / str(task.id)
+    upload_dir.mkdir(parents=True)
+    for index in range(2):
+        path = upload_dir / f"f{index}.jpg"
+        path.write_bytes(b"legacy-%d" % index)
+        db.execute(text(
+            "INSERT INTO images (filename, original_filename, file_path, task_id, is_annotated, is_reviewed, folder_relative_path) "
+            "VALUES (:name, :name, :path, :task_id, :annotated, 0, :folder)"
+        ), {"name": path.name, "path": str(path), "task_id": task.id, "annotated": index == 0, "folder": f"sub/{path.name}"})
+    db.add(Annotation(
+        annotation_type=AnnotationType.BBOX, label="a", data={"x": 1}, status=AnnotationStatus.APPROVED,
+        image_id=1, annotator_id=user.id
+    ))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_runs_migrations_and_backfills_states(legacy_engine):
+    applied = upgrade_schema(legacy_engine)
+    
+    assert applied == ["0002"]
+    columns = {column["name"] for column in inspect(legacy_engine).get_columns("images")}
+    assert {column.name for column in Image.__table__.columns} <= columns
+    indexes = {index["name"] for index in inspect(legacy_engine).get_indexes("images")}
+    assert {index.name for index in Image.__table__.indexes} <= indexes
+    assert set(Base.metadata.tables) <= set(inspect(legacy_engine).get_table_names())
+    
+    db = sessionmaker(bind=legacy_engine)()
+    images = db.query(Image).order_by(Image.id).all()
+    assert [image.overall_status for image in images] == ["已通过", "未标注"]
+    assert [image.processing_status for image in images] == ["completed", "completed"]
+    assert all(image.folder_stats_mask for image in images)
+    db.close()
+    
+    assert upgrade_schema(legacy_engine) == []
+
+
+def test_upgrade_creates_empty_database_and_stamps_create_all(tmp_path):
+    empty = create_engine(f"sqlite:///{tmp_path / 'empty.db'}", **JSON_OPTIONS)
+    created = create_engine(f"sqlite:///{tmp_path / 'created.db'}", **JSON_OPTIONS)
+    Base.metadata.create_all(bind=created)
+    
+    assert upgrade_schema(empty) == ["0001", "0002"]
+    assert upgrade_schema(created) == []
+    for bind in (empty, created):
+        with bind.connect() as conn:
+            assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0002"
+        assert set(Base.metadata.tables) <= set(inspect(bind).get_table_names())
+        bind.dispose()
+
+
+def test_migrate_legacy_images_after_upgrade(legacy_engine, tmp_path, blob_dir, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(storage_migration_service, "SessionLocal", sessionmaker(bind=legacy_engine))
+    
+    upgrade_schema(legacy_engine)
+    stats = storage_migration_service.migrate_legacy_images(workers=1)
+    
+    assert stats == {"migrated": 2, "missing": 0, "failed": 0}
+    db = sessionmaker(bind=legacy_engine)()
+    images = db.query(Image).all()
+    assert all(image.content_hash and os.path.exists(image.file_path) for image in images)
+    assert db.query(ImageBlob).count() == 2
+    assert not (tmp_path / "uploads").exists() or not any((tmp_path / "uploads").rglob("*.jpg"))
+    db.close()
@@ -0,0 +1,61 @@
+"""
+缩略图拼图测试
+"""
+import asyncio
+import pytest
+from PIL import Image as PILImage
+from app.config import settings
+from app.models.image import Image
+from app.services.sprite_service import SpriteService
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SPRITE_DIR", str(tmp_path / "sprites"))
+    monkeypatch.setattr(settings, "SPRITE_BLOCK_SIZE", 10)
+    monkeypatch.setattr(settings, "SPRITE_MAX_PAGE_BLOCKS", 2)
+    return SpriteService(max_workers=0)
+
+
+def add_images(db, task, tmp_path, image_ids):
+    for image_id in image_ids:
+        path = tmp_path / f"{image_id}.jpg"
+        PILImage.new("RGB", (400, 200), (image_id * 10 % 256, 0, 0)).save(path, "JPEG")
+        db.add(Image(id=image_id, filename=path.name, original_filename=path.name, file_path=str(path),
+                     task_id=task.id, width=400, height=200))
+    db.commit()
+
+
+def test_page_in_few_blocks_uses_sprites(db, service, task, tmp_path):
+    add_images(db, task, tmp_path, range(8, 14))
+    
+    sprites = service.get_page_sprites(db, task.id, list(range(8, 14)))
+    
+    assert sorted(sprites) == list(range(8, 14))
+    assert sprites[8]["url"] != sprites[10]["url"]
+    assert sprites[11] == {
+        "url": sprites[10]["url"], "x": 128, "y": 0, "width": 128, "height": 64,
+        "sheet_width": 4 * 128, "sheet_height": 128
+    }
+    
+    block, version = sprites[10]["url"].rsplit("/", 1)[1].removesuffix(".jpg").split("_")
+    sprite_path = asyncio.run(service.get_sprite(db, task.id, int(block), version))
+    with PILImage.open(sprite_path) as sheet:
+        assert sheet.size == (4 * 128, 128)
+        assert sheet.getpixel((128 + 64, 32))[0] > 50
+
+
+def test_sparse_page_falls_back_to_thumbnails(db, service, task, tmp_path):
+    add_images(db, task, tmp_path, [5, 25, 45])
+    
+    assert service.get_page_sprites(db, task.id, [5, 25, 45]) == {}
+    assert sorted(service.get_page_sprites(db, task.id, [5, 25])) == [5, 25]
+
+
+def test_stale_sprite_version_is_rejected(db, service, task, tmp_path):
+    add_images(db, task, tmp_path, [1, 2])
+    url = service.get_page_sprites(db, task.id, [1, 2])[1]["url"]
+    add_images(db, task, tmp_path, [3])
+    
+    version = url.rsplit("_", 1)[1].removesuffix(".jpg")
+    assert asyncio.run(service.get_sprite(db, task.id, 0, version)) is None
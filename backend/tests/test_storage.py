@@ -0,0 +1,46 @@
+"""
+上传文件落盘测试
+"""
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import pytest
+from starlette.datastructures import UploadFile
+from app.utils import storage
+from app.utils.storage import stream_upload_to_path, FileTooLargeError
+
+
+def upload(content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename="a.jpg")
+
+
+def test_stream_upload_writes_off_event_loop(tmp_path, monkeypatch):
+    target_path = str(tmp_path / "a.jpg")
+    content = os.urandom(10000)
+    threads = set()
+    write_chunk = storage._write_chunk
+    
+    def spy(buffer, hasher, chunk):
+        threads.add(threading.get_ident())
+        write_chunk(buffer, hasher, chunk)
+    
+    monkeypatch.setattr(storage, "_write_chunk", spy)
+    
+    async def run():
+        return threading.get_ident(), await stream_upload_to_path(upload(content), target_path, chunk_size=4096)
+    
+    loop_thread, result = asyncio.run(run())
+    
+    assert result == (len(content), hashlib.sha256(content).hexdigest())
+    assert loop_thread not in threads
+    with open(target_path, "rb") as f:
+        assert f.read() == content
+
+
+def test_stream_upload_too_large_leaves_no_file(tmp_path):
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(stream_upload_to_path(upload(b"x" * 100), str(tmp_path / "a.jpg"), max_size=50, chunk_size=16))
+    
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,29 @@
+"""
+任务接口测试
+"""
+import asyncio
+from app.models.image import Image
+from app.models.ingest import IngestJob, IngestJobFile
+from app.models.upload_session import UploadSession
+from app.routes.tasks import delete_task
+
+
+def test_delete_task_clears_ingest_and_upload_references(db, user, task, tmp_path):
+    image = Image(filename="a.jpg", original_filename="a.jpg", file_path="static/blobs/a.jpg", task_id=task.id)
+    db.add(image)
+    db.flush()
+    job = IngestJob(job_id="job", task_id=task.id, user_id=user.id, source_path=str(tmp_path))
+    db.add(job)
+    db.flush()
+    db.add(IngestJobFile(job_id=job.id, relative_path="a.jpg", status="completed", image_id=image.id))
+    db.add(UploadSession(
+        session_id="session", task_id=task.id, user_id=user.id, filename="a.jpg", total_size=1,
+        temp_path=str(tmp_path / "a.part"), status="completed", image_id=image.id
+    ))
+    db.commit()
+    
+    result = asyncio.run(delete_task(task_id=task.id, db=db, current_user=user))
+    
+    assert result["deleted_images"] == 1
+    assert db.query(IngestJobFile.image_id).scalar() is None
+    assert db.query(UploadSession.image_id).scalar() is None
@@ -0,0 +1,96 @@
+"""
+缩略图批量重建测试
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.models.blob import ImageBlob
+from app.models.image import Image
+from app.models.thumbnail_job import ThumbnailJob
+from app.services import thumbnail_backfill_service as backfill_module
+from app.services.thumbnail_backfill_service import ThumbnailBackfillService
+from app.utils.storage import get_blob_path
+from app.utils.thumbnail_engine import get_thumbnail_signature, read_thumbnail_signature
+
+
+@pytest.fixture
+def service(engine, blob_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(backfill_module, "SessionLocal", sessionmaker(bind=engine))
+    # 工作进程改为线程，便于在测试中统计和注入失败
+    monkeypatch.setattr(backfill_module, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(settings, "THUMBNAIL_BACKFILL_BATCH", 2)
+    monkeypatch.setattr(settings, "THUMBNAIL_BACKFILL_CHUNK", 1)
+    return ThumbnailBackfillService()
+
+
+def save_jpeg(path: str, color):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    PILImage.new("RGB", (640, 480), color).save(path, "JPEG")
+
+
+@pytest.fixture
+def records(db, task, tmp_path):
+    for index in range(3):
+        content_hash = f"{index + 1:02d}" * 32
+        blob_path = get_blob_path(content_hash, ".jpg")
+        save_jpeg(blob_path, (index * 80, 0, 0))
+        db.add(ImageBlob(content_hash=content_hash, file_path=blob_path, file_size=1, ref_count=1))
+        db.add(Image(filename=f"{index}.jpg", original_filename=f"{index}.jpg", file_path=blob_path,
+                     task_id=task.id, content_hash=content_hash))
+    legacy_path = str(tmp_path / "uploads" / "legacy.jpg")
+    save_jpeg(legacy_path, (0, 0, 200))
+    db.add(Image(filename="legacy.jpg", original_filename="legacy.jpg", file_path=legacy_path, task_id=task.id))
+    db.commit()
+
+
+def test_interrupted_backfill_resumes_from_checkpoint(db, service, records, task, monkeypatch):
+    processed = []
+    interrupt = {"after": 2}
+    backfill_thumbnails = backfill_module.backfill_thumbnails
+    
+    def spy(items, size, quality, force):
+        if len(processed) == interrupt["after"]:
+            raise RuntimeError("工作进程退出")
+        processed.extend(source_path for source_path, _ in items)
+        return backfill_thumbnails(items, size, quality, force)
+    
+    monkeypatch.setattr(backfill_module, "backfill_thumbnails", spy)
+    job_id = service.create_job(task.id, None)
+    asyncio.run(service.run_job(job_id))
+    
+    job = db.query(ThumbnailJob).filter(ThumbnailJob.job_id == job_id).one()
+    assert job.status == "failed"
+    assert (job.phase, job.processed_items, job.generated_count) == ("blobs", 2, 2)
+    
+    # 恢复后从检查点继续，第一批不再重新处理
+    interrupt["after"] = None
+    assert service.reset_job(job_id)
+    asyncio.run(service.run_job(job_id))
+    
+    db.refresh(job)
+    assert job.status == "completed", job.message
+    assert (job.processed_items, job.generated_count, job.total_items) == (4, 4, 4)
+    assert len(processed) == len(set(processed)) == 4
+    
+    signature = get_thumbnail_signature(settings.THUMBNAIL_SIZE, settings.THUMBNAIL_QUALITY)
+    for image in db.query(Image).all():
+        db.refresh(image)
+        assert image.has_thumbnail
+        assert read_thumbnail_signature(image.thumbnail_path) == signature
+
+
+def test_backfill_skips_current_thumbnails_unless_forced(db, service, records, task):
+    asyncio.run(service.run_job(service.create_job(task.id, None)))
+    
+    again = service.create_job(task.id, None)
+    asyncio.run(service.run_job(again))
+    forced = service.create_job(task.id, None, force=True)
+    asyncio.run(service.run_job(forced))
+    
+    assert service.get_job_progress(again).skipped_count == 4
+    assert service.get_job_progress(forced).generated_count == 4
@@ -0,0 +1,35 @@
+"""
+缩略图后端测试
+"""
+import pytest
+from PIL import Image
+from app.utils.thumbnail_engine import ThumbnailBackend, OpenCVBackend
+
+
+@pytest.mark.skipif(not OpenCVBackend.is_available(), reason="未安装 OpenCV")
+def test_opencv_batch_matches_single_render(tmp_path):
+    paths = []
+    for index, (fmt, mode) in enumerate([("JPEG", "RGB"), ("PNG", "RGBA"), ("JPEG", "L")]):
+        path = tmp_path / f"{index}.{fmt.lower()}"
+        Image.new(mode, (800 + index * 40, 600), (index * 60,) * len(mode)).save(path, fmt)
+        paths.append(str(path))
+    jobs = [(path, (256, 256)) for path in paths]
+    jobs.insert(1, (str(tmp_path / "missing.jpg"), (256, 256)))
+    backend = OpenCVBackend()
+    
+    results = backend.render_batch(jobs)
+    
+    assert results[1] is None
+    for (path, size), img in zip(jobs, results):
+        if img is not None:
+            expected = backend.render(path, size)
+            assert img.size == expected.size and img.tobytes() == expected.tobytes()
+    assert [img.size for img in results if img is not None] == [(256, 192), (256, 183), (256, 175)]
+
+
+def test_backend_must_implement_render():
+    class IncompleteBackend(ThumbnailBackend):
+        name = "incomplete"
+    
+    with pytest.raises(TypeError):
+        IncompleteBackend()
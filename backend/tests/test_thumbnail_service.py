@@ -0,0 +1,113 @@
+"""
+按需缩略图缓存测试
+"""
+import asyncio
+import os
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.models.blob import ImageBlob
+from app.models.image import Image
+from app.services import thumbnail_service as thumbnail_module
+from app.services.thumbnail_service import ThumbnailService, get_cache_path
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / "thumbnails" / "cache"
+    monkeypatch.setattr(settings, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(settings, "THUMBNAIL_CACHE_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """记录实际生成的缩略图"""
+    rendered = []
+    render_thumbnail = thumbnail_module.render_thumbnail
+    
+    def spy(source_path, thumbnail_path, size, quality):
+        rendered.append(thumbnail_path)
+        return render_thumbnail(source_path, thumbnail_path, size, quality)
+    
+    monkeypatch.setattr(thumbnail_module, "render_thumbnail", spy)
+    return rendered
+
+
+def make_image(tmp_path, image_id: int) -> Image:
+    path = tmp_path / f"{image_id}.jpg"
+    PILImage.effect_noise((600, 400), 60 + image_id).convert("RGB").save(path, "JPEG", quality=95)
+    return Image(id=image_id, file_path=str(path))
+
+
+def test_concurrent_requests_render_once_then_hit(tmp_path, cache_dir, renders):
+    service = ThumbnailService(max_workers=0)
+    image = make_image(tmp_path, 1)
+    
+    async def run():
+        first = await asyncio.gather(service.get_thumbnail(image, 100), service.get_thumbnail(image, 128))
+        return first, await service.get_thumbnail(image, 128)
+    
+    (first, second), third = asyncio.run(run())
+    
+    path = get_cache_path("image_1", 128)
+    assert first == second == third == path
+    assert renders == [path]
+    with PILImage.open(path) as thumbnail:
+        assert thumbnail.size == (128, 85)
+    assert service.get_stats()["entries"] == 1
+
+
+def test_least_recently_used_thumbnail_is_evicted(tmp_path, cache_dir, renders):
+    images = [make_image(tmp_path, image_id) for image_id in (1, 2, 3)]
+    probe = ThumbnailService(max_workers=0)
+    asyncio.run(probe.get_thumbnail(images[0], 256))
+    file_size = os.path.getsize(get_cache_path("image_1", 256))
+    service = ThumbnailService(max_workers=0, max_bytes=int(file_size * 2.5))
+    
+    async def run():
+        await service.get_thumbnail(images[1], 256)
+        # 第一张重新被使用，淘汰时保留
+        await service.get_thumbnail(images[0], 256)
+        await service.get_thumbnail(images[2], 256)
+    
+    asyncio.run(run())
+    
+    assert os.path.exists(get_cache_path("image_1", 256))
+    assert not os.path.exists(get_cache_path("image_2", 256))
+    assert os.path.exists(get_cache_path("image_3", 256))
+    assert service.get_stats()["total_bytes"] <= service.max_bytes
+
+
+def test_index_is_rebuilt_from_disk_after_restart(tmp_path, cache_dir, renders):
+    image = make_image(tmp_path, 1)
+    asyncio.run(ThumbnailService(max_workers=0).get_thumbnail(image, 64))
+    leftover = f"{get_cache_path('image_1', 128)}.abc.part"
+    os.makedirs(os.path.dirname(leftover), exist_ok=True)
+    open(leftover, "wb").close()
+    
+    service = ThumbnailService(max_workers=0)
+    asyncio.run(service.get_thumbnail(image, 64))
+    
+    assert renders == [get_cache_path("image_1", 64)]
+    assert not os.path.exists(leftover)
+
+
+def test_reconcile_fixes_thumbnail_records(db, engine, blob_dir, cache_dir, task, monkeypatch):
+    monkeypatch.setattr(thumbnail_module, "SessionLocal", sessionmaker(bind=engine))
+    content_hash = "cd" * 32
+    blob_path = os.path.join(str(blob_dir), "cd", "cd", f"{content_hash}.jpg")
+    stale_path = os.path.join(settings.THUMBNAIL_DIR, "blobs", "cd", "cd", f"{content_hash}_thumb.jpg")
+    db.add(ImageBlob(content_hash=content_hash, file_path=blob_path, file_size=1, ref_count=1,
+                     thumbnail_path=stale_path, has_thumbnail=True))
+    db.add(Image(filename="a.jpg", original_filename="a.jpg", file_path=blob_path, task_id=task.id,
+                 content_hash=content_hash, thumbnail_path=stale_path, has_thumbnail=True))
+    db.commit()
+    
+    # 缩略图文件不存在，记录被清除，列表改用按需缩略图接口
+    assert ThumbnailService(max_workers=0).reconcile()["fixed"] == 2
+    
+    image = db.query(Image).one()
+    db.refresh(image)
+    assert (image.thumbnail_path, image.has_thumbnail) == (None, False)
@@ -0,0 +1,49 @@
+"""
+瓦片金字塔测试
+"""
+import os
+import pytest
+from PIL import Image
+from app.utils.tile_pyramid import generate_pyramid, get_tile_path, is_pyramid_complete
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (600, 300), (10, 120, 200)).save(path, "JPEG")
+    return str(path)
+
+
+def test_generate_pyramid_writes_all_tiles(tmp_path, source):
+    pyramid_dir = str(tmp_path / "pyramid")
+    
+    descriptor = generate_pyramid(source, pyramid_dir, 254, 1, 85)
+    
+    assert descriptor["max_level"] == 10
+    assert is_pyramid_complete(pyramid_dir)
+    with Image.open(get_tile_path(pyramid_dir, 10, 0, 0)) as tile:
+        assert tile.size == (255, 255)
+    with Image.open(get_tile_path(pyramid_dir, 10, 2, 1)) as tile:
+        assert tile.size == (600 - 2 * 254 + 1, 300 - 254 + 1)
+    with Image.open(get_tile_path(pyramid_dir, 0, 0, 0)) as tile:
+        assert tile.size == (1, 1)
+    leftovers = [name for _, _, files in os.walk(pyramid_dir) for name in files if name.endswith(".part")]
+    assert leftovers == []
+
+
+def test_failed_tile_write_leaves_no_partial_tile(tmp_path, source, monkeypatch):
+    pyramid_dir = str(tmp_path / "pyramid")
+    save = Image.Image.save
+    
+    def interrupted_save(self, fp, *args, **kwargs):
+        save(self, fp, *args, **kwargs)
+        raise OSError("磁盘已满")
+    
+    monkeypatch.setattr(Image.Image, "save", interrupted_save)
+    
+    with pytest.raises(OSError):
+        generate_pyramid(source, pyramid_dir, 254, 1, 85)
+    
+    # 写入中断的瓦片没有出现在最终路径，瓦片接口不会把它当作已生成
+    assert os.listdir(os.path.join(pyramid_dir, "10")) == []
+    assert not is_pyramid_complete(pyramid_dir)
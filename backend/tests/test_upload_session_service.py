@@ -0,0 +1,86 @@
+"""
+分块上传会话测试
+"""
+import asyncio
+import os
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.models.upload_session import UploadSession
+from app.services.upload_session_service import UploadSessionService, ChunkOffsetError, UploadSessionClosedError
+from app.utils.storage import FileTooLargeError
+
+
+@pytest.fixture
+def service(blob_dir):
+    return UploadSessionService()
+
+
+async def chunks(*parts: bytes):
+    """模拟请求体：逐段产生数据，每段之间让出事件循环"""
+    for part in parts:
+        await asyncio.sleep(0)
+        yield part
+
+
+def read_file(session):
+    with open(session.temp_path, "rb") as f:
+        return f.read()
+
+
+def test_append_and_resend_chunk(db, service, task, user):
+    session = service.create_session(db, task.id, user.id, "a.jpg", 8)
+    
+    assert asyncio.run(service.append_chunk(db, session, 0, chunks(b"ab", b"cd"))) == 4
+    with pytest.raises(ChunkOffsetError) as error:
+        asyncio.run(service.append_chunk(db, session, 6, chunks(b"gh")))
+    assert error.value.expected_offset == 4
+    # 上一块的响应丢失，客户端从较早的偏移量重传
+    assert asyncio.run(service.append_chunk(db, session, 2, chunks(b"CD", b"efgh"))) == 8
+    
+    assert read_file(session) == b"abCDefgh"
+    assert session.received_size == 8
+
+
+def test_chunk_beyond_total_size_is_discarded(db, service, task, user):
+    session = service.create_session(db, task.id, user.id, "a.jpg", 4)
+    asyncio.run(service.append_chunk(db, session, 0, chunks(b"ab")))
+    
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(service.append_chunk(db, session, 2, chunks(b"cd", b"e")))
+    
+    assert read_file(session) == b"ab"
+    assert service.sync_received_size(db, session) == 2
+
+
+def test_concurrent_chunks_of_one_session_do_not_interleave(db, engine, service, task, user):
+    session_id = service.create_session(db, task.id, user.id, "a.jpg", 6).session_id
+    Session = sessionmaker(bind=engine)
+    
+    async def upload(parts):
+        request_db = Session()
+        try:
+            session = request_db.query(UploadSession).filter(UploadSession.session_id == session_id).one()
+            return await service.append_chunk(request_db, session, 0, chunks(*parts))
+        finally:
+            request_db.close()
+    
+    async def upload_both():
+        return await asyncio.gather(upload([b"a", b"b", b"c", b"d"]), upload([b"x", b"y"]))
+    
+    assert asyncio.run(upload_both()) == [4, 2]
+    
+    session = db.query(UploadSession).filter(UploadSession.session_id == session_id).one()
+    db.refresh(session)
+    assert read_file(session) == b"xy"
+    assert session.received_size == 2
+
+
+def test_append_to_closed_session_is_rejected(db, engine, service, task, user):
+    session = service.create_session(db, task.id, user.id, "a.jpg", 4)
+    other_db = sessionmaker(bind=engine)()
+    service.close_session(other_db, other_db.merge(session), "cancelled")
+    other_db.close()
+    
+    with pytest.raises(UploadSessionClosedError):
+        asyncio.run(service.append_chunk(db, session, 0, chunks(b"ab")))
+    assert not os.path.exists(session.temp_path)